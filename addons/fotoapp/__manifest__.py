@@ -13,7 +13,7 @@
     # Check https://github.com/odoo/odoo/blob/15.0/odoo/addons/base/data/ir_module_category_data.xml
     # for the full list
     'category': 'Sales',
-    'version': '0.1',
+    'version': '0.2',
 
     # any module necessary for this one to work correctly
     'depends': [
@@ -61,6 +61,7 @@
         'data/ir_cron_fotoapp_lifecycle.xml',
         'data/fotoapp_commission_cron.xml',
         'data/fotoapp_commission_actions.xml',
+        'data/ir_cron_fotoapp_media.xml',
         
 
         #'data/fotoapp_plan_data.xml',
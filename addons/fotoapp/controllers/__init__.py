@@ -14,4 +14,5 @@ from . import order_portal
 from . import manual_payment
 from . import checkout_guest
 from . import download
+from . import photographer_uploads
 from . import signup_terms
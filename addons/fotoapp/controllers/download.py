@@ -1,12 +1,9 @@
 # -*- coding: utf-8 -*-
-import base64
-import io
-import zipfile
-from datetime import datetime
-
 from odoo import http, _, fields
 from odoo.http import request
 
+from odoo.addons.fotoapp.models.zip_stream import iter_zip_stream
+
 
 class FotoappDownloadController(http.Controller):
     @http.route([
@@ -26,23 +23,20 @@ class FotoappDownloadController(http.Controller):
             response = request.make_response('No hay fotos asociadas al pedido.', [('Content-Type', 'text/plain')])
             response.status_code = 404
             return response
-        buf = io.BytesIO()
-        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for asset in assets:
-                if not asset.imagen_original:
-                    continue
-                try:
-                    data = base64.b64decode(asset.imagen_original)
-                except Exception:
-                    continue
-                filename = asset.name or f"foto_{asset.id}"
-                # Asegura extensión .jpg si no trae una
-                if '.' not in filename.lower():
-                    filename = f"{filename}.jpg"
-                zf.writestr(filename, data)
-        buf.seek(0)
+        filename = f"fotos_{order.name or 'pedido'}.zip"
+        bundle = order._fotoapp_get_valid_bundle()
+        if bundle:
+            # send_file resuelve ETag, If-None-Match y Range sobre el archivo del filestore.
+            stream = request.env['ir.binary'].sudo()._get_stream_from(bundle)
+            stream.download_name = filename
+            return stream.get_response(as_attachment=True)
+        if order.fotoapp_bundle_state != 'pending':
+            order._fotoapp_queue_download_bundle()
+        # El ZIP se genera después de cerrar el cursor, por eso las rutas del
+        # filestore se resuelven antes y el generador no accede al ORM.
+        entries = order._fotoapp_zip_entries()
         headers = [
             ('Content-Type', 'application/zip'),
-            ('Content-Disposition', f"attachment; filename=\"fotos_{order.name or 'pedido'}.zip\""),
+            ('Content-Disposition', f"attachment; filename=\"{filename}\""),
         ]
-        return request.make_response(buf.getvalue(), headers=headers)
+        return request.make_response(iter_zip_stream(entries), headers=headers)
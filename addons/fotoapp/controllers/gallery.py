@@ -1,10 +1,20 @@
+import hashlib
 import logging
+from datetime import timezone
+
+from werkzeug.http import http_date
 
 from odoo import http, _
 from odoo.http import request
 
+from odoo.addons.fotoapp.models import gallery_cache
+from odoo.addons.fotoapp.models.tienda_foto_bib_tag import normalize_bib
+
 _logger = logging.getLogger(__name__)
 
+GALLERY_PAGE_SIZE = 48
+CSRF_PLACEHOLDER = '__fotoapp_csrf_token__'
+
 
 class FotoappGalleryController(http.Controller):
     def _category_domain(self):
@@ -29,12 +39,111 @@ class FotoappGalleryController(http.Controller):
             ('is_private', '=', False),
         ], order='create_date desc')
 
+    def _album_visible_domain(self, album):
+        return [
+            ('album_ids', 'in', album.id),
+            ('website_published', '=', True),
+            ('lifecycle_state', '!=', 'archived'),
+        ]
+
+    def _album_photo_domain(self, album, burst_id=0):
+        domain = self._album_visible_domain(album)
+        if burst_id:
+            domain += ['|', ('id', '=', burst_id), ('burst_leader_id', '=', burst_id)]
+        elif album.collapse_bursts:
+            # Sólo se ocultan las fotos cuya primera foto de la ráfaga está visible en este álbum.
+            domain += [
+                '|', '|',
+                ('burst_leader_id', '=', False),
+                ('burst_leader_id.website_published', '=', False),
+                ('burst_leader_id.album_ids', 'not in', [album.id]),
+            ]
+        return domain
+
+    def _album_burst_counts(self, album, photos, burst_id=0):
+        """``{foto: similares}`` de las ráfagas de ``photos`` dentro del álbum."""
+        if burst_id or not album.collapse_bursts or not photos:
+            return {}
+        groups = request.env['tienda.foto.asset'].sudo()._read_group(
+            self._album_visible_domain(album) + [('burst_leader_id', 'in', photos.ids)],
+            ['burst_leader_id'],
+            ['__count'],
+        )
+        return {leader.id: count for leader, count in groups}
+
+    def _gallery_cache_allowed(self):
+        # El carrito se muestra en el encabezado: con pedido abierto la página es personal.
+        return (
+            request.httprequest.method in ('GET', 'HEAD')
+            and request.env.user._is_public()
+            and not request.session.get('sale_order_id')
+        )
+
+    def _render_cacheable(self, render):
+        # El token CSRF depende de la sesión: se renderiza un marcador y se
+        # reemplaza por el token real al servir cada respuesta.
+        request.csrf_token = lambda *args, **kwargs: CSRF_PLACEHOLDER
+        try:
+            response = render()
+            if getattr(response, 'status_code', None) == 200 and hasattr(response, 'flatten'):
+                response.flatten()
+        finally:
+            del request.csrf_token
+        return response
+
+    def _not_modified(self, etag, modified_at):
+        httprequest = request.httprequest
+        if httprequest.if_none_match:
+            return httprequest.if_none_match.contains(etag)
+        since = httprequest.if_modified_since
+        return bool(since and modified_at and modified_at.replace(microsecond=0, tzinfo=timezone.utc) <= since)
+
+    def _serve_cached(self, render):
+        """Sirve ``render()`` desde la caché de páginas a los visitantes anónimos.
+
+        La clave incluye la versión de la galería, que se incrementa al
+        modificar eventos, categorías o álbumes publicados. Responde 304 si el
+        navegador o el proxy ya tienen la misma versión.
+        """
+        if not self._gallery_cache_allowed():
+            return render()
+        version, modified_at = gallery_cache.read_gallery_version(request.env.cr)
+        key = (
+            request.env.cr.dbname,
+            request.website.id,
+            request.env.lang,
+            request.httprequest.full_path,
+            version,
+        )
+        cached = gallery_cache.page_cache.get(key)
+        if cached is None:
+            response = self._render_cacheable(render)
+            if getattr(response, 'status_code', None) != 200:
+                return response
+            body = response.get_data()
+            cached = (body, gallery_cache.body_etag(body))
+            gallery_cache.page_cache.set(key, *cached)
+        body, etag = cached
+        # La página lleva el token CSRF de la sesión, así que el ETag también.
+        etag = hashlib.sha1(f'{etag}:{request.session.sid}'.encode()).hexdigest()
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'no-cache')]
+        if modified_at:
+            headers.append(('Last-Modified', http_date(modified_at.replace(tzinfo=timezone.utc))))
+        if self._not_modified(etag, modified_at):
+            return request.make_response(b'', headers=headers, status=304)
+        body = body.replace(CSRF_PLACEHOLDER.encode(), request.csrf_token().encode())
+        headers.append(('Content-Type', 'text/html; charset=utf-8'))
+        return request.make_response(body, headers=headers)
+
     @http.route(['/'], type='http', auth='public', website=True)
     def index(self, **kwargs):
         return request.redirect('/galeria')
 
     @http.route(['/galeria'], type='http', auth='public', website=True)
     def gallery_home(self, **kwargs):
+        return self._serve_cached(self._render_gallery_home)
+
+    def _render_gallery_home(self):
         top_categories = self._get_categories(limit=6, order_by_popularity=True)
         total_categories = request.env['tienda.foto.categoria'].sudo().search_count(self._category_domain())
         featured_events = request.env['tienda.foto.evento'].sudo().search([
@@ -58,6 +167,9 @@ class FotoappGalleryController(http.Controller):
 
     @http.route(['/galeria/categorias'], type='http', auth='public', website=True)
     def gallery_category_listing(self, **kwargs):
+        return self._serve_cached(self._render_gallery_category_listing)
+
+    def _render_gallery_category_listing(self):
         categories = self._get_categories(order_by_popularity=True)
         values = {
             'categories': categories,
@@ -71,6 +183,9 @@ class FotoappGalleryController(http.Controller):
 
     @http.route(['/galeria/categoria/<string:slug>'], type='http', auth='public', website=True)
     def gallery_category(self, slug, **kwargs):
+        return self._serve_cached(lambda: self._render_gallery_category(slug))
+
+    def _render_gallery_category(self, slug):
         category = request.env['tienda.foto.categoria'].sudo().search([
             ('slug', '=', slug),
             ('website_published', '=', True),
@@ -93,6 +208,9 @@ class FotoappGalleryController(http.Controller):
 
     @http.route(['/galeria/evento/<string:slug>'], type='http', auth='public', website=True)
     def gallery_event(self, slug, **kwargs):
+        return self._serve_cached(lambda: self._render_gallery_event(slug))
+
+    def _render_gallery_event(self, slug):
         event = request.env['tienda.foto.evento'].sudo().search([
             ('website_slug', '=', slug),
             ('website_published', '=', True),
@@ -110,31 +228,89 @@ class FotoappGalleryController(http.Controller):
         }
         return request.render('fotoapp.gallery_event_detail', values)
 
-    @http.route(['/galeria/evento/<string:event_slug>/album/<int:album_id>'], type='http', auth='public', website=True)
-    def gallery_album(self, event_slug, album_id, **kwargs):
+    def _get_public_album(self, event_slug, album_id):
         event = request.env['tienda.foto.evento'].sudo().search([
             ('website_slug', '=', event_slug),
             ('website_published', '=', True),
         ], limit=1)
         if not event:
-            return request.not_found()
+            return None, None
         album = request.env['tienda.foto.album'].sudo().search([
             ('id', '=', album_id),
             ('event_id', '=', event.id),
             ('state', '=', 'published'),
             ('is_private', '=', False),
         ], limit=1)
+        return event, album
+
+    def _parse_int_param(self, value):
+        try:
+            return max(int(value or 0), 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def _album_photo_page(self, album, burst_id=0, before_id=0):
+        """Devuelve una página de fotos y el cursor de la siguiente.
+
+        Paginación por keyset sobre ``id desc``: el costo no depende de cuántas
+        páginas se recorrieron ni del tamaño del álbum.
+        """
+        domain = self._album_photo_domain(album, burst_id)
+        if before_id:
+            domain.append(('id', '<', before_id))
+        photos = request.env['tienda.foto.asset'].sudo().search(domain, order='id desc', limit=GALLERY_PAGE_SIZE + 1)
+        next_cursor = photos[GALLERY_PAGE_SIZE - 1].id if len(photos) > GALLERY_PAGE_SIZE else False
+        return photos[:GALLERY_PAGE_SIZE], next_cursor
+
+    def _album_page_url(self, event, album, burst_id=0, before_id=0, json=False):
+        url = f"/galeria/evento/{event.website_slug}/album/{album.id}"
+        if json:
+            url += '/fotos'
+        params = []
+        if burst_id:
+            params.append(f"rafaga={burst_id}")
+        if before_id:
+            params.append(f"antes={before_id}")
+        return f"{url}?{'&'.join(params)}" if params else url
+
+    @http.route(['/galeria/evento/<string:event_slug>/buscar'], type='http', auth='public', website=True, sitemap=False)
+    def gallery_event_bib_search(self, event_slug, dorsal=None, **kwargs):
+        event = request.env['tienda.foto.evento'].sudo().search([
+            ('website_slug', '=', event_slug),
+            ('website_published', '=', True),
+        ], limit=1)
+        if not event:
+            return request.not_found()
+        bib = normalize_bib(dorsal)
+        photos = request.env['tienda.foto.bib.tag']._fotoapp_search_assets(event, bib)
+        values = {
+            'event': event,
+            'bib': bib,
+            'photos': photos,
+            'album': request.env['tienda.foto.album'],
+            'burst_id': False,
+            'album_url': f"/galeria/evento/{event.website_slug}/buscar?dorsal={bib}",
+        }
+        return request.render('fotoapp.gallery_event_bib_search', values)
+
+    @http.route(['/galeria/evento/<string:event_slug>/album/<int:album_id>'], type='http', auth='public', website=True)
+    def gallery_album(self, event_slug, album_id, **kwargs):
+        event, album = self._get_public_album(event_slug, album_id)
         if not album:
             return request.not_found()
-        photos = request.env['tienda.foto.asset'].sudo().search([
-            ('album_ids', 'in', album.id),
-            ('website_published', '=', True),
-            ('lifecycle_state', '!=', 'archived'),
-        ], order='id desc')
+        burst_id = self._parse_int_param(kwargs.get('rafaga'))
+        before_id = self._parse_int_param(kwargs.get('antes'))
+        photos, next_cursor = self._album_photo_page(album, burst_id, before_id)
         values = {
             'event': event,
             'album': album,
             'photos': photos,
+            'burst_id': burst_id,
+            'burst_counts': self._album_burst_counts(album, photos, burst_id),
+            'album_url': self._album_page_url(event, album),
+            'photo_total': request.env['tienda.foto.asset'].sudo().search_count(self._album_photo_domain(album)),
+            'next_url': next_cursor and self._album_page_url(event, album, burst_id, next_cursor),
+            'next_json_url': next_cursor and self._album_page_url(event, album, burst_id, next_cursor, json=True),
             'breadcrumb': [
                 {'label': 'Galería', 'url': '/galeria'},
                 {'label': event.categoria_id.name, 'url': f"/galeria/categoria/{event.categoria_id.slug}"},
@@ -143,6 +319,31 @@ class FotoappGalleryController(http.Controller):
         }
         return request.render('fotoapp.gallery_album_detail', values)
 
+    @http.route(['/galeria/evento/<string:event_slug>/album/<int:album_id>/fotos'], type='http', auth='public', website=True, sitemap=False)
+    def gallery_album_photos(self, event_slug, album_id, **kwargs):
+        event, album = self._get_public_album(event_slug, album_id)
+        if not album:
+            return request.make_json_response({'error': 'not_found'}, status=404)
+        burst_id = self._parse_int_param(kwargs.get('rafaga'))
+        photos, next_cursor = self._album_photo_page(album, burst_id, self._parse_int_param(kwargs.get('antes')))
+        website = request.website
+        html = request.env['ir.ui.view']._render_template('fotoapp.gallery_album_photo_cards', {
+            'album': album,
+            'photos': photos,
+            'burst_id': burst_id,
+            'burst_counts': self._album_burst_counts(album, photos, burst_id),
+            'album_url': self._album_page_url(event, album),
+            'website': website,
+        })
+        return request.make_json_response({
+            'photos': [{
+                'id': photo.id,
+                'thumb_url': website.image_url(photo, 'imagen_thumb') if photo.has_derivatives else False,
+            } for photo in photos],
+            'html': str(html),
+            'next_url': next_cursor and self._album_page_url(event, album, burst_id, next_cursor, json=True),
+        })
+
     @http.route(['/galeria/foto/<int:photo_id>/cart/add'], type='http', auth='public', website=True, methods=['POST'])
     def gallery_add_photo_to_cart(self, photo_id, **post):
         quantity = 1
@@ -1,14 +1,20 @@
-import base64
 import logging
 import os
+import uuid
 
 from odoo import http, _
+from odoo.exceptions import ValidationError
 from odoo.http import request
 
+from odoo.addons.fotoapp.models.tienda_foto_asset import DEDUPE_MODES
+
 from .portal_base import PhotographerPortalMixin
 
 _logger = logging.getLogger(__name__)
 
+DEDUPE_MODE_KEYS = {key for key, dummy in DEDUPE_MODES}
+UPLOAD_BATCH_SIZE = 25
+
 
 class PhotographerAlbumsController(PhotographerPortalMixin, http.Controller):
     @http.route(['/mi/fotoapp/album/<int:album_id>'], type='http', auth='user', website=True, methods=['GET', 'POST'])
@@ -42,6 +48,7 @@ class PhotographerAlbumsController(PhotographerPortalMixin, http.Controller):
                 album.sudo().write({
                     'name': (post.get('name') or '').strip(),
                     'is_private': is_private,
+                    'collapse_bursts': 'collapse_bursts' in post,
                     'download_limit': int(post.get('download_limit') or 0),
                     'state': next_state,
                 })
@@ -61,43 +68,82 @@ class PhotographerAlbumsController(PhotographerPortalMixin, http.Controller):
                     values['errors'].append('Seleccioná al menos una imagen para subir.')
                 if not values['errors']:
                     Asset = request.env['tienda.foto.asset'].sudo()
+                    dedupe_mode = post.get('dedupe_mode') if post.get('dedupe_mode') in DEDUPE_MODE_KEYS else 'skip'
                     created = 0
                     skipped = 0
+                    duplicates = 0
                     subscription = album.event_id.plan_subscription_id or partner.active_plan_subscription_id
-                    limit_reached = False
-                    for upload in files:
-                        image, size_bytes = self._prepare_cover_image(upload, with_metadata=True)
-                        if not image:
-                            skipped += 1
+                    # Lo que no entra en el plan se descarta antes de decodificarlo. Sin
+                    # bloquear la suscripción: cada lote vuelve a controlar el cupo al crearse.
+                    accepted = request.env['fotoapp.quota.reservation']._fotoapp_accept(
+                        subscription, [self._upload_size(upload) for upload in files],
+                    )
+                    limit_reached = len(accepted) < len(files)
+                    files = [files[index] for index in accepted]
+                    batch_id = uuid.uuid4().hex
+                    # Lotes acotados: cada uno se decodifica y se crea de una vez.
+                    for start in range(0, len(files), UPLOAD_BATCH_SIZE):
+                        vals_list = []
+                        for upload in files[start:start + UPLOAD_BATCH_SIZE]:
+                            image = self._prepare_cover_image(upload)
+                            if not image:
+                                skipped += 1
+                                continue
+                            vals_list.append({
+                                'evento_id': album.event_id.id,
+                                'precio': precio,
+                                'imagen_original': image,
+                                'name': self._extract_upload_file_name(upload),
+                            })
+                        if not vals_list:
+                            continue
+                        try:
+                            with request.env.cr.savepoint():
+                                results = Asset._fotoapp_upload_batch(
+                                    vals_list, album=album, dedupe_mode=dedupe_mode, batch_id=batch_id,
+                                )
+                        except ValidationError as exc:
+                            _logger.info('Lote descartado en el álbum %s: %s', album.id, exc)
+                            skipped += len(vals_list)
                             continue
-                        if subscription and size_bytes and not subscription.can_store_bytes(size_bytes):
-                            limit_mb = subscription.plan_id.storage_limit_mb or int((subscription.plan_id.storage_limit_gb or 0.0) * 1024)
+                        for dummy, status in results:
+                            if status == 'created':
+                                created += 1
+                            elif status == 'invalid':
+                                skipped += 1
+                            elif status == 'quota':
+                                limit_reached = True
+                            else:
+                                duplicates += 1
+                        if limit_reached:
+                            break
+                    if limit_reached:
+                        plan = subscription.plan_id if subscription else False
+                        photos_left = None
+                        if subscription:
+                            subscription.invalidate_recordset(['usage_photo_count', 'usage_storage_bytes'])
+                            photos_left = subscription._fotoapp_available_quota()[0]
+                        if photos_left is not None and photos_left < 1:
+                            values['errors'].append(_(
+                                'Alcanzaste el límite de fotos de tu plan (%s). Eliminá fotos o actualizá tu plan para seguir subiendo.'
+                            ) % plan.photo_limit)
+                        else:
+                            limit_mb = plan and (plan.storage_limit_mb or int((plan.storage_limit_gb or 0.0) * 1024)) or 0
                             values['errors'].append(_(
                                 'Alcanzaste el límite de almacenamiento de tu plan (%s MB). Eliminá fotos o actualizá tu plan para seguir subiendo.'
                             ) % limit_mb)
-                            limit_reached = True
-                            break
-                        file_name = self._extract_upload_file_name(upload)
-                        asset_vals = {
-                            'evento_id': album.event_id.id,
-                            'precio': precio,
-                            'imagen_original': image,
-                            'name': file_name,
-                            'album_ids': [(4, album.id)],
-                            'file_size_bytes': size_bytes,
-                        }
-                        Asset.create(asset_vals)
-                        created += 1
-                    if limit_reached and not created:
+                    if limit_reached and not created and not duplicates:
                         should_redirect = False
-                    elif not created:
+                    elif not created and not duplicates:
                         values['errors'].append('No se pudo procesar ninguna imagen. Verificá los archivos seleccionados e intentá nuevamente.')
                         should_redirect = False
                     else:
+                        message = f"Se subieron {created} fotos correctamente."
+                        if duplicates:
+                            message += f" {duplicates} ya estaban cargadas y no ocuparon espacio nuevo."
                         if skipped:
-                            request.session['fotoapp_album_success'] = f"Se subieron {created} fotos correctamente. {skipped} archivos fueron descartados por estar vacíos o corruptos."
-                        else:
-                            request.session['fotoapp_album_success'] = f"Se subieron {created} fotos correctamente."
+                            message += f" {skipped} archivos fueron descartados por estar vacíos o corruptos."
+                        request.session['fotoapp_album_success'] = message
                 else:
                     should_redirect = False
             elif action in {'archive_photo', 'publish_photo'}:
@@ -153,16 +199,22 @@ class PhotographerAlbumsController(PhotographerPortalMixin, http.Controller):
         if not photo:
             return request.not_found()
 
-        image = photo.sudo().imagen_watermark or photo.sudo().imagen_original
-        if not image:
-            return request.not_found()
+        if not photo.has_derivatives:
+            return request.redirect('/web/static/img/placeholder.png')
+        # La miniatura se regenera junto con la marca de agua; el ETag cambia con su checksum.
+        stream = request.env['ir.binary']._get_stream_from(photo.sudo(), 'imagen_thumb')
+        response = stream.get_response(max_age=3600)
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
 
-        payload = base64.b64decode(image)
-        headers = [
-            ('Content-Type', 'image/png'),
-            ('Cache-Control', 'no-store, no-cache, must-revalidate, max-age=0'),
-        ]
-        return request.make_response(payload, headers)
+    def _upload_size(self, upload):
+        # Se mide el stream sin leerlo: alcanza para decidir si entra en el plan.
+        stream = upload.stream
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        return size
 
     def _extract_upload_file_name(self, upload):
         filename = getattr(upload, 'filename', '') or ''
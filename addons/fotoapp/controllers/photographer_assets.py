@@ -26,7 +26,8 @@ class PhotographerAssetsController(PhotographerPortalMixin, http.Controller):
                 ('evento_id.name', 'ilike', search_term),
                 ('album_ids.name', 'ilike', search_term)
             ]
-        photos = Asset.search(domain, order='write_date desc')
+        # Primero las que se eliminan antes; el orden usa el índice de delete_due_at.
+        photos = Asset.search(domain, order='delete_due_at, id desc')
         if request.httprequest.method == 'POST':
             action = post.get('action')
             photo = self._get_asset_for_partner(partner, int(post.get('photo_id')))
@@ -1,9 +1,11 @@
 import logging
 
 from odoo import http, fields
+from odoo.exceptions import ValidationError
 from odoo.http import request
 from odoo.tools import html2plaintext
 
+from .photographer_albums import DEDUPE_MODE_KEYS
 from .portal_base import PhotographerPortalMixin
 
 _logger = logging.getLogger(__name__)
@@ -123,6 +125,8 @@ class PhotographerEventsController(PhotographerPortalMixin, http.Controller):
             ('event_id', '=', event.id)
         ], order='create_date desc')
         album_error = request.session.pop('fotoapp_album_error', False)
+        bib_message = request.session.pop('fotoapp_bib_message', False)
+        ImportJob = request.env['fotoapp.import.job'].sudo()
         values = {
             'partner': partner,
             'event': event,
@@ -131,6 +135,11 @@ class PhotographerEventsController(PhotographerPortalMixin, http.Controller):
             'countries': countries,
             'errors': [],
             'album_error': album_error,
+            'bib_message': bib_message,
+            'import_jobs': ImportJob.search([('event_id', '=', event.id)], limit=5),
+            'import_message': request.session.pop('fotoapp_import_message', False),
+            'folder_import_enabled': bool(ImportJob._fotoapp_import_root()),
+            'can_import_folder': bool(event.carpeta_externa and ImportJob._fotoapp_import_root()),
             'active_menu': 'events',
         }
 
@@ -158,6 +167,16 @@ class PhotographerEventsController(PhotographerPortalMixin, http.Controller):
                         'descripcion': post.get('descripcion'),
                         'categoria_id': categoria_id,
                     }
+                    if values['folder_import_enabled']:
+                        try:
+                            precio_base = float(post.get('precio_base') or 0.0)
+                        except ValueError:
+                            precio_base = event.precio_base
+                        update_vals.update({
+                            'carpeta_externa': (post.get('carpeta_externa') or '').strip() or False,
+                            'carpeta_sync': 'carpeta_sync' in post,
+                            'precio_base': precio_base,
+                        })
                     cover = self._prepare_cover_image(post.get('image_cover'))
                     if cover:
                         update_vals['image_cover'] = cover
@@ -195,3 +214,70 @@ class PhotographerEventsController(PhotographerPortalMixin, http.Controller):
             }
             request.env['tienda.foto.album'].sudo().create(vals)
         return request.redirect(f"/mi/fotoapp/evento/{event.id}")
+
+    @http.route(['/mi/fotoapp/evento/<int:event_id>/duplicados'], type='http', auth='user', website=True, methods=['GET', 'POST'])
+    def photographer_event_duplicates(self, event_id, **post):
+        partner, denied = self._ensure_photographer()
+        if not partner:
+            return denied
+        event = self._get_event_for_partner(partner, event_id)
+        if not event:
+            return request.not_found()
+        if request.httprequest.method == 'POST' and post.get('action') == 'archive_duplicates':
+            archived = event.action_archive_duplicates()
+            request.session['fotoapp_duplicates_message'] = f"Se archivaron {archived} fotos duplicadas."
+            return request.redirect(f"/mi/fotoapp/evento/{event.id}/duplicados")
+        groups = event._fotoapp_duplicate_groups()
+        values = {
+            'partner': partner,
+            'event': event,
+            'groups': groups,
+            'wasted_bytes': sum(sum(group[1:].mapped('file_size_bytes')) for group in groups),
+            'message': request.session.pop('fotoapp_duplicates_message', False),
+            'active_menu': 'events',
+        }
+        return request.render('fotoapp.photographer_event_duplicates', values)
+
+    @http.route(['/mi/fotoapp/evento/<int:event_id>/dorsales'], type='http', auth='user', website=True, methods=['POST'])
+    def photographer_event_bib_import(self, event_id, **post):
+        partner, denied = self._ensure_photographer()
+        if not partner:
+            return denied
+        event = self._get_event_for_partner(partner, event_id)
+        if not event:
+            return request.not_found()
+        upload = request.httprequest.files.get('bib_file')
+        BibTag = request.env['tienda.foto.bib.tag'].sudo()
+        try:
+            rows = BibTag._fotoapp_parse_import(upload.read() if upload else b'', getattr(upload, 'filename', '') or '')
+            created, missing = BibTag._fotoapp_import_rows(event, rows)
+        except (UnicodeDecodeError, ValidationError) as exc:
+            message = f"No se pudo leer el archivo: {exc}"
+        else:
+            message = f"Se cargaron {created} dorsales."
+            if missing:
+                message += f" {missing} filas no coinciden con ninguna foto del evento."
+        request.session['fotoapp_bib_message'] = message
+        return request.redirect(f"/mi/fotoapp/evento/{event.id}")
+
+    @http.route(['/mi/fotoapp/evento/<int:event_id>/importar/carpeta'], type='http', auth='user', website=True, methods=['POST'])
+    def photographer_event_folder_import(self, event_id, **post):
+        partner, denied = self._ensure_photographer()
+        if not partner:
+            return denied
+        event = self._get_event_for_partner(partner, event_id)
+        if not event:
+            return request.not_found()
+        try:
+            precio = float(post.get('price') or 0.0)
+        except ValueError:
+            precio = 0.0
+        dedupe_mode = post.get('dedupe_mode') if post.get('dedupe_mode') in DEDUPE_MODE_KEYS else 'skip'
+        try:
+            request.env['fotoapp.import.job']._fotoapp_create_folder_job(event, precio, dedupe_mode=dedupe_mode)
+        except ValidationError as exc:
+            message = str(exc)
+        else:
+            message = 'La importación de la carpeta comenzó. Las fotos van a aparecer en los álbumes en unos minutos.'
+        request.session['fotoapp_import_message'] = message
+        return request.redirect(f"/mi/fotoapp/evento/{event.id}")
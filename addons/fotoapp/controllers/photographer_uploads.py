@@ -0,0 +1,207 @@
+import json
+import logging
+
+from odoo import http, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.http import request
+
+from odoo.addons.fotoapp.models.quota_reservation import PREFLIGHT_MAX_FILES
+
+from .photographer_albums import DEDUPE_MODE_KEYS
+from .portal_base import PhotographerPortalMixin
+
+_logger = logging.getLogger(__name__)
+
+
+class PhotographerUploadsController(PhotographerPortalMixin, http.Controller):
+    """API de subida por partes (inspirada en tus) para los álbumes del fotógrafo.
+
+    0. ``POST /mi/fotoapp/album/<id>/uploads/preflight`` con ``{"sizes": [...]}``
+       indica qué archivos entran en el plan y reserva su cupo.
+    1. ``POST /mi/fotoapp/album/<id>/uploads`` con ``Upload-Length`` abre la sesión.
+    2. ``PATCH /mi/fotoapp/uploads/<token>`` con ``Upload-Offset`` envía cada parte.
+    3. ``HEAD /mi/fotoapp/uploads/<token>`` devuelve el offset para reanudar.
+    Al recibir el último byte se crea la foto a partir del archivo del filestore.
+
+    ``POST /mi/fotoapp/evento/<id>/importar`` abre del mismo modo la subida de
+    un ZIP con todo el evento; al completarse queda una importación que avanza
+    en segundo plano y se consulta en ``GET /mi/fotoapp/importaciones/<id>``.
+    """
+
+    def _upload_error(self, message, status=400, session=None):
+        payload = {'error': message}
+        headers = []
+        if session:
+            payload['offset'] = int(session.received_bytes)
+            headers.append(('Upload-Offset', str(int(session.received_bytes))))
+        return request.make_json_response(payload, headers=headers, status=status)
+
+    def _check_upload_csrf(self):
+        # Las rutas reciben cuerpos binarios, por eso el token viaja en una cabecera.
+        token = request.httprequest.headers.get('X-CSRF-Token')
+        return bool(token) and request.validate_csrf(token)
+
+    def _get_upload_session(self, partner, token):
+        return request.env['fotoapp.upload.session'].sudo().search([
+            ('token', '=', token),
+            ('photographer_id', '=', partner.id),
+        ], limit=1)
+
+    def _session_payload(self, session):
+        return {
+            'token': session.token,
+            'offset': int(session.received_bytes),
+            'size': int(session.total_size),
+            'state': session.state,
+            'asset_id': session.asset_id.id or False,
+            'status': session.upload_status or False,
+            'import_job_id': session.import_job_id.id or False,
+        }
+
+    @http.route(['/mi/fotoapp/album/<int:album_id>/uploads/preflight'], type='http', auth='user', methods=['POST'], csrf=False)
+    def photographer_upload_preflight(self, album_id, **post):
+        partner = self._get_current_photographer()
+        if not partner or not self._check_upload_csrf():
+            return self._upload_error(_('Acceso denegado.'), status=403)
+        album = self._get_album_for_partner(partner, album_id)
+        if not album:
+            return self._upload_error(_('Álbum no encontrado.'), status=404)
+        try:
+            payload = json.loads(request.httprequest.get_data() or b'{}')
+            sizes = [int(size) for size in payload.get('sizes') or []]
+        except (AttributeError, TypeError, ValueError):
+            return self._upload_error(_('Enviá la lista de tamaños de los archivos.'))
+        if not sizes:
+            return self._upload_error(_('Enviá la lista de tamaños de los archivos.'))
+        if len(sizes) > PREFLIGHT_MAX_FILES:
+            return self._upload_error(_('No se pueden subir más de %s archivos a la vez.') % PREFLIGHT_MAX_FILES, status=413)
+        result = request.env['fotoapp.quota.reservation']._fotoapp_preflight(album, sizes)
+        return request.make_json_response(result)
+
+    @http.route(['/mi/fotoapp/album/<int:album_id>/uploads'], type='http', auth='user', methods=['POST'], csrf=False)
+    def photographer_upload_open(self, album_id, **post):
+        partner = self._get_current_photographer()
+        if not partner or not self._check_upload_csrf():
+            return self._upload_error(_('Acceso denegado.'), status=403)
+        album = self._get_album_for_partner(partner, album_id)
+        if not album:
+            return self._upload_error(_('Álbum no encontrado.'), status=404)
+        headers = request.httprequest.headers
+        try:
+            total_size = int(headers.get('Upload-Length') or post.get('size') or 0)
+            precio = float(post.get('price') or 0.0)
+        except ValueError:
+            return self._upload_error(_('El tamaño y el precio deben ser numéricos.'))
+        file_name = (post.get('file_name') or '').strip()[:120] or False
+        dedupe_mode = post.get('dedupe_mode') if post.get('dedupe_mode') in DEDUPE_MODE_KEYS else 'skip'
+        reservation = request.env['fotoapp.quota.reservation']._fotoapp_get(post.get('reservation'), partner)
+        if post.get('reservation') and not reservation:
+            return self._upload_error(_('La reserva de cuota venció. Volvé a iniciar la subida.'), status=409)
+        if reservation and not reservation._fotoapp_covers(album):
+            return self._upload_error(_('La reserva de cuota corresponde a otro plan. Volvé a iniciar la subida.'), status=409)
+        try:
+            session = request.env['fotoapp.upload.session']._fotoapp_open(
+                album, file_name, total_size, precio, dedupe_mode=dedupe_mode, reservation=reservation,
+            )
+        except ValidationError as exc:
+            return self._upload_error(str(exc), status=413 if total_size > 0 else 400)
+        location = f"/mi/fotoapp/uploads/{session.token}"
+        return request.make_json_response(
+            dict(self._session_payload(session), location=location),
+            headers=[('Location', location), ('Upload-Offset', '0')],
+            status=201,
+        )
+
+    @http.route(['/mi/fotoapp/evento/<int:event_id>/importar'], type='http', auth='user', methods=['POST'], csrf=False)
+    def photographer_import_open(self, event_id, **post):
+        partner = self._get_current_photographer()
+        if not partner or not self._check_upload_csrf():
+            return self._upload_error(_('Acceso denegado.'), status=403)
+        event = self._get_event_for_partner(partner, event_id)
+        if not event:
+            return self._upload_error(_('Evento no encontrado.'), status=404)
+        headers = request.httprequest.headers
+        try:
+            total_size = int(headers.get('Upload-Length') or post.get('size') or 0)
+            precio = float(post.get('price') or 0.0)
+        except ValueError:
+            return self._upload_error(_('El tamaño y el precio deben ser numéricos.'))
+        file_name = (post.get('file_name') or '').strip()[:120] or False
+        dedupe_mode = post.get('dedupe_mode') if post.get('dedupe_mode') in DEDUPE_MODE_KEYS else 'skip'
+        try:
+            session = request.env['fotoapp.upload.session']._fotoapp_open_import(
+                event, file_name, total_size, precio, dedupe_mode=dedupe_mode,
+            )
+        except ValidationError as exc:
+            return self._upload_error(str(exc), status=413 if total_size > 0 else 400)
+        location = f"/mi/fotoapp/uploads/{session.token}"
+        return request.make_json_response(
+            dict(self._session_payload(session), location=location),
+            headers=[('Location', location), ('Upload-Offset', '0')],
+            status=201,
+        )
+
+    @http.route(['/mi/fotoapp/importaciones/<int:job_id>'], type='http', auth='user', methods=['GET'])
+    def photographer_import_status(self, job_id, **kwargs):
+        partner = self._get_current_photographer()
+        job = partner and request.env['fotoapp.import.job'].sudo().search([
+            ('id', '=', job_id),
+            ('photographer_id', '=', partner.id),
+        ], limit=1)
+        if not job:
+            return self._upload_error(_('Importación no encontrada.'), status=404)
+        return request.make_json_response(job._fotoapp_payload(), headers=[('Cache-Control', 'no-store')])
+
+    @http.route(['/mi/fotoapp/uploads/<string:token>'], type='http', auth='user', methods=['GET', 'HEAD'])
+    def photographer_upload_status(self, token, **kwargs):
+        partner = self._get_current_photographer()
+        session = partner and self._get_upload_session(partner, token)
+        if not session:
+            return self._upload_error(_('Subida no encontrada.'), status=404)
+        return request.make_json_response(
+            self._session_payload(session),
+            headers=[
+                ('Upload-Offset', str(int(session.received_bytes))),
+                ('Upload-Length', str(int(session.total_size))),
+                ('Cache-Control', 'no-store'),
+            ],
+        )
+
+    @http.route(['/mi/fotoapp/uploads/<string:token>'], type='http', auth='user', methods=['PATCH', 'POST'], csrf=False)
+    def photographer_upload_chunk(self, token, **kwargs):
+        partner = self._get_current_photographer()
+        if not partner or not self._check_upload_csrf():
+            return self._upload_error(_('Acceso denegado.'), status=403)
+        session = self._get_upload_session(partner, token)
+        if not session:
+            return self._upload_error(_('Subida no encontrada.'), status=404)
+        try:
+            offset = int(request.httprequest.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return self._upload_error(_('Falta la cabecera Upload-Offset.'), session=session)
+        try:
+            with request.env.cr.savepoint():
+                new_offset = session._fotoapp_append(offset, request.httprequest.stream)
+        except UserError as exc:
+            session.invalidate_recordset()
+            if isinstance(exc, ValidationError):
+                # Archivo inválido o más grande que lo declarado: no tiene sentido reanudar.
+                session.action_cancel()
+                return self._upload_error(str(exc), status=422, session=session)
+            return self._upload_error(str(exc), status=409, session=session)
+        return request.make_json_response(
+            self._session_payload(session),
+            headers=[('Upload-Offset', str(new_offset))],
+        )
+
+    @http.route(['/mi/fotoapp/uploads/<string:token>'], type='http', auth='user', methods=['DELETE'], csrf=False)
+    def photographer_upload_cancel(self, token, **kwargs):
+        partner = self._get_current_photographer()
+        if not partner or not self._check_upload_csrf():
+            return self._upload_error(_('Acceso denegado.'), status=403)
+        session = self._get_upload_session(partner, token)
+        if not session:
+            return self._upload_error(_('Subida no encontrada.'), status=404)
+        if session.state == 'open':
+            session.action_cancel()
+        return request.make_json_response(self._session_payload(session))
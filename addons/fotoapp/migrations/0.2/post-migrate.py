@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Las fotos ya procesadas no vuelven a la cola de marcas de agua.
+
+    La columna ``watermark_state`` se crea con ``pending`` en todas las fotos;
+    sólo quedan pendientes las que todavía no tienen sus tamaños generados.
+    """
+    if not version:
+        return
+    cr.execute(
+        """
+        UPDATE tienda_foto_asset asset
+        SET watermark_state = 'done'
+        WHERE asset.watermark_state = 'pending'
+          AND asset.has_derivatives
+          AND EXISTS (
+              SELECT 1 FROM ir_attachment attachment
+              WHERE attachment.res_model = 'tienda.foto.asset'
+                AND attachment.res_field = 'imagen_watermark'
+                AND attachment.res_id = asset.id
+          )
+        """
+    )
+    _logger.info('Marcas de agua ya generadas: %s fotos fuera de la cola', cr.rowcount)
+    cr.execute("SELECT count(*) FROM tienda_foto_asset WHERE watermark_state = 'pending'")
+    _logger.info('Fotos sin tamaños generados encoladas: %s', cr.fetchone()[0])
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 from . import utils
+from . import zip_stream
+from . import ingest
 from . import plan
 from . import debt
 from . import plan_subscription
@@ -11,6 +13,7 @@ from . import tienda_foto_categoria
 from . import tienda_foto_evento
 from . import tienda_foto_album
 from . import tienda_foto_asset
+from . import tienda_foto_bib_tag
 from . import sale_order_line
 from . import sale_order
 from . import product_template
@@ -18,4 +21,11 @@ from . import res_users
 from . import res_config_settings
 from . import payment_transaction
 from . import payment_provider
-from . import sale_subscription_template
\ No newline at end of file
+from . import sale_subscription_template
+from . import ir_attachment
+from . import upload_session
+from . import filestore_orphan
+from . import photo_counter
+from . import quota_reservation
+from . import import_job
+from . import import_manifest
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""OCR de dorsales con Tesseract instalado en el servidor.
+
+No usa el ORM: las fotos se leen del filestore, se pasan a ``tesseract`` y los
+números detectados vuelven a quien llama, que los guarda por lotes.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Iterable, Iterator
+
+from PIL import Image, ImageOps
+
+_logger = logging.getLogger(__name__)
+
+TESSERACT_CMD = 'tesseract'
+TESSERACT_TIMEOUT = 60
+OCR_MAX_SIZE = 1600
+OCR_MIN_CONFIDENCE = 60.0
+BIB_MIN_DIGITS = 1
+BIB_MAX_DIGITS = 6
+
+
+def tesseract_available(command=TESSERACT_CMD) -> bool:
+    return shutil.which(command) is not None
+
+
+def _prepare_image(source) -> bytes:
+    image = Image.open(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    if image.format == 'JPEG':
+        # Decodifica el JPEG ya reducido: la OCR no necesita la resolución completa.
+        image.draft('L', (OCR_MAX_SIZE, OCR_MAX_SIZE))
+    image = ImageOps.exif_transpose(image).convert('L')
+    image.thumbnail((OCR_MAX_SIZE, OCR_MAX_SIZE))
+    image = ImageOps.autocontrast(image)
+    buf = BytesIO()
+    image.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def _parse_tsv(output: str, min_confidence: float) -> list:
+    found = {}
+    for line in output.splitlines()[1:]:
+        columns = line.split('\t')
+        if len(columns) < 12:
+            continue
+        text = columns[11].strip()
+        try:
+            confidence = float(columns[10])
+        except ValueError:
+            continue
+        if not text.isdigit() or not BIB_MIN_DIGITS <= len(text) <= BIB_MAX_DIGITS:
+            continue
+        if confidence < min_confidence:
+            continue
+        found[text] = max(found.get(text, 0.0), confidence)
+    return sorted(found.items(), key=lambda item: -item[1])
+
+
+def read_bibs(source, min_confidence=OCR_MIN_CONFIDENCE, command=TESSERACT_CMD, timeout=TESSERACT_TIMEOUT) -> list:
+    """Dorsales ``[(dorsal, confianza), ...]`` leídos en ``source`` (bytes o ruta)."""
+    result = subprocess.run(
+        [command, 'stdin', 'stdout', '--psm', '11', '-c', 'tessedit_char_whitelist=0123456789', 'tsv'],
+        input=_prepare_image(source),
+        capture_output=True,
+        timeout=timeout,
+        check=True,
+        # Un hilo por tesseract: el paralelismo lo controla el pool.
+        env=dict(os.environ, OMP_THREAD_LIMIT='1'),
+    )
+    return _parse_tsv(result.stdout.decode('utf-8', 'replace'), min_confidence)
+
+
+def fair_order(tasks: Iterable[tuple]) -> list:
+    """Intercala las tareas ``(dueño, clave, origen)`` de a una por dueño."""
+    queues = OrderedDict()
+    for task in tasks:
+        queues.setdefault(task[0], []).append(task)
+    ordered = []
+    while queues:
+        for owner in list(queues):
+            ordered.append(queues[owner].pop(0))
+            if not queues[owner]:
+                del queues[owner]
+    return ordered
+
+
+def _ocr_task(task):
+    owner, key, source, min_confidence = task
+    try:
+        return key, read_bibs(source, min_confidence=min_confidence), None
+    except Exception as exc:  # pylint: disable=broad-except
+        return key, None, str(exc)
+
+
+def ocr_many(tasks: Iterable[tuple], workers: int = 1, min_confidence=OCR_MIN_CONFIDENCE) -> Iterator[tuple]:
+    """Corre la OCR de las tareas ``(dueño, clave, origen)``.
+
+    Se intercalan por fotógrafo para que una subida grande no demore a los
+    demás, con hasta ``workers`` tesseract a la vez. Devuelve ``(clave,
+    dorsales, error)``. Alcanza con hilos: ``tesseract`` corre aparte y libera
+    el GIL, sin hacer fork del worker de Odoo.
+    """
+    tasks = [task + (min_confidence,) for task in fair_order(tasks)]
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _ocr_task(task)
+        return
+    with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        yield from pool.map(_ocr_task, tasks)
+
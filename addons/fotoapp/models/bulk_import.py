@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Recorrido de las fotos de un ZIP o de una carpeta del servidor.
+
+Las entradas salen de a una con una función ``open``; quien las usa las copia
+al filestore por partes, así una importación de miles de fotos nunca tiene más
+de un bloque en memoria. Las subcarpetas son los nombres de los álbumes.
+"""
+from __future__ import annotations
+
+import os
+import posixpath
+import shutil
+import zipfile
+from dataclasses import dataclass
+from stat import S_ISREG
+from typing import Callable, Iterator
+from urllib.parse import unquote, urlparse
+
+from .zip_stream import CHUNK_SIZE
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+ALBUM_SEPARATOR = ' / '
+
+
+@dataclass(frozen=True)
+class ImportEntry:
+    path: str
+    album: str
+    name: str
+    size: int
+    open: Callable
+    mtime: float = 0.0
+
+    def copy_to(self, destination):
+        """Copia la entrada por partes a ``destination`` y devuelve los bytes escritos."""
+        with self.open() as source, open(destination, 'wb') as target:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+        return os.path.getsize(destination)
+
+
+def is_photo(path) -> bool:
+    parts = path.replace('\\', '/').split('/')
+    # Carpetas y archivos ocultos, y los metadatos que agrega macOS al comprimir.
+    if any(part.startswith('.') or part == '__MACOSX' for part in parts):
+        return False
+    return parts[-1].lower().endswith(IMAGE_EXTENSIONS)
+
+
+def album_for(path) -> str:
+    """Álbum de una ruta relativa: sus carpetas, o ``''`` en la raíz."""
+    folder = posixpath.dirname(path.replace('\\', '/')).strip('/')
+    return ALBUM_SEPARATOR.join(part for part in folder.split('/') if part)
+
+
+def iter_zip_entries(path) -> Iterator[ImportEntry]:
+    """Fotos del ZIP ordenadas por nombre.
+
+    Sólo se lee el índice del ZIP; cada foto se descomprime al abrirla.
+    """
+    with zipfile.ZipFile(path) as archive:
+        infos = sorted(
+            (info for info in archive.infolist() if not info.is_dir() and is_photo(info.filename)),
+            key=lambda info: info.filename,
+        )
+        for info in infos:
+            yield ImportEntry(
+                path=info.filename,
+                album=album_for(info.filename),
+                name=posixpath.basename(info.filename),
+                size=info.file_size,
+                open=lambda info=info: archive.open(info),
+            )
+
+
+def iter_folder_entries(root) -> Iterator[ImportEntry]:
+    """Fotos bajo ``root`` ordenadas por ruta relativa, sin seguir enlaces simbólicos.
+
+    Primero se juntan sólo los nombres: el orden es el mismo que en un ZIP y
+    se puede retomar después de la última ruta procesada.
+    """
+    relatives = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        for filename in filenames:
+            relative = os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/')
+            if is_photo(relative):
+                relatives.append(relative)
+    for relative in sorted(relatives):
+        full_path = os.path.join(root, *relative.split('/'))
+        if os.path.islink(full_path):
+            continue
+        try:
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            # Borrado entre el listado y la lectura, habitual en carpetas en vivo.
+            continue
+        if not S_ISREG(stat.st_mode):
+            continue
+        yield ImportEntry(
+            path=relative,
+            album=album_for(relative),
+            name=posixpath.basename(relative),
+            size=stat.st_size,
+            open=lambda full_path=full_path: open(full_path, 'rb'),
+            mtime=stat.st_mtime,
+        )
+
+
+def local_path(url) -> str:
+    """Carpeta local de ``url`` (``file://`` o ruta absoluta), o ``''``."""
+    url = (url or '').strip()
+    if url.startswith('file://'):
+        return unquote(urlparse(url).path)
+    return url if os.path.isabs(url) else ''
+
+
+def is_within(path, root) -> bool:
+    """Indica si ``path`` queda dentro de ``root``, resolviendo enlaces simbólicos."""
+    if not path or not root:
+        return False
+    real_path = os.path.realpath(path)
+    real_root = os.path.realpath(root)
+    return os.path.commonpath([real_path, real_root]) == real_root
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import logging
+import os
+from collections import defaultdict
+
+from odoo import api, fields, models
+
+from .utils import cron_can_commit
+
+_logger = logging.getLogger(__name__)
+
+RECLAIM_BATCH_SIZE = 500
+
+
+class FotoappFilestoreOrphan(models.Model):
+    """Archivo del filestore que quedó sin foto tras eliminarla.
+
+    Odoo sólo libera esos archivos en su recolección diaria. Este registro
+    permite devolver el espacio apenas se confirma la eliminación y atribuirlo
+    al fotógrafo.
+    """
+    _name = 'fotoapp.filestore.orphan'
+    _description = 'Archivo huérfano del filestore'
+    _order = 'id'
+
+    store_fname = fields.Char(string='Archivo', required=True, index=True)
+    file_size = fields.Integer(string='Tamaño')
+    photographer_id = fields.Many2one('res.partner', string='Fotógrafo', index=True, ondelete='set null')
+
+    @api.model
+    def _fotoapp_track_assets(self, assets):
+        """Registra los archivos de ``assets`` antes de eliminarlas."""
+        if not assets:
+            return
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', assets._name),
+            ('res_id', 'in', assets.ids),
+            ('res_field', '!=', False),
+            ('store_fname', '!=', False),
+        ])
+        photographers = {asset.id: asset.photographer_id.id for asset in assets}
+        self.sudo().create([{
+            'store_fname': attachment.store_fname,
+            'file_size': attachment.file_size,
+            'photographer_id': photographers.get(attachment.res_id),
+        } for attachment in attachments])
+        cron = self.env.ref('fotoapp.ir_cron_fotoapp_filestore_reclaim', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    @api.model
+    def _fotoapp_remove_file(self, store_fname):
+        """Borra el archivo y su marca en la recolección de Odoo; devuelve si existía."""
+        Attachment = self.env['ir.attachment']
+        try:
+            os.unlink(Attachment._full_path(store_fname))
+            removed = True
+        except FileNotFoundError:
+            removed = False
+        except OSError as exc:
+            _logger.warning('No se pudo eliminar %s del filestore: %s', store_fname, exc)
+            return False
+        with contextlib.suppress(OSError):
+            os.unlink(Attachment._full_path(f'checklist/{store_fname}'))
+        return removed
+
+    @api.model
+    def cron_reclaim_filestore(self, batch_size=RECLAIM_BATCH_SIZE):
+        """Elimina por lotes los archivos huérfanos y devuelve los bytes liberados por fotógrafo.
+
+        Un archivo sólo se borra si ningún adjunto lo sigue usando: el
+        filestore deduplica por contenido, así que otra foto idéntica puede
+        compartirlo. Como en la recolección de Odoo, ``ir_attachment`` se
+        bloquea en modo SHARE durante la verificación para que no aparezca un
+        adjunto nuevo sobre un archivo a punto de borrarse.
+        """
+        reclaimed = defaultdict(int)
+        while True:
+            orphans = self.sudo().search([], limit=batch_size)
+            if not orphans:
+                break
+            self.env.cr.execute("LOCK ir_attachment IN SHARE MODE")
+            self.env.cr.execute(
+                "SELECT DISTINCT store_fname FROM ir_attachment WHERE store_fname IN %s",
+                (tuple(set(orphans.mapped('store_fname'))),)
+            )
+            referenced = {row[0] for row in self.env.cr.fetchall()}
+            seen = set()
+            for orphan in orphans:
+                if orphan.store_fname in referenced or orphan.store_fname in seen:
+                    continue
+                seen.add(orphan.store_fname)
+                if self._fotoapp_remove_file(orphan.store_fname):
+                    reclaimed[orphan.photographer_id.id] += orphan.file_size or 0
+            orphans.unlink()
+            if cron_can_commit():
+                self.env.cr.commit()
+        for partner_id, size in reclaimed.items():
+            _logger.info(
+                'Filestore: %.1f MB liberados del fotógrafo %s', size / (1024 ** 2), partner_id or 'sin asignar'
+            )
+        return dict(reclaimed)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Caché de páginas de la galería pública.
+
+Cada worker guarda las páginas en un LRU chico, por pedido y por un contador de
+versión en ``ir_config_parameter``. Los cambios públicos de eventos, categorías
+y álbumes suben el contador y los workers dejan de servir páginas viejas.
+
+El contador se lee y escribe con SQL: ``set_param`` limpia las cachés del
+registro en todos los workers, mucho más caro que lo que esta caché ahorra.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+GALLERY_VERSION_KEY = 'fotoapp.gallery_cache_version'
+GALLERY_CACHE_SIZE = 256
+GALLERY_CACHE_TTL = 300
+
+
+def read_gallery_version(cr):
+    """Devuelve ``(versión, modificado)``; ``modificado`` es un datetime UTC sin zona."""
+    cr.execute(
+        "SELECT value, write_date FROM ir_config_parameter WHERE key = %s",
+        (GALLERY_VERSION_KEY,)
+    )
+    row = cr.fetchone()
+    if not row:
+        return '0', None
+    return row[0], row[1]
+
+
+def bump_gallery_version(cr):
+    cr.execute(
+        """
+        INSERT INTO ir_config_parameter (key, value, create_uid, write_uid, create_date, write_date)
+        VALUES (%s, '1', 1, 1, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC')
+        ON CONFLICT (key) DO UPDATE
+            SET value = (COALESCE(NULLIF(ir_config_parameter.value, ''), '0')::bigint + 1)::text,
+                write_date = EXCLUDED.write_date
+        """,
+        (GALLERY_VERSION_KEY,)
+    )
+
+
+def body_etag(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()
+
+
+class PageCache:
+    """LRU de ``clave -> (cuerpo, etag)`` con vencimiento, seguro entre hilos.
+
+    El vencimiento acota cuánto tardan en verse los datos que no suben la
+    versión, como cantidades de fotos o portadas de álbum.
+    """
+
+    def __init__(self, size=GALLERY_CACHE_SIZE, ttl=GALLERY_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, etag, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, etag
+
+    def set(self, key, body, etag):
+        with self._lock:
+            self._entries[key] = (body, etag, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+page_cache = PageCache()
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import itertools
+import logging
+import os
+import time
+import uuid
+import zipfile
+from collections import Counter, defaultdict
+
+from odoo import api, fields, models, _
+from odoo.exceptions import ValidationError
+
+from . import bulk_import
+from .tienda_foto_asset import DEDUPE_MODES
+from .utils import cron_can_commit
+
+_logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 25
+IMPORT_TIME_BUDGET = 600
+IMPORT_ROOT_PARAM = 'fotoapp.import_root'
+IMPORT_STATUS_COUNTER = {
+    'created': 'created_count',
+    'skipped': 'duplicate_count',
+    'linked': 'duplicate_count',
+    'replaced': 'duplicate_count',
+    'invalid': 'skipped_count',
+    'quota': 'quota_count',
+}
+
+
+class FotoappImportJob(models.Model):
+    """Importación masiva de las fotos de un evento desde un ZIP o una carpeta.
+
+    El cron recorre las entradas de a una, copia cada foto al filestore por
+    partes y crea las fotos por lotes. Después de cada lote se guarda la ruta
+    de la última foto procesada, así una importación cortada retoma donde
+    quedó aunque la carpeta haya cambiado.
+    """
+    _name = 'fotoapp.import.job'
+    _description = 'Importación masiva de fotos'
+    _order = 'id desc'
+
+    event_id = fields.Many2one('tienda.foto.evento', string='Evento', required=True, index=True, ondelete='cascade')
+    photographer_id = fields.Many2one(related='event_id.photographer_id', store=True, string='Fotógrafo')
+    source = fields.Selection([
+        ('zip', 'Archivo ZIP'),
+        ('folder', 'Carpeta del servidor'),
+    ], string='Origen', required=True, default='zip')
+    file_name = fields.Char(string='Archivo')
+    source_path = fields.Char(string='Ruta de origen', copy=False)
+    precio = fields.Float(string='Precio')
+    dedupe_mode = fields.Selection(DEDUPE_MODES, string='Si la foto ya existe', default='skip', required=True)
+    batch_id = fields.Char(string='Lote', default=lambda self: uuid.uuid4().hex, copy=False)
+    state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('running', 'En curso'),
+        ('done', 'Terminada'),
+        ('failed', 'Con error'),
+    ], string='Estado', default='pending', required=True, index=True)
+    total_count = fields.Integer(string='Fotos encontradas')
+    processed_count = fields.Integer(string='Fotos procesadas')
+    last_path = fields.Char(string='Última foto procesada', copy=False)
+    created_count = fields.Integer(string='Fotos creadas')
+    duplicate_count = fields.Integer(string='Duplicadas')
+    skipped_count = fields.Integer(string='Descartadas')
+    quota_count = fields.Integer(string='Fuera del plan')
+    progress = fields.Float(string='Progreso', compute='_compute_progress')
+    error_message = fields.Text(string='Error')
+
+    @api.depends('total_count', 'processed_count', 'state')
+    def _compute_progress(self):
+        for job in self:
+            if job.state == 'done':
+                job.progress = 100.0
+            elif job.total_count:
+                job.progress = min(100.0 * job.processed_count / job.total_count, 100.0)
+            else:
+                job.progress = 0.0
+
+    @api.model
+    def _fotoapp_import_root(self):
+        return self.env['ir.config_parameter'].sudo().get_param(IMPORT_ROOT_PARAM) or ''
+
+    @api.model
+    def _fotoapp_check_folder(self, folder, base=None):
+        # Sólo se leen carpetas dentro de la raíz configurada por el administrador
+        # y, si el fotógrafo tiene un reservorio local, dentro de ese reservorio.
+        allowed = bulk_import.is_within(folder, self._fotoapp_import_root())
+        if base and not bulk_import.is_within(folder, base):
+            allowed = False
+        if not allowed or not os.path.isdir(folder):
+            raise ValidationError(_('La carpeta %s no está disponible para importar.') % (folder or ''))
+
+    @api.model
+    def _fotoapp_event_folder(self, event):
+        """Carpeta del servidor del evento, ya verificada.
+
+        ``carpeta_externa`` puede ser absoluta o relativa al reservorio del
+        fotógrafo cuando ``photo_reservoir_url`` es una ruta local.
+        """
+        folder = (event.carpeta_externa or '').strip()
+        reservoir = bulk_import.local_path(event.photographer_id.photo_reservoir_url)
+        if reservoir and folder and not os.path.isabs(folder):
+            folder = os.path.join(reservoir, folder)
+        self._fotoapp_check_folder(folder, reservoir)
+        return folder
+
+    @api.model
+    def _fotoapp_create_zip_job(self, event, path, file_name, precio, dedupe_mode='skip'):
+        """Crea la importación de un ZIP ya guardado en ``path`` (un temporal del filestore)."""
+        if not zipfile.is_zipfile(path):
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            raise ValidationError(_('El archivo no es un ZIP válido.'))
+        return self._fotoapp_create_job(event, {
+            'source': 'zip',
+            'source_path': path,
+            'file_name': file_name,
+            'precio': precio,
+            'dedupe_mode': dedupe_mode,
+        })
+
+    @api.model
+    def _fotoapp_create_folder_job(self, event, precio, dedupe_mode='skip'):
+        """Crea la importación de ``carpeta_externa`` del evento."""
+        folder = self._fotoapp_event_folder(event)
+        return self._fotoapp_create_job(event, {
+            'source': 'folder',
+            'source_path': folder,
+            'file_name': os.path.basename(folder.rstrip('/')),
+            'precio': precio,
+            'dedupe_mode': dedupe_mode,
+        })
+
+    @api.model
+    def _fotoapp_create_job(self, event, vals):
+        job = self.sudo().create(dict(vals, event_id=event.id))
+        cron = self.env.ref('fotoapp.ir_cron_fotoapp_import_jobs', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+        return job
+
+    def _fotoapp_entries(self):
+        self.ensure_one()
+        if self.source == 'zip':
+            return bulk_import.iter_zip_entries(self.source_path)
+        self._fotoapp_check_folder(self.source_path)
+        return bulk_import.iter_folder_entries(self.source_path)
+
+    @api.model
+    def _fotoapp_album(self, event, name, albums):
+        """Álbum del evento para la subcarpeta ``name``; la raíz usa el nombre del evento."""
+        name = (name or event.name or _('Importación'))[:120]
+        if name not in albums:
+            Album = self.env['tienda.foto.album'].sudo()
+            album = Album.search([('event_id', '=', event.id), ('name', '=', name)], limit=1)
+            albums[name] = album or Album.create({'name': name, 'event_id': event.id})
+        return albums[name]
+
+    @api.model
+    def _fotoapp_import_entries(self, event, entries, albums, precio, dedupe_mode='skip', batch_id=None):
+        """Copia las entradas al filestore y crea sus fotos en el evento.
+
+        Devuelve ``[(entrada, foto, estado)]`` con los estados de
+        ``_fotoapp_upload_batch``; las entradas que no se pudieron leer o
+        superan el tamaño máximo quedan como ``invalid``.
+        """
+        Asset = self.env['tienda.foto.asset'].sudo()
+        Attachment = self.env['ir.attachment']
+        Reservation = self.env['fotoapp.quota.reservation']
+        partner = event.photographer_id
+        subscription = event.plan_subscription_id or partner.active_plan_subscription_id
+        max_bytes = self.env['fotoapp.upload.session']._get_upload_max_bytes()
+        results = []
+        groups = defaultdict(list)
+        for entry in entries:
+            if 0 < entry.size <= max_bytes:
+                groups[entry.album].append(entry)
+            else:
+                results.append((entry, Asset, 'invalid'))
+        for album_name, group in groups.items():
+            album = self._fotoapp_album(event, album_name, albums)
+            # El cupo se verifica con el tamaño declarado, antes de copiar o decodificar,
+            # sin bloquear la suscripción mientras se procesa el lote.
+            accepted = Reservation._fotoapp_accept(subscription, [entry.size for entry in group])
+            accepted_set = set(accepted)
+            results.extend((entry, Asset, 'quota') for index, entry in enumerate(group) if index not in accepted_set)
+            tmp_paths = []
+            copied = []
+            try:
+                for index in accepted:
+                    entry = group[index]
+                    extension = os.path.splitext(entry.name)[1][:10].lower()
+                    tmp_path = Attachment._fotoapp_tmp_path(suffix=extension)
+                    tmp_paths.append(tmp_path)
+                    try:
+                        entry.copy_to(tmp_path)
+                    except (OSError, zipfile.BadZipFile, EOFError) as exc:
+                        _logger.info('Evento %s: no se pudo leer %s: %s', event.id, entry.path, exc)
+                        results.append((entry, Asset, 'invalid'))
+                        continue
+                    copied.append((entry, {
+                        'evento_id': event.id,
+                        'precio': precio,
+                        'name': entry.name[:120],
+                        'fotoapp_source_path': tmp_path,
+                    }))
+                if not copied:
+                    continue
+                try:
+                    with self.env.cr.savepoint():
+                        uploaded = Asset._fotoapp_upload_batch(
+                            [vals for dummy, vals in copied], album=album, dedupe_mode=dedupe_mode,
+                            batch_id=batch_id,
+                        )
+                except Exception as exc:  # pylint: disable=broad-except
+                    # Un lote fallido no debe trabar la importación: se descarta y se sigue.
+                    _logger.info('Evento %s: lote descartado en %s: %s', event.id, album.name, exc,
+                                 exc_info=not isinstance(exc, ValidationError))
+                    results.extend((entry, Asset, 'invalid') for entry, dummy in copied)
+                    continue
+                results.extend(
+                    (entry, asset, status) for (entry, dummy), (asset, status) in zip(copied, uploaded)
+                )
+            finally:
+                for tmp_path in tmp_paths:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(tmp_path)
+        return results
+
+    def _fotoapp_run(self, deadline=None):
+        """Procesa la importación por lotes; devuelve False si se agotó el tiempo."""
+        self.ensure_one()
+        albums = {}
+        try:
+            if self.state == 'pending':
+                with contextlib.closing(self._fotoapp_entries()) as entries:
+                    total = sum(1 for dummy in entries)
+                self.write({'state': 'running', 'total_count': total})
+            with contextlib.closing(self._fotoapp_entries()) as entries:
+                # Las entradas salen ordenadas por ruta: se retoma después de la última
+                # procesada, aunque en la carpeta se hayan agregado o borrado fotos.
+                last_path = self.last_path
+                pending = itertools.dropwhile(lambda entry: last_path and entry.path <= last_path, entries)
+                while True:
+                    batch = list(itertools.islice(pending, IMPORT_BATCH_SIZE))
+                    if not batch:
+                        break
+                    # Con un error inesperado la transacción sigue usable para marcar el fallo.
+                    with self.env.cr.savepoint():
+                        results = self._fotoapp_import_entries(
+                            self.event_id, batch, albums, self.precio, self.dedupe_mode, self.batch_id,
+                        )
+                    counts = Counter(IMPORT_STATUS_COUNTER[status] for dummy, dummy, status in results)
+                    values = {'processed_count': self.processed_count + len(batch), 'last_path': batch[-1].path}
+                    for field_name, count in counts.items():
+                        values[field_name] = self[field_name] + count
+                    self.write(values)
+                    if cron_can_commit():
+                        self.env.cr.commit()
+                    if deadline and time.monotonic() > deadline:
+                        return False
+        except (OSError, zipfile.BadZipFile, ValidationError) as exc:
+            _logger.warning('Importación %s fallida: %s', self.id, exc)
+            self.write({'state': 'failed', 'error_message': str(exc)})
+        except Exception as exc:  # pylint: disable=broad-except
+            # Si quedara en curso, el cron reintentaría el mismo lote para siempre.
+            _logger.exception('Importación %s fallida', self.id)
+            self.write({'state': 'failed', 'error_message': str(exc) or exc.__class__.__name__})
+        else:
+            self.write({'state': 'done'})
+            _logger.info(
+                'Importación %s terminada: %s creadas, %s duplicadas, %s descartadas, %s fuera del plan',
+                self.id, self.created_count, self.duplicate_count, self.skipped_count, self.quota_count,
+            )
+        self._fotoapp_remove_source()
+        return True
+
+    def _fotoapp_remove_source(self):
+        for job in self.filtered(lambda job: job.source == 'zip' and job.source_path):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(job.source_path)
+            job.source_path = False
+
+    @api.model
+    def cron_process_import_jobs(self):
+        deadline = time.monotonic() + IMPORT_TIME_BUDGET
+        jobs = self.sudo().search([('state', 'in', ('pending', 'running'))], order='id')
+        for job in jobs:
+            if not job._fotoapp_run(deadline):
+                # Quedan fotos: se sigue en otra corrida para no bloquear al worker.
+                self.env.ref('fotoapp.ir_cron_fotoapp_import_jobs').sudo()._trigger()
+                break
+
+    def unlink(self):
+        self._fotoapp_remove_source()
+        return super().unlink()
+
+    def _fotoapp_payload(self):
+        self.ensure_one()
+        return {
+            'id': self.id,
+            'state': self.state,
+            'total': self.total_count,
+            'processed': self.processed_count,
+            'created': self.created_count,
+            'duplicates': self.duplicate_count,
+            'skipped': self.skipped_count,
+            'quota': self.quota_count,
+            'progress': round(self.progress, 1),
+            'error': self.error_message or False,
+        }
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import itertools
+import logging
+import time
+import uuid
+
+from odoo import api, fields, models
+from odoo.exceptions import ValidationError
+
+from . import bulk_import
+from .import_job import IMPORT_BATCH_SIZE, IMPORT_TIME_BUDGET
+from .utils import cron_can_commit
+
+_logger = logging.getLogger(__name__)
+
+# Un archivo modificado hace menos de esto puede estar copiándose todavía.
+HOT_FOLDER_SETTLE_SECONDS = 10
+MANIFEST_STATES = {
+    'created': 'imported',
+    'skipped': 'duplicate',
+    'linked': 'duplicate',
+    'replaced': 'duplicate',
+    'invalid': 'invalid',
+}
+
+
+class FotoappImportManifest(models.Model):
+    """Archivo ya visto en la carpeta en vivo de un evento.
+
+    Cada corrida compara la carpeta con este registro y sólo importa lo nuevo
+    o lo que cambió de fecha o tamaño. Las filas se confirman por lote, así
+    una corrida interrumpida retoma sin volver a procesar lo ya importado.
+    """
+    _name = 'fotoapp.import.manifest'
+    _description = 'Archivo sincronizado de carpeta en vivo'
+    _order = 'event_id, path'
+
+    event_id = fields.Many2one('tienda.foto.evento', string='Evento', required=True, ondelete='cascade')
+    path = fields.Char(string='Ruta', required=True)
+    mtime = fields.Float(string='Modificado')
+    size = fields.Float(string='Tamaño')
+    sha256 = fields.Char(string='SHA-256')
+    asset_id = fields.Many2one('tienda.foto.asset', string='Foto', ondelete='set null')
+    state = fields.Selection([
+        ('imported', 'Importada'),
+        ('duplicate', 'Duplicada'),
+        ('invalid', 'Inválida'),
+    ], string='Estado', required=True, default='imported')
+
+    _sql_constraints = [
+        ('fotoapp_import_manifest_path_unique', 'unique(event_id, path)', 'El archivo ya figura en el manifiesto del evento.'),
+    ]
+
+    @api.model
+    def _fotoapp_known(self, event):
+        """``{ruta: (mtime, tamaño)}`` de lo ya procesado del evento."""
+        self.flush_model()
+        self.env.cr.execute(
+            "SELECT path, mtime, size FROM fotoapp_import_manifest WHERE event_id = %s",
+            (event.id,)
+        )
+        return {path: (mtime, size) for path, mtime, size in self.env.cr.fetchall()}
+
+    @api.model
+    def _fotoapp_record(self, event, results):
+        """Guarda en el manifiesto el resultado de un lote.
+
+        Lo que no entró en el plan no se registra, así se reintenta cuando
+        haya cupo. Si un archivo modificado pasa a ser otra foto, la anterior
+        se archiva para que la galería no muestre las dos versiones.
+        """
+        results = [(entry, asset, status) for entry, asset, status in results if status in MANIFEST_STATES]
+        if not results:
+            return
+        existing = {
+            row.path: row
+            for row in self.sudo().search([
+                ('event_id', '=', event.id),
+                ('path', 'in', [entry.path for entry, dummy, dummy in results]),
+            ])
+        }
+        to_create = []
+        replaced = self.env['tienda.foto.asset'].sudo()
+        for entry, asset, status in results:
+            values = {
+                'mtime': entry.mtime,
+                'size': entry.size,
+                'sha256': asset.checksum or False,
+                'asset_id': asset.id or False,
+                'state': MANIFEST_STATES[status],
+            }
+            row = existing.get(entry.path)
+            if row:
+                # Un archivo ilegible puede ser una copia a medias: la foto anterior se mantiene.
+                if row.asset_id and asset and row.asset_id != asset:
+                    replaced |= row.asset_id
+                row.write(values)
+            else:
+                to_create.append(dict(values, event_id=event.id, path=entry.path))
+        self.sudo().create(to_create)
+        if replaced:
+            # Otra ruta puede seguir apuntando a la misma foto (una copia en otra carpeta).
+            still_used = self.sudo().search([('event_id', '=', event.id), ('asset_id', 'in', replaced.ids)]).asset_id
+            (replaced - still_used).filtered(lambda photo: photo.lifecycle_state != 'archived').action_archive()
+
+    @api.model
+    def _fotoapp_sync_event(self, event, deadline=None):
+        """Importa las fotos nuevas o modificadas de la carpeta en vivo del evento.
+
+        Devuelve False si se agotó el tiempo y quedaron archivos pendientes.
+        """
+        ImportJob = self.env['fotoapp.import.job']
+        try:
+            folder = ImportJob._fotoapp_event_folder(event)
+        except ValidationError as exc:
+            _logger.warning('Carpeta en vivo del evento %s: %s', event.id, exc)
+            return True
+        known = self._fotoapp_known(event)
+        settled_before = time.time() - HOT_FOLDER_SETTLE_SECONDS
+        batch_id = uuid.uuid4().hex
+        albums = {}
+        imported = 0
+        with contextlib.closing(bulk_import.iter_folder_entries(folder)) as entries:
+            pending = (
+                entry for entry in entries
+                if known.get(entry.path) != (entry.mtime, entry.size) and entry.mtime <= settled_before
+            )
+            while True:
+                batch = list(itertools.islice(pending, IMPORT_BATCH_SIZE))
+                if not batch:
+                    break
+                results = ImportJob._fotoapp_import_entries(
+                    event, batch, albums, event.precio_base, dedupe_mode='skip', batch_id=batch_id,
+                )
+                self._fotoapp_record(event, results)
+                imported += sum(1 for dummy, dummy, status in results if status == 'created')
+                if cron_can_commit():
+                    self.env.cr.commit()
+                if deadline and time.monotonic() > deadline:
+                    return False
+        if imported:
+            _logger.info('Carpeta en vivo del evento %s: %s fotos nuevas', event.id, imported)
+        return True
+
+    @api.model
+    def cron_sync_hot_folders(self):
+        deadline = time.monotonic() + IMPORT_TIME_BUDGET
+        events = self.env['tienda.foto.evento'].sudo().search([
+            ('carpeta_sync', '=', True),
+            ('carpeta_externa', '!=', False),
+        ], order='id')
+        for event in events:
+            if not self._fotoapp_sync_event(event, deadline):
+                self.env.ref('fotoapp.ir_cron_fotoapp_hot_folders').sudo()._trigger()
+                break
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Ingesta de fotos subidas en una sola pasada.
+
+El base64 se decodifica una vez y se hashea sin copiarlo. De la imagen sólo se
+lee la cabecera, para las dimensiones y la fecha EXIF. Las fotos que ya están
+en disco se hashean por partes.
+"""
+from __future__ import annotations
+
+import binascii
+import hashlib
+import io
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from PIL import Image
+
+_logger = logging.getLogger(__name__)
+
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+EXIF_DATETIME_FORMAT = '%Y:%m:%d %H:%M:%S'
+
+
+@dataclass(frozen=True)
+class IngestedImage:
+    raw: bytes
+    size: int
+    sha256: str
+    width: int = 0
+    height: int = 0
+    taken_at: Optional[datetime] = None
+
+
+@dataclass(frozen=True)
+class IngestedFile:
+    """Los mismos datos que :class:`IngestedImage` para una foto en disco."""
+    path: str
+    size: int
+    sha256: str
+    sha1: str
+    width: int = 0
+    height: int = 0
+    taken_at: Optional[datetime] = None
+
+
+def decode_b64_hashed(payload):
+    """Devuelve ``(bytes, sha256)`` decodificando ``payload`` una sola vez."""
+    if isinstance(payload, str):
+        payload = payload.encode('ascii')
+    raw = binascii.a2b_base64(payload)
+    return raw, hashlib.sha256(memoryview(raw)).hexdigest()
+
+
+def _parse_exif_datetime(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip('\x00 '), EXIF_DATETIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def read_image_metadata(source):
+    """Devuelve ``(ancho, alto, fecha)`` leyendo sólo la cabecera de la imagen."""
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    try:
+        with Image.open(stream) as image:
+            width, height = image.size
+            exif = image.getexif()
+            taken_at = _parse_exif_datetime(exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL))
+            if not taken_at:
+                taken_at = _parse_exif_datetime(exif.get(EXIF_DATETIME))
+    except Exception as exc:  # pylint: disable=broad-except
+        _logger.debug('No se pudieron leer los metadatos de la imagen: %s', exc)
+        return 0, 0, None
+    return width, height, taken_at
+
+
+def ingest_b64(payload) -> IngestedImage:
+    """Decodifica ``payload`` una vez y devuelve los bytes con sus metadatos."""
+    raw, sha256 = decode_b64_hashed(payload)
+    width, height, taken_at = read_image_metadata(raw)
+    return IngestedImage(raw=raw, size=len(raw), sha256=sha256, width=width, height=height, taken_at=taken_at)
+
+
+def ingest_path(path, chunk_size=1024 * 1024) -> IngestedFile:
+    """Hashea el archivo por partes en una pasada y lee su cabecera.
+
+    El sha1 es el del filestore: el archivo se mueve ahí sin volver a leerlo.
+    """
+    sha256 = hashlib.sha256()
+    sha1 = hashlib.sha1()
+    size = 0
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            sha256.update(chunk)
+            sha1.update(chunk)
+            size += len(chunk)
+    width, height, taken_at = read_image_metadata(path)
+    return IngestedFile(
+        path=path, size=size, sha256=sha256.hexdigest(), sha1=sha1.hexdigest(),
+        width=width, height=height, taken_at=taken_at,
+    )
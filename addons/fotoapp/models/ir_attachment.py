@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import shutil
+import tempfile
+
+from odoo import api, models
+
+from .zip_stream import CHUNK_SIZE
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    @api.model
+    def _fotoapp_field_attachments(self, records, field_name):
+        """Devuelve {res_id: attachment} del campo binario indicado."""
+        if not records:
+            return {}
+        attachments = self.sudo().search([
+            ('res_model', '=', records._name),
+            ('res_field', '=', field_name),
+            ('res_id', 'in', records.ids),
+        ])
+        return {attachment.res_id: attachment for attachment in attachments}
+
+    def _fotoapp_stream_source(self):
+        """Ruta del filestore o bytes si el adjunto vive en la base de datos."""
+        self.ensure_one()
+        if self.store_fname:
+            return self._full_path(self.store_fname)
+        return self.raw or False
+
+    @api.model
+    def _fotoapp_tmp_dir(self):
+        # Los temporales viven dentro del filestore para poder moverlos sin copiar.
+        return os.path.join(self._filestore(), 'fotoapp_tmp')
+
+    @api.model
+    def _fotoapp_tmp_path(self, suffix=''):
+        tmp_dir = self._fotoapp_tmp_dir()
+        os.makedirs(tmp_dir, exist_ok=True)
+        handle, path = tempfile.mkstemp(suffix=suffix, dir=tmp_dir)
+        os.close(handle)
+        return path
+
+    @api.model
+    def _fotoapp_create_from_path(self, path, vals, digests=()):
+        """Crea un adjunto moviendo ``path`` al filestore sin cargarlo en memoria.
+
+        ``digests`` son objetos hashlib adicionales que se actualizan en la
+        misma lectura (por ejemplo el sha256 que guarda la foto).
+        """
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+                sha1.update(chunk)
+                for digest in digests:
+                    digest.update(chunk)
+        return self.sudo().create(dict(vals, **self._fotoapp_store_path(path, sha1.hexdigest())))
+
+    @api.model
+    def _fotoapp_store_path(self, path, checksum):
+        """Mueve ``path`` al filestore bajo su sha1 ``checksum`` y devuelve los
+        valores de almacenamiento del adjunto."""
+        fname = f"{checksum[:2]}/{checksum}"
+        full_path = self._full_path(fname)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if os.path.isfile(full_path):
+            os.unlink(path)
+        else:
+            shutil.move(path, full_path)
+            # Como en _file_write: si la transacción se revierte, el GC lo borra.
+            self._mark_for_gc(fname)
+        return {'store_fname': fname, 'checksum': checksum, 'file_size': os.path.getsize(full_path)}
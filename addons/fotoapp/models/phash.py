@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Hash perceptual y agrupación de fotos casi idénticas.
+
+``dhash`` compara el brillo de píxeles vecinos en una miniatura en grises: las
+fotos de una ráfaga quedan a pocos bits de distancia. ``cluster`` las agrupa con
+un BK-tree para no comparar todos los pares de fotos del evento.
+"""
+from __future__ import annotations
+
+from PIL import Image
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy es opcional
+    numpy = None
+
+HASH_SIZE = 8
+
+
+def dhash(image, hash_size=HASH_SIZE) -> str:
+    """Hash de diferencias de la imagen PIL, en hexadecimal."""
+    small = image.resize((hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0).convert('L')
+    if numpy is not None:
+        pixels = numpy.asarray(small, dtype=numpy.int16)
+        return numpy.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes().hex()
+    pixels = list(small.getdata())
+    width = hash_size + 1
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * width + col]
+            value = (value << 1) | (pixels[row * width + col + 1] > left)
+    return f'{value:0{hash_size * hash_size // 4}x}'
+
+
+def hamming(left: str, right: str) -> int:
+    return (int(left, 16) ^ int(right, 16)).bit_count()
+
+
+class BKTree:
+    """Árbol de Burkhard-Keller de hashes hexadecimales con distancia de Hamming."""
+
+    def __init__(self):
+        self._root = None
+
+    def add(self, key, item):
+        node = [key, [item], {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(key, current[0])
+            if distance == 0:
+                current[1].append(item)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def find(self, key, radius):
+        """Elementos cuyo hash está a ``radius`` bits o menos de ``key``."""
+        found = []
+        pending = [self._root] if self._root else []
+        while pending:
+            node = pending.pop()
+            distance = hamming(key, node[0])
+            if distance <= radius:
+                found.extend(node[1])
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    pending.append(child)
+        return found
+
+
+def cluster(items, radius, max_seconds=None):
+    """Agrupa fotos casi idénticas.
+
+    ``items`` son ``(clave, hash, fecha)`` en orden; la primera foto de cada
+    grupo es la líder. Si las dos tienen fecha, además deben estar a
+    ``max_seconds`` o menos. Devuelve ``{clave: clave_líder}`` de todas las fotos.
+    """
+    items = list(items)
+    tree = BKTree()
+    taken = {}
+    for key, hash_value, taken_at in items:
+        tree.add(hash_value, key)
+        taken[key] = taken_at
+    leaders = {}
+    for key, hash_value, taken_at in items:
+        if key in leaders:
+            continue
+        leaders[key] = key
+        for other in tree.find(hash_value, radius):
+            if other in leaders:
+                continue
+            other_taken = taken[other]
+            if max_seconds is not None and taken_at and other_taken \
+                    and abs((other_taken - taken_at).total_seconds()) > max_seconds:
+                continue
+            leaders[other] = key
+    return leaders
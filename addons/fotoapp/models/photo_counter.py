@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+from odoo.exceptions import ValidationError
+
+from .utils import cron_can_commit
+
+
+class FotoappPhotoCounter(models.Model):
+    """Último identificador de foto asignado a cada fotógrafo.
+
+    Reemplaza el contador en ``res_partner``: esa fila la escriben también el
+    perfil, las métricas y los tokens de Mercado Pago, y bloquearla en cada
+    subida serializaba todo lo demás.
+    """
+    _name = 'fotoapp.photo.counter'
+    _description = 'Contador de identificadores de fotos'
+
+    photographer_id = fields.Many2one('res.partner', string='Fotógrafo', required=True, ondelete='cascade')
+    last_value = fields.Integer(string='Último identificador', default=0)
+
+    _sql_constraints = [
+        ('photographer_unique', 'unique(photographer_id)', 'Cada fotógrafo tiene un solo contador.'),
+    ]
+
+    @api.model
+    def _allocate_in(self, cr, photographer_id, count):
+        # Primera vez: arranca desde el contador histórico del partner.
+        cr.execute(
+            """
+            INSERT INTO fotoapp_photo_counter (photographer_id, last_value)
+            SELECT id, COALESCE(fotoapp_next_photo_identifier, 0) + %(count)s
+            FROM res_partner
+            WHERE id = %(partner)s
+            ON CONFLICT (photographer_id) DO UPDATE
+                SET last_value = fotoapp_photo_counter.last_value + %(count)s
+            RETURNING last_value
+            """,
+            {'partner': photographer_id, 'count': count}
+        )
+        row = cr.fetchone()
+        return row[0] if row else None
+
+    @api.model
+    def _allocate(self, photographer_id, count=1):
+        """Reserva ``count`` identificadores consecutivos y devuelve el rango.
+
+        La reserva se confirma en un cursor propio, así el bloqueo de la fila
+        del contador dura lo que tarda el UPDATE y no toda la subida. Si la
+        subida se revierte queda un hueco en la numeración, como con una
+        secuencia. Si el fotógrafo todavía no es visible fuera de esta
+        transacción, se reserva en la transacción actual.
+        """
+        last = None
+        if cron_can_commit():
+            with self.env.registry.cursor() as cr:
+                last = self._allocate_in(cr, photographer_id, count)
+        if last is None:
+            self.flush_model()
+            last = self._allocate_in(self.env.cr, photographer_id, count)
+        if last is None:
+            raise ValidationError(_('No se encontró el fotógrafo para generar el identificador de la foto.'))
+        self.invalidate_model(['last_value'])
+        return range(last - count + 1, last + 1)
@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 import logging
+from collections import defaultdict
 
 from odoo import SUPERUSER_ID, Command, api, fields, models, _
 from odoo.exceptions import ValidationError
 
 LOGGER = logging.getLogger(__name__)
 FREEMIUM_CODE = 'FREEMIUM'
+USAGE_FIELDS = [
+	'usage_photo_count', 'usage_album_count', 'usage_event_count',
+	'usage_storage_bytes', 'usage_storage_mb', 'usage_last_update',
+]
+USAGE_MODEL_POSITION = {'tienda.foto.asset': 0, 'tienda.foto.album': 1, 'tienda.foto.evento': 2}
 
 
 class SaleSubscription(models.Model):
@@ -65,17 +71,17 @@ class SaleSubscription(models.Model):
 	plan_storage_limit_mb = fields.Integer(
 		string='Límite de almacenamiento (MB)', related='plan_id.storage_limit_mb', store=False
 	)
-	usage_photo_count = fields.Integer(compute='_compute_usage_metrics', store=True)
-	usage_album_count = fields.Integer(compute='_compute_usage_metrics', store=True)
-	usage_event_count = fields.Integer(compute='_compute_usage_metrics', store=True)
+	# Contadores mantenidos con incrementos SQL (_fotoapp_add_usage) y
+	# conciliados cada noche con cron_reconcile_usage_metrics.
+	usage_photo_count = fields.Integer(readonly=True, copy=False)
+	usage_album_count = fields.Integer(readonly=True, copy=False)
+	usage_event_count = fields.Integer(readonly=True, copy=False)
 	usage_storage_bytes = fields.Float(
-		compute='_compute_usage_metrics',
-		store=True,
+		readonly=True,
+		copy=False,
 		help='Bytes utilizados por el fotógrafo; float para evitar overflow en planes grandes.',
 	)
-	usage_storage_mb = fields.Float(
-		string='Uso de almacenamiento (MB)', compute='_compute_usage_metrics', store=True
-	)
+	usage_storage_mb = fields.Float(string='Uso de almacenamiento (MB)', readonly=True, copy=False)
 	storage_limit_bytes = fields.Float(
 		string='Límite de almacenamiento (bytes)',
 		compute='_compute_limit_flags',
@@ -95,16 +101,111 @@ class SaleSubscription(models.Model):
 	)
 
 
-	@api.depends('asset_ids', 'asset_ids.file_size_bytes', 'album_ids', 'event_ids')
-	def _compute_usage_metrics(self):
-		for subscription in self:
-			subscription.usage_photo_count = len(subscription.asset_ids)
-			subscription.usage_album_count = len(subscription.album_ids)
-			subscription.usage_event_count = len(subscription.event_ids)
-			bytes_used = float(sum(subscription.asset_ids.mapped('file_size_bytes'))) if subscription.asset_ids else 0.0
-			subscription.usage_storage_bytes = bytes_used
-			subscription.usage_storage_mb = bytes_used / (1024 ** 2) if bytes_used else 0.0
-			subscription.usage_last_update = fields.Datetime.now()
+	@api.model
+	def _fotoapp_usage_deltas(self, records, sign=1):
+		"""Uso que aportan ``records`` (fotos, álbumes o eventos) por suscripción.
+
+		Devuelve ``{suscripción: [fotos, álbumes, eventos, bytes]}``; con
+		``sign=-1`` el aporte se resta.
+		"""
+		position = USAGE_MODEL_POSITION[records._name]
+		deltas = defaultdict(lambda: [0, 0, 0, 0])
+		for record in records:
+			if not record.plan_subscription_id:
+				continue
+			delta = deltas[record.plan_subscription_id.id]
+			delta[position] += sign
+			if position == 0:
+				delta[3] += sign * (record.file_size_bytes or 0)
+		return deltas
+
+	@api.model
+	def _fotoapp_add_usage(self, *delta_maps):
+		"""Suma los deltas de uso con un UPDATE atómico por suscripción.
+
+		No se leen las fotos del fotógrafo: subir o borrar cuesta lo mismo con
+		diez fotos que con cincuenta mil. Las marcas de límite se recalculan a
+		partir de los valores nuevos.
+		"""
+		totals = defaultdict(lambda: [0, 0, 0, 0])
+		for deltas in delta_maps:
+			for subscription_id, delta in deltas.items():
+				total = totals[subscription_id]
+				for position, value in enumerate(delta):
+					total[position] += value
+		totals = {subscription_id: total for subscription_id, total in totals.items() if any(total)}
+		if not totals:
+			return
+		for subscription_id, (photos, albums, events, size) in totals.items():
+			self.env.cr.execute(
+				"""
+				UPDATE sale_subscription
+				SET usage_photo_count = GREATEST(COALESCE(usage_photo_count, 0) + %s, 0),
+					usage_album_count = GREATEST(COALESCE(usage_album_count, 0) + %s, 0),
+					usage_event_count = GREATEST(COALESCE(usage_event_count, 0) + %s, 0),
+					usage_storage_bytes = GREATEST(COALESCE(usage_storage_bytes, 0) + %s, 0),
+					usage_storage_mb = GREATEST(COALESCE(usage_storage_bytes, 0) + %s, 0) / 1048576.0,
+					usage_last_update = now() AT TIME ZONE 'UTC'
+				WHERE id = %s
+				""",
+				(photos, albums, events, size, size, subscription_id)
+			)
+		subscriptions = self.sudo().browse(list(totals))
+		subscriptions.invalidate_recordset(USAGE_FIELDS)
+		subscriptions.modified(USAGE_FIELDS)
+
+	@api.model
+	def cron_reconcile_usage_metrics(self):
+		"""Recalcula el uso real con consultas agrupadas y corrige desvíos.
+
+		Cubre los cambios que no pasan por los incrementos, como una foto que
+		cambia de suscripción al reasignarse el plan del evento.
+		"""
+		actual = defaultdict(lambda: [0, 0, 0, 0.0])
+		asset_groups = self.env['tienda.foto.asset'].sudo()._read_group(
+			[('plan_subscription_id', '!=', False)],
+			['plan_subscription_id'],
+			['__count', 'file_size_bytes:sum'],
+		)
+		for subscription, count, size in asset_groups:
+			actual[subscription.id][0] = count
+			actual[subscription.id][3] = float(size or 0)
+		for model_name, position in (('tienda.foto.album', 1), ('tienda.foto.evento', 2)):
+			groups = self.env[model_name].sudo()._read_group(
+				[('plan_subscription_id', '!=', False)], ['plan_subscription_id'], ['__count']
+			)
+			for subscription, count in groups:
+				actual[subscription.id][position] = count
+		subscriptions = self.sudo().search([
+			'|',
+			('fotoapp_is_photographer_plan', '=', True),
+			('id', 'in', list(actual)),
+		])
+		fixed = 0
+		for subscription in subscriptions:
+			photos, albums, events, size = actual[subscription.id]
+			stored = (
+				subscription.usage_photo_count,
+				subscription.usage_album_count,
+				subscription.usage_event_count,
+				subscription.usage_storage_bytes,
+			)
+			if stored == (photos, albums, events, size):
+				continue
+			LOGGER.warning(
+				'Suscripción %s: uso guardado %s, real %s', subscription.id, stored, (photos, albums, events, size)
+			)
+			subscription.write({
+				'usage_photo_count': photos,
+				'usage_album_count': albums,
+				'usage_event_count': events,
+				'usage_storage_bytes': size,
+				'usage_storage_mb': size / (1024 ** 2),
+				'usage_last_update': fields.Datetime.now(),
+			})
+			fixed += 1
+		LOGGER.info('Conciliación de uso: %s suscripciones revisadas, %s corregidas', len(subscriptions), fixed)
+		return fixed
 
 	@api.depends('usage_photo_count', 'usage_album_count', 'usage_event_count', 'usage_storage_bytes')
 	def _compute_limit_flags(self):
@@ -202,6 +303,27 @@ class SaleSubscription(models.Model):
 		limit_bytes = limit_mb * 1024 * 1024
 		return max(limit_bytes - self.usage_storage_bytes, 0.0)
 
+	def _fotoapp_available_quota(self, exclude_reservation=None):
+		"""Fotos y bytes que todavía entran en el plan, como ``(fotos, bytes)``.
+
+		Descuenta lo que retienen las reservas de cuota vigentes; ``None``
+		significa que el plan no limita esa métrica.
+		"""
+		self.ensure_one()
+		plan = self.plan_id
+		if not plan:
+			return None, None
+		limit_mb = plan.storage_limit_mb or int((plan.storage_limit_gb or 0.0) * 1024)
+		if not plan.photo_limit and not limit_mb:
+			return None, None
+		held_photos, held_bytes = self.env['fotoapp.quota.reservation'].sudo()._fotoapp_held(self, exclude_reservation)
+		photos_left = bytes_left = None
+		if plan.photo_limit:
+			photos_left = max(plan.photo_limit - self.usage_photo_count - held_photos, 0)
+		if limit_mb:
+			bytes_left = max(limit_mb * 1024 * 1024 - self.usage_storage_bytes - held_bytes, 0.0)
+		return photos_left, bytes_left
+
 	def _handle_successful_payment(self):
 		for subscription in self.filtered('fotoapp_is_photographer_plan'):
 			today = fields.Date.context_today(subscription)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+import logging
+import secrets
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+QUOTA_RESERVATION_TTL_MINUTES = 15
+PREFLIGHT_MAX_FILES = 5000
+
+
+class FotoappQuotaReservation(models.Model):
+    """Cupo del plan apartado para una tanda de subidas.
+
+    El uso de la suscripción recién crece cuando se crea cada foto. Hasta
+    entonces la reserva retiene las fotos y los bytes aceptados en la consulta
+    previa: dos tandas simultáneas no superan el plan y lo que no entra se
+    rechaza antes de decodificar o generar la marca de agua.
+    """
+    _name = 'fotoapp.quota.reservation'
+    _description = 'Reserva de cuota de subida'
+    _order = 'id desc'
+
+    token = fields.Char(string='Token', required=True, copy=False, index=True,
+                        default=lambda self: secrets.token_urlsafe(24))
+    subscription_id = fields.Many2one('sale.subscription', string='Suscripción', required=True, index=True, ondelete='cascade')
+    photographer_id = fields.Many2one('res.partner', string='Fotógrafo', required=True, ondelete='cascade')
+    photo_count = fields.Integer(string='Fotos reservadas')
+    reserved_bytes = fields.Float(string='Bytes reservados')
+    consumed_photos = fields.Integer(string='Fotos usadas', default=0)
+    consumed_bytes = fields.Float(string='Bytes usados', default=0.0)
+    expires_at = fields.Datetime(
+        string='Vence el', index=True,
+        default=lambda self: fields.Datetime.now() + timedelta(minutes=QUOTA_RESERVATION_TTL_MINUTES),
+    )
+
+    _sql_constraints = [
+        ('fotoapp_quota_reservation_token_unique', 'unique(token)', 'El token de la reserva debe ser único.'),
+    ]
+
+    @api.model
+    def _fotoapp_held(self, subscription, exclude=None):
+        """Fotos y bytes que retienen las reservas vigentes de ``subscription``."""
+        self.flush_model()
+        self.env.cr.execute(
+            """
+            SELECT COALESCE(SUM(GREATEST(photo_count - consumed_photos, 0)), 0),
+                   COALESCE(SUM(GREATEST(reserved_bytes - consumed_bytes, 0)), 0)
+            FROM fotoapp_quota_reservation
+            WHERE subscription_id = %s
+              AND expires_at > now() AT TIME ZONE 'UTC'
+              AND id != %s
+            """,
+            (subscription.id, exclude.id if exclude else 0)
+        )
+        photos, size = self.env.cr.fetchone()
+        return photos, float(size)
+
+    @api.model
+    def _fotoapp_get(self, token, photographer):
+        if not token:
+            return self.browse()
+        return self.sudo().search([
+            ('token', '=', token),
+            ('photographer_id', '=', photographer.id),
+            ('expires_at', '>', fields.Datetime.now()),
+        ], limit=1)
+
+    def _fotoapp_covers(self, album):
+        """Indica si la reserva es del plan que cobra las fotos de ``album``."""
+        self.ensure_one()
+        subscription = album.event_id.plan_subscription_id or album.photographer_id.active_plan_subscription_id
+        return self.subscription_id == subscription
+
+    @api.model
+    def _fotoapp_fit(self, sizes, photos_left, bytes_left):
+        """Índices de ``sizes`` que entran en lo libre, en el orden recibido."""
+        accepted = []
+        total = 0
+        for index, size in enumerate(sizes):
+            if photos_left is not None and len(accepted) >= photos_left:
+                break
+            if bytes_left is not None and total + size > bytes_left:
+                continue
+            accepted.append(index)
+            total += size
+        return accepted
+
+    @api.model
+    def _fotoapp_accept(self, subscription, sizes):
+        """Como ``_fotoapp_reserve`` pero sin bloquear la suscripción ni apartar cupo.
+
+        Sirve para descartar de antemano lo que no entra cuando la subida se
+        procesa en la misma transacción: ``_fotoapp_upload_batch`` vuelve a
+        controlar el cupo al crear cada lote.
+        """
+        if not subscription:
+            return list(range(len(sizes)))
+        return self._fotoapp_fit(sizes, *subscription._fotoapp_available_quota())
+
+    @api.model
+    def _fotoapp_reserve(self, subscription, photographer, sizes):
+        """Aparta el cupo para los archivos de ``sizes`` que entran en el plan.
+
+        Se acepta cada archivo que todavía entra, en el orden recibido, y se
+        devuelve ``(reserva, índices aceptados)``. Si el plan no tiene límites
+        no hace falta reserva y se aceptan todos. La suscripción queda
+        bloqueada hasta el final de la transacción: usarlo sólo en pedidos
+        cortos, como la consulta previa.
+        """
+        everything = list(range(len(sizes)))
+        if not subscription:
+            return self.browse(), everything
+        # Serializa las reservas y las subidas de la misma suscripción.
+        self.env.cr.execute('SELECT id FROM sale_subscription WHERE id = %s FOR UPDATE', (subscription.id,))
+        subscription.invalidate_recordset(['usage_photo_count', 'usage_storage_bytes'])
+        photos_left, bytes_left = subscription._fotoapp_available_quota()
+        if photos_left is None and bytes_left is None:
+            return self.browse(), everything
+        accepted = self._fotoapp_fit(sizes, photos_left, bytes_left)
+        total = sum(sizes[index] for index in accepted)
+        if not accepted:
+            return self.browse(), accepted
+        reservation = self.sudo().create({
+            'subscription_id': subscription.id,
+            'photographer_id': photographer.id,
+            'photo_count': len(accepted),
+            'reserved_bytes': total,
+        })
+        return reservation, accepted
+
+    @api.model
+    def _fotoapp_preflight(self, album, sizes):
+        """Respuesta de la consulta previa a subir ``sizes`` al álbum."""
+        partner = album.photographer_id
+        subscription = album.event_id.plan_subscription_id or partner.active_plan_subscription_id
+        max_bytes = self.env['fotoapp.upload.session']._get_upload_max_bytes()
+        candidates = [index for index, size in enumerate(sizes) if 0 < size <= max_bytes]
+        reservation, accepted = self._fotoapp_reserve(subscription, partner, [sizes[index] for index in candidates])
+        accepted = [candidates[position] for position in accepted]
+        photos_left = bytes_left = None
+        if subscription:
+            photos_left, bytes_left = subscription._fotoapp_available_quota()
+        accepted_set = set(accepted)
+        return {
+            'reservation': reservation.token or False,
+            'expires_at': fields.Datetime.to_string(reservation.expires_at) if reservation else False,
+            'accepted': accepted,
+            'rejected': [index for index in range(len(sizes)) if index not in accepted_set],
+            'photos_left': photos_left,
+            'bytes_left': bytes_left,
+        }
+
+    def _fotoapp_remaining(self):
+        """Fotos y bytes que la reserva todavía cubre; nada si venció."""
+        self.ensure_one()
+        if not self.expires_at or self.expires_at <= fields.Datetime.now():
+            return 0, 0.0
+        return (
+            max(self.photo_count - self.consumed_photos, 0),
+            max(self.reserved_bytes - self.consumed_bytes, 0.0),
+        )
+
+    def _fotoapp_consume(self, photos, size):
+        """Libera de la reserva lo que ya se procesó, con un UPDATE atómico."""
+        self.ensure_one()
+        self.env.cr.execute(
+            """
+            UPDATE fotoapp_quota_reservation
+            SET consumed_photos = consumed_photos + %s,
+                consumed_bytes = consumed_bytes + %s
+            WHERE id = %s
+            """,
+            (photos, size, self.id)
+        )
+        self.invalidate_recordset(['consumed_photos', 'consumed_bytes'])
+
+    @api.model
+    def cron_cleanup_quota_reservations(self):
+        self.flush_model()
+        self.env.cr.execute(
+            """
+            SELECT id FROM fotoapp_quota_reservation
+            WHERE expires_at < now() AT TIME ZONE 'UTC'
+               OR consumed_photos >= photo_count
+            """
+        )
+        reservations = self.sudo().browse([row[0] for row in self.env.cr.fetchall()])
+        if reservations:
+            _logger.info('Eliminando %s reservas de cuota vencidas o usadas', len(reservations))
+            reservations.unlink()
@@ -62,3 +62,33 @@ class ResConfigSettings(models.TransientModel):
         default=15,
         config_parameter='fotoapp.asset_delete_days'
     )
+    fotoapp_generate_webp = fields.Boolean(
+        string='Generar vista previa WebP',
+        config_parameter='fotoapp.generate_webp'
+    )
+    fotoapp_watermark_workers = fields.Integer(
+        string='Procesos para marcas de agua',
+        config_parameter='fotoapp.watermark_workers',
+        help='Sólo se usa con workers prefork (opción workers mayor a 0); si no, se renderiza en serie. '
+             'Cada proceso copia la memoria del worker del cron y decodifica una foto completa a la vez '
+             '(unos 100 MB para 24 MP en RGBA), fuera del control de limit_memory_hard.',
+    )
+    fotoapp_ocr_enabled = fields.Boolean(
+        string='Detectar dorsales con OCR',
+        config_parameter='fotoapp.ocr_enabled'
+    )
+    fotoapp_ocr_workers = fields.Integer(
+        string='Procesos para OCR',
+        config_parameter='fotoapp.ocr_workers'
+    )
+    fotoapp_import_root = fields.Char(
+        string='Carpeta raíz de importación',
+        config_parameter='fotoapp.import_root'
+    )
+
+    def set_values(self):
+        Asset = self.env['tienda.foto.asset'].sudo()
+        lifecycle_config = Asset._get_lifecycle_config()
+        super().set_values()
+        if Asset._get_lifecycle_config() != lifecycle_config:
+            Asset._recompute_lifecycle_due_dates()
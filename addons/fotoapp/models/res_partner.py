@@ -4,6 +4,8 @@ from dateutil.relativedelta import relativedelta
 # -*- coding: utf-8 -*-
 from odoo import fields, models, api
 
+from . import watermark
+
 
 class ResPartner(models.Model):
     _inherit = 'res.partner'
@@ -40,6 +42,20 @@ class ResPartner(models.Model):
         default=0.3,
         help='Escala relativa frente a la imagen final (0-1).'
     )
+    watermark_regen_total = fields.Integer(
+        string='Fotos a regenerar',
+        copy=False,
+        readonly=True,
+        help='Cantidad de fotos encoladas en la última regeneración de marca de agua.'
+    )
+    watermark_regen_pending = fields.Integer(
+        string='Fotos pendientes de marca de agua',
+        compute='_compute_watermark_regen_progress'
+    )
+    watermark_regen_progress = fields.Float(
+        string='Progreso de regeneración (%)',
+        compute='_compute_watermark_regen_progress'
+    )
     foto_event_ids = fields.One2many(
         comodel_name='tienda.foto.evento',
         inverse_name='photographer_id',
@@ -94,7 +110,7 @@ class ResPartner(models.Model):
         string='Próximo identificador de foto',
         default=0,
         copy=False,
-        help='Mantiene la secuencia interna para numerar fotos automáticamente.'
+        help='Valor inicial del contador de fotos; la numeración vigente vive en fotoapp.photo.counter.'
     )
     mp_user_id = fields.Char(string='MP User ID', copy=False, groups='base.group_system')
     mp_access_token = fields.Char(string='MP Access Token', groups='base.group_system')
@@ -134,32 +150,89 @@ class ResPartner(models.Model):
 
     @api.depends('foto_event_ids', 'album_ids', 'asset_ids', 'asset_ids.file_size_bytes', 'asset_ids.sale_total_amount')
     def _compute_metrics(self):
+        # Agregados en la base para todo el lote: no se cargan las fotos de
+        # cada fotógrafo, sólo una fila por partner y modelo.
+        partner_ids = [partner_id for partner_id in self.ids if isinstance(partner_id, int)]
+        events = albums = assets = {}
+        if partner_ids:
+            events = {
+                partner.id: count
+                for partner, count in self.env['tienda.foto.evento'].sudo()._read_group(
+                    [('photographer_id', 'in', partner_ids)], ['photographer_id'], ['__count'],
+                )
+            }
+            albums = {
+                partner.id: count
+                for partner, count in self.env['tienda.foto.album'].sudo()._read_group(
+                    [('photographer_id', 'in', partner_ids)], ['photographer_id'], ['__count'],
+                )
+            }
+            assets = {
+                partner.id: (count, size, sales)
+                for partner, count, size, sales in self.env['tienda.foto.asset'].sudo()._read_group(
+                    [('photographer_id', 'in', partner_ids)],
+                    ['photographer_id'],
+                    ['__count', 'file_size_bytes:sum', 'sale_total_amount:sum'],
+                )
+            }
         for partner in self:
-            partner.event_count = len(partner.foto_event_ids)
-            partner.album_count = len(partner.album_ids)
-            partner.asset_count = len(partner.asset_ids)
-            partner.total_storage_bytes = sum(partner.asset_ids.mapped('file_size_bytes'))
-            partner.gross_sales_total = sum(partner.asset_ids.mapped('sale_total_amount'))
+            asset_count, total_size, sales = assets.get(partner.id, (0, 0, 0.0))
+            partner.event_count = events.get(partner.id, 0)
+            partner.album_count = albums.get(partner.id, 0)
+            partner.asset_count = asset_count
+            partner.total_storage_bytes = total_size or 0
+            partner.gross_sales_total = sales or 0.0
 
     def write(self, vals):
         watermark_fields = {'watermark_image', 'watermark_opacity', 'watermark_scale'}
         should_regenerate = bool(watermark_fields.intersection(vals.keys()))
         result = super().write(vals)
         if should_regenerate:
+            watermark.invalidate_overlay_cache(self.ids)
             self._regenerate_published_assets_watermark()
         if vals.get('is_photographer'):
             self.filtered('is_photographer')._ensure_default_photo_plan()
         return result
 
     def _regenerate_published_assets_watermark(self):
+        # Solo se encolan las fotos: el cron de marcas de agua las procesa por lotes,
+        # en paralelo y confirmando cada lote, por lo que un reinicio retoma lo pendiente.
+        # La galería sigue mostrando los tamaños anteriores hasta que se regeneran.
+        if not self:
+            return
         Asset = self.env['tienda.foto.asset'].sudo()
+        Asset.flush_model(['watermark_state', 'photographer_id', 'lifecycle_state'])
+        self.env.cr.execute(
+            """
+            UPDATE tienda_foto_asset
+            SET watermark_state = 'pending'
+            WHERE photographer_id = ANY(%s)
+            AND lifecycle_state = 'published'
+            """,
+            (self.ids,)
+        )
+        Asset.invalidate_model(['watermark_state'])
+        pending = self._get_pending_watermark_counts()
+        for partner in self:
+            partner.sudo().watermark_regen_total = pending.get(partner.id, 0)
+        if pending:
+            Asset._queue_watermark_generation()
+
+    def _get_pending_watermark_counts(self):
+        groups = self.env['tienda.foto.asset'].sudo()._read_group(
+            [('photographer_id', 'in', self.ids), ('watermark_state', '=', 'pending')],
+            ['photographer_id'],
+            ['__count'],
+        )
+        return {partner.id: count for partner, count in groups}
+
+    def _compute_watermark_regen_progress(self):
+        pending = self._get_pending_watermark_counts() if self.ids else {}
         for partner in self:
-            assets = Asset.search([
-                ('photographer_id', '=', partner.id),
-                ('lifecycle_state', '=', 'published'),
-            ])
-            if assets:
-                assets.regenerate_watermark()
+            remaining = pending.get(partner.id, 0)
+            total = max(partner.watermark_regen_total, remaining)
+            partner.watermark_regen_pending = remaining
+            partner.watermark_regen_progress = 100.0 * (total - remaining) / total if total else 100.0
 
     @api.model_create_multi
     def create(self, vals_list):
@@ -1,8 +1,18 @@
+import hashlib
+import logging
+import os
 import secrets
 from dateutil.relativedelta import relativedelta
 from odoo import api, _, fields, models
 from odoo.exceptions import ValidationError
 
+from .utils import cron_can_commit
+from .zip_stream import iter_zip_stream, unique_arcname
+
+_logger = logging.getLogger(__name__)
+
+BUNDLE_BATCH_SIZE = 5
+
 
 class SaleOrder(models.Model):
     _inherit = 'sale.order'
@@ -16,6 +26,12 @@ class SaleOrder(models.Model):
     download_token_expires_at = fields.Datetime(string='Expira link descarga', copy=False)
     download_email_sent = fields.Boolean(string='Email descarga enviado', default=False, copy=False)
     fotoapp_delivery_email = fields.Char(string='Correo de entrega FotoApp', copy=False)
+    fotoapp_bundle_state = fields.Selection([
+        ('pending', 'En cola'),
+        ('ready', 'Listo'),
+    ], string='ZIP de descarga', copy=False, index=True)
+    fotoapp_bundle_attachment_id = fields.Many2one('ir.attachment', string='ZIP generado', copy=False, readonly=True)
+    fotoapp_bundle_key = fields.Char(string='Clave del ZIP', copy=False, readonly=True)
     fotoapp_order_month = fields.Date(
         string='Mes de venta FotoApp',
         compute='_compute_fotoapp_order_month',
@@ -206,6 +222,7 @@ class SaleOrder(models.Model):
             if not order.fotoapp_delivery_email and tx_email:
                 order.sudo().write({'fotoapp_delivery_email': tx_email})
             order._fotoapp_ensure_download_token()
+            order._fotoapp_queue_download_bundle()
             if order.download_email_sent:
                 continue
             link = f"{base_url}/fotoapp/public_download/{order.download_token}"
@@ -225,3 +242,112 @@ class SaleOrder(models.Model):
             mail.send()
             order.write({'download_email_sent': True})
         return True
+
+    def _fotoapp_zip_entries(self):
+        """Lista de (nombre, origen) para armar el ZIP de fotos del pedido."""
+        assets = self.mapped('order_line.foto_asset_id')
+        attachments = self.env['ir.attachment']._fotoapp_field_attachments(assets, 'imagen_original')
+        entries = []
+        used_names = set()
+        for asset in assets:
+            attachment = attachments.get(asset.id)
+            source = attachment._fotoapp_stream_source() if attachment else False
+            if not source:
+                continue
+            filename = asset.name or f"foto_{asset.id}"
+            # Asegura extensión .jpg si no trae una
+            if '.' not in filename.lower():
+                filename = f"{filename}.jpg"
+            entries.append((unique_arcname(filename, used_names), source))
+        return entries
+
+    def _fotoapp_bundle_cache_key(self):
+        self.ensure_one()
+        assets = self.order_line.mapped('foto_asset_id').sorted('id')
+        digest = hashlib.sha256(str(self.id).encode())
+        for asset in assets:
+            digest.update(f"|{asset.id}:{asset.checksum or ''}".encode())
+        return digest.hexdigest()
+
+    def _fotoapp_get_valid_bundle(self):
+        self.ensure_one()
+        attachment = self.sudo().fotoapp_bundle_attachment_id
+        if self.fotoapp_bundle_state != 'ready' or not attachment:
+            return False
+        if self.fotoapp_bundle_key != self._fotoapp_bundle_cache_key():
+            return False
+        return attachment
+
+    def _fotoapp_queue_download_bundle(self):
+        orders = self.filtered(lambda order: order.order_line.filtered('foto_asset_id'))
+        if not orders:
+            return False
+        orders.sudo().write({'fotoapp_bundle_state': 'pending'})
+        cron = self.env.ref('fotoapp.ir_cron_fotoapp_download_bundles', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+        return True
+
+    def _fotoapp_build_download_bundle(self):
+        Attachment = self.env['ir.attachment'].sudo()
+        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        for order in self:
+            entries = order._fotoapp_zip_entries()
+            if not entries:
+                order.write({'fotoapp_bundle_state': False})
+                continue
+            tmp_path = Attachment._fotoapp_tmp_path(suffix='.zip')
+            try:
+                with open(tmp_path, 'wb') as handle:
+                    for chunk in iter_zip_stream(entries):
+                        handle.write(chunk)
+                attachment = Attachment._fotoapp_create_from_path(tmp_path, {
+                    'name': f"fotos_{order.name or 'pedido'}.zip",
+                    'mimetype': 'application/zip',
+                    'res_model': order._name,
+                    'res_id': order.id,
+                })
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+            previous = order.fotoapp_bundle_attachment_id
+            order.write({
+                'fotoapp_bundle_attachment_id': attachment.id,
+                'fotoapp_bundle_key': order._fotoapp_bundle_cache_key(),
+                'fotoapp_bundle_state': 'ready',
+            })
+            if previous:
+                previous.unlink()
+            if order.download_token:
+                albums = self.env['tienda.foto.album'].sudo().search([('sale_order_id', '=', order.id)])
+                if albums:
+                    albums.write({'download_bundle_url': f"{base_url}/fotoapp/public_download/{order.download_token}"})
+
+    def _fotoapp_invalidate_download_bundles(self):
+        orders = self.filtered('fotoapp_bundle_state')
+        if not orders:
+            return
+        attachments = orders.mapped('fotoapp_bundle_attachment_id')
+        orders.sudo().write({'fotoapp_bundle_attachment_id': False, 'fotoapp_bundle_key': False})
+        if attachments:
+            attachments.sudo().unlink()
+        orders._fotoapp_queue_download_bundle()
+
+    @api.model
+    def cron_fotoapp_build_download_bundles(self, limit=BUNDLE_BATCH_SIZE):
+        orders = self.sudo().search([('fotoapp_bundle_state', '=', 'pending')], limit=limit, order='id')
+        for order in orders:
+            try:
+                order._fotoapp_build_download_bundle()
+            except Exception:
+                _logger.exception('No se pudo generar el ZIP de descarga del pedido %s', order.id)
+                if not cron_can_commit():
+                    raise
+                self.env.cr.rollback()
+                order.write({'fotoapp_bundle_state': False})
+                self.env.cr.commit()
+                continue
+            if cron_can_commit():
+                self.env.cr.commit()
+        if len(orders) == limit:
+            self.env.ref('fotoapp.ir_cron_fotoapp_download_bundles')._trigger()
@@ -3,6 +3,11 @@ import secrets # sirven para generar tokens únicos y seguros, por ejemplo, para
 
 from odoo import api, fields, models, _
 
+from .gallery_cache import bump_gallery_version
+
+# Campos que cambian lo que muestra la galería pública.
+GALLERY_ALBUM_FIELDS = {'name', 'state', 'is_private', 'event_id', 'sequence', 'collapse_bursts'}
+
 
 class TiendaFotoAlbum(models.Model):
     _name = 'tienda.foto.album'
@@ -43,6 +48,10 @@ class TiendaFotoAlbum(models.Model):
     download_bundle_url = fields.Char(string='ZIP generado')
     sale_order_id = fields.Many2one('sale.order', string='Pedido asociado')
     is_private = fields.Boolean(string='Privado', default=True)
+    collapse_bursts = fields.Boolean(
+        string='Agrupar ráfagas',
+        help='En la galería pública se muestra sólo la primera foto de cada ráfaga de fotos casi idénticas.',
+    )
     allow_guest_checkout = fields.Boolean(string='Permitir compra sin registro', default=True)
     crm_lead_id = fields.Many2one('crm.lead', string='Oportunidad vinculada')
     notes = fields.Text(string='Notas internas')
@@ -70,7 +79,23 @@ class TiendaFotoAlbum(models.Model):
         for vals in vals_list:
             if not vals.get('customer_token'):
                 vals['customer_token'] = secrets.token_urlsafe(16)
-        return super().create(vals_list)
+        albums = super().create(vals_list)
+        Subscription = self.env['sale.subscription'].sudo()
+        Subscription._fotoapp_add_usage(Subscription._fotoapp_usage_deltas(albums))
+        if any(album.state == 'published' for album in albums):
+            bump_gallery_version(self.env.cr)
+        return albums
+
+    def write(self, vals):
+        if GALLERY_ALBUM_FIELDS & set(vals):
+            bump_gallery_version(self.env.cr)
+        if 'event_id' not in vals:
+            return super().write(vals)
+        Subscription = self.env['sale.subscription'].sudo()
+        usage_before = Subscription._fotoapp_usage_deltas(self, sign=-1)
+        res = super().write(vals)
+        Subscription._fotoapp_add_usage(usage_before, Subscription._fotoapp_usage_deltas(self))
+        return res
 
     def action_publish(self):
         for album in self:
@@ -87,10 +112,15 @@ class TiendaFotoAlbum(models.Model):
         self.write({'state': 'archived'})
 
     def unlink(self):
+        bump_gallery_version(self.env.cr)
         if not self.env.context.get('skip_album_asset_cleanup'):
             assets_to_remove = self.env['tienda.foto.asset']
             for album in self:
                 assets_to_remove |= album.asset_ids
             if assets_to_remove:
                 assets_to_remove.sudo().unlink()
-        return super().unlink()
+        Subscription = self.env['sale.subscription'].sudo()
+        usage = Subscription._fotoapp_usage_deltas(self, sign=-1)
+        res = super().unlink()
+        Subscription._fotoapp_add_usage(usage)
+        return res
@@ -1,16 +1,38 @@
 import base64
-import hashlib
 import logging
+import mimetypes
+import os
 import secrets
+import time
+import uuid
+from collections import Counter, defaultdict
 from datetime import timedelta
-from io import BytesIO
 
-from odoo import api, fields, models, _
+from odoo import Command, api, fields, models, tools, _
 from odoo.exceptions import ValidationError
-from PIL import Image, ImageDraw, ImageFont
+from odoo.tools.image import IMAGE_MAX_RESOLUTION
+
+from . import bib_ocr, ingest, watermark
+from .tienda_foto_bib_tag import normalize_bib
+from .utils import cron_can_commit
 
 _logger = logging.getLogger(__name__)
 
+WATERMARK_BATCH_SIZE = 50
+WATERMARK_TIME_BUDGET = 600
+OCR_BATCH_SIZE = 20
+OCR_TIME_BUDGET = 600
+LIFECYCLE_BATCH_SIZE = 1000
+LIFECYCLE_TIME_BUDGET = 600
+LIFECYCLE_CURSOR_PARAM = 'fotoapp.lifecycle_cursor'
+# Campos que cambian el uso de la suscripción de una foto.
+USAGE_ASSET_FIELDS = {'evento_id', 'file_size_bytes'}
+DEDUPE_MODES = [
+    ('skip', 'Omitir duplicadas'),
+    ('link', 'Vincular la foto existente al álbum'),
+    ('replace', 'Reemplazar precio, nombre y álbum de la existente'),
+]
+
 
 class TiendaFotoAsset(models.Model):
     _name = 'tienda.foto.asset'
@@ -42,13 +64,23 @@ class TiendaFotoAsset(models.Model):
     sequence = fields.Integer(string='Secuencia', default=10)
     imagen_original = fields.Image(string='Imagen Original', required=True, attachment=True)
     imagen_watermark = fields.Image(string='Imagen con Marca de Agua', attachment=True)
+    imagen_preview = fields.Image(string='Vista previa (1280px)', attachment=True)
+    imagen_thumb = fields.Image(string='Miniatura (320px)', attachment=True)
+    imagen_preview_webp = fields.Binary(string='Vista previa WebP', attachment=True)
+    has_derivatives = fields.Boolean(string='Tamaños generados', copy=False, readonly=True)
+    has_webp = fields.Boolean(string='Tiene WebP', copy=False, readonly=True)
+    watermark_state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('done', 'Generada'),
+        ('failed', 'Con error'),
+    ], string='Marca de agua', default='pending', copy=False, readonly=True, index=True)
     precio = fields.Monetary(string='Precio', currency_field='currency_id', required=True)
     currency_id = fields.Many2one('res.currency', default=lambda self: self.env.company.currency_id.id)
     publicada = fields.Boolean(string='Publicada', default=True)
     website_published = fields.Boolean(string='Visible en web', default=True)
     checksum = fields.Char(string='Checksum', readonly=True)
+    batch_id = fields.Char(string='Lote de subida', copy=False, readonly=True, index='btree_not_null')
     download_token = fields.Char(string='Token de descarga')
-    batch_id = fields.Char(string='Lote de subida')
     album_ids = fields.Many2many(
         comodel_name='tienda.foto.album',
         relation='tienda_foto_album_asset_rel',
@@ -67,6 +99,20 @@ class TiendaFotoAsset(models.Model):
     ], string='Estado', default='published', tracking=True)
     publicada_por_ultima_vez = fields.Datetime(string='Publicada por última vez', copy=False, default=lambda self: fields.Datetime.now())
     archived_at = fields.Datetime(string='Archivada el', copy=False)
+    archive_due_at = fields.Datetime(
+        string='Se archiva el',
+        compute='_compute_lifecycle_due_dates',
+        store=True,
+        copy=False,
+        index='btree_not_null',
+    )
+    delete_due_at = fields.Datetime(
+        string='Se elimina el',
+        compute='_compute_lifecycle_due_dates',
+        store=True,
+        copy=False,
+        index='btree_not_null',
+    )
     days_until_archive = fields.Integer(string='Días hasta archivado', compute='_compute_lifecycle_deadlines')
     days_until_delete = fields.Integer(string='Días hasta eliminación', compute='_compute_lifecycle_deadlines')
     portal_token = fields.Char(string='Token portal', copy=False)
@@ -78,6 +124,25 @@ class TiendaFotoAsset(models.Model):
     last_sale_date = fields.Datetime(string='Última venta', compute='_compute_sales_metrics', store=True)
     statement_line_ids = fields.One2many('fotoapp.photographer.statement.line', 'asset_id', string='Liquidaciones')
     file_size_bytes = fields.Integer(string='Tamaño de archivo', readonly=True)
+    image_width = fields.Integer(string='Ancho (px)', readonly=True)
+    image_height = fields.Integer(string='Alto (px)', readonly=True)
+    taken_at = fields.Datetime(string='Tomada el', readonly=True, help='Fecha de captura según los datos EXIF.')
+    perceptual_hash = fields.Char(string='Hash perceptual', readonly=True, copy=False)
+    burst_leader_id = fields.Many2one(
+        'tienda.foto.asset',
+        string='Primera foto de la ráfaga',
+        readonly=True,
+        copy=False,
+        index='btree_not_null',
+        ondelete='set null',
+    )
+    burst_size = fields.Integer(string='Fotos en la ráfaga', default=1, readonly=True, copy=False)
+    bib_tag_ids = fields.One2many('tienda.foto.bib.tag', 'asset_id', string='Dorsales')
+    ocr_state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('done', 'Procesada'),
+        ('failed', 'Con error'),
+    ], string='OCR de dorsales', copy=False, readonly=True, index='btree_not_null')
     digital_download_url = fields.Char(string='URL descarga directa')
     download_limit = fields.Integer(string='Descargas permitidas', default=0, help='0 significa ilimitado.')
     download_count = fields.Integer(string='Descargas realizadas', default=0)
@@ -87,51 +152,283 @@ class TiendaFotoAsset(models.Model):
         ('foto_unique_dorsal_photographer', 'unique(photographer_id, numero_dorsal)', 'Ya existe una foto con ese identificador para este fotógrafo.'),
     ]
 
-    def _compute_checksum(self, b64_image): 
-        # Sirve para detectar duplicados o verificar integridad.
-        # Convierte el binario base64 a bytes, calcula hashlib.sha256, guarda el resultado en el campo checksum.
-        if not b64_image: #si viene vacío
-            return False
-        raw = base64.b64decode(b64_image)
-        return hashlib.sha256(raw).hexdigest()
+    def init(self):
+        # Búsqueda de duplicados por fotógrafo al subir y en el reporte por evento.
+        tools.create_index(
+            self.env.cr,
+            'tienda_foto_asset_photographer_checksum_idx',
+            self._table,
+            ['photographer_id', 'checksum'],
+            where='checksum IS NOT NULL',
+        )
+
+    @api.model
+    def _ingest_original(self, image_b64):
+        """Decodifica el original una sola vez y devuelve bytes y metadatos."""
+        ingested = ingest.ingest_b64(image_b64)
+        self._check_image_dimensions(ingested.width, ingested.height)
+        return ingested
+
+    @api.model
+    def _ingest_path(self, path):
+        """Como ``_ingest_original`` para un archivo en disco, leyéndolo por partes."""
+        ingested = ingest.ingest_path(path)
+        self._check_image_dimensions(ingested.width, ingested.height)
+        return ingested
+
+    @api.model
+    def _check_image_dimensions(self, width, height):
+        if not width or not height:
+            raise ValidationError(_('El archivo no es una imagen válida.'))
+        if width * height > IMAGE_MAX_RESOLUTION:
+            raise ValidationError(_('La imagen supera la resolución máxima permitida.'))
+
+    @api.model
+    def _ingested_values(self, ingested):
+        return {
+            'file_size_bytes': ingested.size,
+            'checksum': ingested.sha256,
+            'image_width': ingested.width,
+            'image_height': ingested.height,
+            'taken_at': ingested.taken_at or False,
+        }
+
+    @api.model
+    def _original_attachment_values(self, ingested):
+        values = {
+            'name': 'imagen_original',
+            'res_model': self._name,
+            'res_field': 'imagen_original',
+        }
+        if isinstance(ingested, ingest.IngestedFile):
+            values['mimetype'] = mimetypes.guess_type(ingested.path)[0] or 'image/jpeg'
+            values.update(self.env['ir.attachment']._fotoapp_store_path(ingested.path, ingested.sha1))
+            return values
+        values['raw'] = ingested.raw
+        return values
+
+    @api.model
+    def _create_original_attachment(self, raw, res_id=False):
+        # Se guarda el binario ya decodificado: el campo Image lo volvería a decodificar.
+        return self.env['ir.attachment'].sudo().create({
+            'name': 'imagen_original',
+            'res_model': self._name,
+            'res_field': 'imagen_original',
+            'res_id': res_id,
+            'raw': raw,
+        })
+
+    def _replace_original_attachment(self, raw):
+        """Reemplaza el original de cada foto por ``raw`` ya decodificado."""
+        Attachment = self.env['ir.attachment'].sudo()
+        Attachment.browse(
+            attachment.id for attachment in Attachment._fotoapp_field_attachments(self, 'imagen_original').values()
+        ).unlink()
+        for asset in self:
+            self._create_original_attachment(raw, res_id=asset.id)
+        self.invalidate_recordset(['imagen_original'])
 
-    def _compute_file_size(self, b64_image):
-        if not b64_image:
-            return 0
-        try:
-            return len(base64.b64decode(b64_image))
-        except Exception:
-            return 0
-    
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            photographer_id = self._resolve_photographer(vals)
-            if not photographer_id:
-                raise ValidationError(_('Cada foto debe pertenecer a un fotógrafo para asignar un identificador.'))
-            vals['numero_dorsal'] = self._next_numero_dorsal(photographer_id)
+        # El original se decodifica una sola vez y se guarda como adjunto; las
+        # subidas por partes ya lo traen en el filestore con sus metadatos.
+        original_attachments = {}
+        ocr_enabled = self._bib_ocr_enabled()
+        photographer_ids = [self._resolve_photographer(vals) for vals in vals_list]
+        if not all(photographer_ids):
+            raise ValidationError(_('Cada foto debe pertenecer a un fotógrafo para asignar un identificador.'))
+        # Un rango de identificadores por fotógrafo para todo el lote.
+        dorsales = {
+            photographer_id: iter(self._reserve_numeros_dorsales(photographer_id, count))
+            for photographer_id, count in Counter(photographer_ids).items()
+        }
+        for index, vals in enumerate(vals_list):
+            photographer_id = photographer_ids[index]
+            vals['numero_dorsal'] = next(dorsales[photographer_id])
             if not vals.get('name'):
                 vals['name'] = self._default_name_from_vals(vals)
             subscription = self._resolve_plan_subscription(vals, photographer_id)
-            image_b64 = vals.get('imagen_original')
-            if not image_b64:
+            attachment_id = vals.pop('fotoapp_original_attachment_id', False)
+            image_b64 = vals.pop('imagen_original', False)
+            if not image_b64 and not attachment_id:
                 continue
-            size_bytes = self._compute_file_size(image_b64)
-            if size_bytes:
-                vals['file_size_bytes'] = size_bytes
+            ingested = None
+            if not attachment_id:
+                ingested = self._ingest_original(image_b64)
+                vals.update(self._ingested_values(ingested))
+            size_bytes = vals.get('file_size_bytes') or 0
             if subscription and size_bytes and not subscription.can_store_bytes(size_bytes):
                 limit_mb = subscription.plan_id.storage_limit_mb or int((subscription.plan_id.storage_limit_gb or 0.0) * 1024)
                 raise ValidationError(_('Alcanzaste el límite de almacenamiento de tu plan (%s MB).') % limit_mb)
-            checksum = self._compute_checksum(image_b64)
-            if checksum:
-                vals['checksum'] = checksum
+            if ingested:
+                attachment_id = self._create_original_attachment(ingested.raw).id
+            original_attachments[index] = attachment_id
             vals.setdefault('publicada_por_ultima_vez', fields.Datetime.now())
             vals.setdefault('portal_token', self._generate_portal_token())
             vals.setdefault('publicada', True)
             vals.setdefault('website_published', True)
             vals.setdefault('lifecycle_state', 'published')
-            self._generate_watermark(vals)
-        return super().create(vals_list)
+            vals['watermark_state'] = 'pending'
+            if ocr_enabled:
+                vals['ocr_state'] = 'pending'
+        assets = super().create(vals_list)
+        if original_attachments:
+            Attachment = self.env['ir.attachment'].sudo()
+            for index, attachment_id in original_attachments.items():
+                Attachment.browse(attachment_id).write({'res_id': assets[index].id})
+            assets.invalidate_recordset(['imagen_original'])
+        Subscription = self.env['sale.subscription'].sudo()
+        Subscription._fotoapp_add_usage(Subscription._fotoapp_usage_deltas(assets))
+        assets._queue_watermark_generation()
+        assets._queue_bib_ocr()
+        return assets
+
+    @api.model
+    def _fotoapp_find_duplicate(self, photographer_id, checksum):
+        if not photographer_id or not checksum:
+            return self.browse()
+        return self.search([
+            ('photographer_id', '=', photographer_id),
+            ('checksum', '=', checksum),
+        ], order='id', limit=1)
+
+    def _fotoapp_apply_dedupe(self, mode, album, vals):
+        """Resuelve una subida repetida sobre la foto existente y devuelve el resultado."""
+        self.ensure_one()
+        if mode == 'link' and album:
+            self.write({'album_ids': [Command.link(album.id)]})
+            return 'linked'
+        if mode == 'replace':
+            update_vals = {key: vals[key] for key in ('precio', 'name') if vals.get(key)}
+            if album:
+                update_vals['album_ids'] = [Command.set(album.ids)]
+            if update_vals:
+                self.write(update_vals)
+            return 'replaced'
+        return 'skipped'
+
+    @api.model
+    def _fotoapp_upload(self, vals, album=None, dedupe_mode='skip'):
+        """Crea la foto subida salvo que el fotógrafo ya tenga una idéntica.
+
+        La comparación usa el sha256 calculado al decodificar, antes de guardar
+        el original y de encolar la marca de agua. Devuelve ``(asset, estado)``
+        con estado ``created``, ``skipped``, ``linked`` o ``replaced``.
+        """
+        vals = dict(vals)
+        if vals.get('imagen_original'):
+            ingested = self._ingest_original(vals.pop('imagen_original'))
+            vals.update(self._ingested_values(ingested))
+        else:
+            ingested = None
+        duplicate = self._fotoapp_find_duplicate(self._resolve_photographer(vals), vals.get('checksum'))
+        if duplicate:
+            return duplicate, duplicate._fotoapp_apply_dedupe(dedupe_mode, album, vals)
+        if ingested:
+            vals['fotoapp_original_attachment_id'] = self._create_original_attachment(ingested.raw).id
+        return self.create(vals), 'created'
+
+    @api.model
+    def _fotoapp_upload_batch(self, vals_list, album=None, dedupe_mode='skip', batch_id=None, reservation=None):
+        """Versión por lotes de ``_fotoapp_upload``.
+
+        Los duplicados se buscan con una consulta por fotógrafo, los originales
+        se guardan con un único ``create`` de adjuntos, las fotos nuevas con un
+        único ``create`` (un rango de identificadores por fotógrafo) y el álbum
+        se vincula una sola vez. Todas llevan el mismo ``batch_id``.
+
+        En lugar de ``imagen_original`` una foto puede traer
+        ``fotoapp_source_path``, un temporal del filestore que se mueve sin
+        cargarlo en memoria; los temporales que no se usan quedan a cargo del
+        llamador.
+
+        Devuelve una lista alineada con ``vals_list`` de ``(foto, estado)``;
+        además de los estados de ``_fotoapp_upload`` puede ser ``invalid`` (no
+        es una imagen válida) o ``quota`` (no entra en el plan). El cupo se toma
+        de ``reservation`` si la hay; si no, de lo que el plan tiene libre.
+        """
+        batch_id = batch_id or uuid.uuid4().hex
+        results = [(self.browse(), 'invalid')] * len(vals_list)
+        prepared = []
+        for index, vals in enumerate(vals_list):
+            vals = dict(vals)
+            vals.pop('album_ids', None)
+            source_path = vals.pop('fotoapp_source_path', False)
+            try:
+                if source_path:
+                    ingested = self._ingest_path(source_path)
+                else:
+                    ingested = self._ingest_original(vals.pop('imagen_original'))
+            except (ValidationError, ValueError, OSError) as exc:
+                _logger.info('Foto descartada en el lote %s: %s', batch_id, exc)
+                continue
+            vals.update(self._ingested_values(ingested))
+            prepared.append((index, vals, ingested, self._resolve_photographer(vals)))
+
+        checksums = defaultdict(set)
+        for dummy, vals, dummy, photographer_id in prepared:
+            checksums[photographer_id].add(vals['checksum'])
+        existing = {}
+        for photographer_id, values in checksums.items():
+            # Orden descendente: ante varias copias gana la más antigua, como en _fotoapp_find_duplicate.
+            for asset in self.search([
+                ('photographer_id', '=', photographer_id),
+                ('checksum', 'in', list(values)),
+            ], order='id desc'):
+                existing[(photographer_id, asset.checksum)] = asset
+
+        to_create = []
+        repeated = []
+        first_in_batch = {}
+        quota = {}
+        for index, vals, ingested, photographer_id in prepared:
+            key = (photographer_id, vals['checksum'])
+            duplicate = existing.get(key)
+            if duplicate:
+                results[index] = (duplicate, duplicate._fotoapp_apply_dedupe(dedupe_mode, album, vals))
+                continue
+            if key in first_in_batch:
+                repeated.append((index, first_in_batch[key], vals))
+                continue
+            subscription = self._resolve_plan_subscription(vals, photographer_id)
+            size = vals['file_size_bytes']
+            if subscription:
+                if subscription.id not in quota:
+                    if reservation and reservation.subscription_id == subscription:
+                        left = reservation._fotoapp_remaining()
+                    else:
+                        left = subscription._fotoapp_available_quota()
+                    quota[subscription.id] = [float('inf') if value is None else value for value in left]
+                photos_left, bytes_left = quota[subscription.id]
+                if photos_left < 1 or size > bytes_left:
+                    results[index] = (self.browse(), 'quota')
+                    continue
+                quota[subscription.id] = [photos_left - 1, bytes_left - size]
+            first_in_batch[key] = index
+            vals['batch_id'] = batch_id
+            to_create.append((index, vals, ingested))
+
+        if to_create:
+            attachments = self.env['ir.attachment'].sudo().create([
+                self._original_attachment_values(ingested) for dummy, dummy, ingested in to_create
+            ])
+            for (dummy, vals, dummy), attachment in zip(to_create, attachments):
+                vals['fotoapp_original_attachment_id'] = attachment.id
+            assets = self.with_context(
+                tracking_disable=True, mail_create_nolog=True, mail_create_nosubscribe=True,
+            ).create([vals for dummy, vals, dummy in to_create])
+            for (index, dummy, dummy), asset in zip(to_create, assets):
+                results[index] = (asset, 'created')
+            if reservation:
+                reserved = assets.filtered(lambda asset: asset.plan_subscription_id == reservation.subscription_id)
+                if reserved:
+                    reservation._fotoapp_consume(len(reserved), sum(reserved.mapped('file_size_bytes')))
+            if album:
+                album.write({'asset_ids': [Command.link(asset.id) for asset in assets]})
+        for index, first_index, vals in repeated:
+            asset = results[first_index][0]
+            results[index] = (asset, asset._fotoapp_apply_dedupe(dedupe_mode, album, vals))
+        return results
 
     def _default_name_from_vals(self, vals):
         dorsal = vals.get('numero_dorsal')
@@ -160,110 +457,247 @@ class TiendaFotoAsset(models.Model):
         partner = self.env['res.partner'].browse(photographer_id)
         return partner.active_plan_subscription_id
 
+    def _reserve_numeros_dorsales(self, photographer_id, count):
+        """Reserva ``count`` identificadores consecutivos del contador del fotógrafo."""
+        numbers = self.env['fotoapp.photo.counter'].sudo()._allocate(photographer_id, count)
+        return [str(number) for number in numbers]
+
     def _next_numero_dorsal(self, photographer_id):
-        self.env.cr.execute(
-            """
-            SELECT COALESCE(fotoapp_next_photo_identifier, 0)
-            FROM res_partner
-            WHERE id = %s
-            FOR UPDATE
-            """,
-            (photographer_id,)
-        )
-        row = self.env.cr.fetchone()
-        if row is None:
-            raise ValidationError(_('No se encontró el fotógrafo para generar el identificador de la foto.'))
-        next_value = (row[0] or 0) + 1
-        self.env.cr.execute(
-            """
-            UPDATE res_partner
-            SET fotoapp_next_photo_identifier = %s
-            WHERE id = %s
-            """,
-            (next_value, photographer_id)
-        )
-        return str(next_value)
+        return self._reserve_numeros_dorsales(photographer_id, 1)[0]
     
-    def _generate_watermark(self, vals):
-        image_b64 = vals.get('imagen_original')
-        if not image_b64:
-            return vals
-        try:
-            raw = base64.b64decode(image_b64)
-            image = Image.open(BytesIO(raw)).convert("RGBA") #abre la imagen y la convierte apra poder trabajarla.
-        except Exception as exc:
-            _logger.warning("No se pudo generar la marca de agua: %s", exc)
-            return vals
-    
-        watermark = Image.new("RGBA", image.size)
-        overlay_added = self._apply_partner_watermark(image, watermark, vals)
-        if not overlay_added:
-            draw = ImageDraw.Draw(watermark)
-            try:
-                font = ImageFont.truetype("arial.ttf", 48)
-            except OSError:
-                font = ImageFont.load_default()
-            draw.text((30, 30), "FotoApp", fill=(255, 255, 255, 128), font=font)
-
-        combined = Image.alpha_composite(image, watermark)
-        buf = BytesIO() #crea un buffer en memoria para guardar la imagen resultante
-        combined.convert("RGB").save(buf, format="JPEG", quality=85)
-        vals['imagen_watermark'] = base64.b64encode(buf.getvalue())
-        return vals
-
-    def _apply_partner_watermark(self, base_image, watermark_layer, vals):
-        partner = self._get_photographer(vals)
-        if not partner or not partner.watermark_image:
-            return False
+    def _get_watermark_overlay(self, partner):
+        if not partner:
+            return None
+        attachment = self.env['ir.attachment']._fotoapp_field_attachments(partner, 'watermark_image').get(partner.id)
+        source = attachment._fotoapp_stream_source() if attachment else False
+        if not source:
+            return None
+        # Se envía la ruta y el checksum: el overlay ya preparado se reutiliza desde la caché.
+        return {
+            'partner_id': partner.id,
+            'checksum': attachment.checksum,
+            'image': source,
+            'opacity': partner.watermark_opacity,
+            'scale': partner.watermark_scale,
+        }
+
+    def _queue_watermark_generation(self):
+        if self.env.context.get('fotoapp_sync_watermark'):
+            self._render_pending_watermarks()
+            return
+        cron = self.env.ref('fotoapp.ir_cron_fotoapp_watermarks', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    @api.model
+    def _generate_webp_enabled(self):
+        icp = self.env['ir.config_parameter'].sudo()
+        return icp.get_param('fotoapp.generate_webp') in ('1', 'True', 'true')
+
+    @api.model
+    def _get_watermark_workers(self):
+        # Sólo los workers prefork son procesos de un hilo: con hilos (servidor de
+        # desarrollo, odoo shell) un fork hereda locks tomados y se renderiza en serie.
+        if not tools.config['workers']:
+            return 1
+        icp = self.env['ir.config_parameter'].sudo()
+        return max(self._safe_int_param(icp, 'fotoapp.watermark_workers', os.cpu_count() or 1), 1)
+
+    def _render_pending_watermarks(self):
+        assets = self.filtered(lambda asset: asset.watermark_state == 'pending')
+        if not assets:
+            return
+        originals = self.env['ir.attachment']._fotoapp_field_attachments(assets, 'imagen_original')
+        overlays = {}
+        webp = self._generate_webp_enabled()
+        tasks = []
+        rendered_ids = []
+        failed = self.browse()
+        for asset in assets:
+            attachment = originals.get(asset.id)
+            source = attachment._fotoapp_stream_source() if attachment else False
+            if not source:
+                failed |= asset
+                continue
+            partner = asset.photographer_id
+            if partner.id not in overlays:
+                overlays[partner.id] = self._get_watermark_overlay(partner)
+            tasks.append((asset.id, source, overlays[partner.id], webp))
+        Asset = self.with_context(tracking_disable=True, skip_lifecycle_side_effects=True)
+        for asset_id, rendered, error in watermark.render_many(tasks, workers=self._get_watermark_workers()):
+            if error:
+                _logger.warning('No se pudo generar la marca de agua de la foto %s: %s', asset_id, error)
+                failed |= self.browse(asset_id)
+                continue
+            preview_webp = rendered.get('preview_webp')
+            rendered_ids.append(asset_id)
+            Asset.browse(asset_id).write({
+                'imagen_watermark': base64.b64encode(rendered['watermark']),
+                'imagen_preview': base64.b64encode(rendered['preview']),
+                'imagen_thumb': base64.b64encode(rendered['thumb']),
+                'imagen_preview_webp': base64.b64encode(preview_webp) if preview_webp else False,
+                'has_derivatives': True,
+                'has_webp': bool(preview_webp),
+                'perceptual_hash': rendered.get('dhash') or False,
+                'watermark_state': 'done',
+            })
+        if failed:
+            failed.write({'watermark_state': 'failed'})
+        if rendered_ids:
+            rendered = self.browse(rendered_ids)
+            rendered.mapped('evento_id')._fotoapp_cluster_bursts(around=rendered)
+
+    @api.model
+    def cron_process_pending_watermarks(self, batch_size=WATERMARK_BATCH_SIZE):
+        started = time.monotonic()
+        while time.monotonic() - started < WATERMARK_TIME_BUDGET:
+            # SKIP LOCKED permite correr varias instancias del job en paralelo.
+            self.env.cr.execute(
+                """
+                SELECT id
+                FROM tienda_foto_asset
+                WHERE watermark_state = 'pending'
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (batch_size,)
+            )
+            asset_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not asset_ids:
+                return
+            self.sudo().browse(asset_ids)._render_pending_watermarks()
+            if cron_can_commit():
+                self.env.cr.commit()
+        self.env.ref('fotoapp.ir_cron_fotoapp_watermarks')._trigger()
+
+    @api.model
+    def _bib_ocr_enabled(self):
+        icp = self.env['ir.config_parameter'].sudo()
+        return icp.get_param('fotoapp.ocr_enabled') in ('1', 'True', 'true')
+
+    @api.model
+    def _get_ocr_workers(self):
+        icp = self.env['ir.config_parameter'].sudo()
+        return max(self._safe_int_param(icp, 'fotoapp.ocr_workers', os.cpu_count() or 1), 1)
+
+    def _queue_bib_ocr(self):
+        if not self.filtered(lambda asset: asset.ocr_state == 'pending'):
+            return
+        cron = self.env.ref('fotoapp.ir_cron_fotoapp_bib_ocr', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    def _run_bib_ocr(self):
+        originals = self.env['ir.attachment']._fotoapp_field_attachments(self, 'imagen_original')
+        tasks = []
+        failed = self.browse()
+        for asset in self:
+            attachment = originals.get(asset.id)
+            source = attachment._fotoapp_stream_source() if attachment else False
+            if not source:
+                failed |= asset
+                continue
+            tasks.append((asset.photographer_id.id, asset.id, source))
+        icp = self.env['ir.config_parameter'].sudo()
         try:
-            partner_img = Image.open(BytesIO(base64.b64decode(partner.watermark_image))).convert("RGBA")
-        except Exception as exc:
-            _logger.warning('Marca de agua inválida para %s: %s', partner.name, exc)
-            return False
+            min_confidence = float(icp.get_param('fotoapp.ocr_min_confidence') or bib_ocr.OCR_MIN_CONFIDENCE)
+        except ValueError:
+            min_confidence = bib_ocr.OCR_MIN_CONFIDENCE
+        done_ids = []
+        tag_vals = []
+        for asset_id, bibs, error in bib_ocr.ocr_many(tasks, workers=self._get_ocr_workers(), min_confidence=min_confidence):
+            if error:
+                _logger.warning('No se pudo leer el dorsal de la foto %s: %s', asset_id, error)
+                failed |= self.browse(asset_id)
+                continue
+            done_ids.append(asset_id)
+            tag_vals.extend(
+                {'asset_id': asset_id, 'bib': bib, 'source': 'ocr', 'confidence': confidence}
+                for bib, confidence in bibs
+            )
+        # Resultados en bloque: se reemplazan los dorsales OCR previos sin tocar los cargados a mano.
+        BibTag = self.env['tienda.foto.bib.tag'].sudo()
+        BibTag.search([('asset_id', 'in', done_ids), ('source', '=', 'ocr')]).unlink()
+        existing = {(tag.asset_id.id, tag.bib) for tag in BibTag.search([('asset_id', 'in', done_ids)])}
+        BibTag.create([
+            vals for vals in tag_vals
+            if (vals['asset_id'], normalize_bib(vals['bib'])) not in existing
+        ])
+        Asset = self.with_context(tracking_disable=True, skip_lifecycle_side_effects=True)
+        if done_ids:
+            Asset.browse(done_ids).write({'ocr_state': 'done'})
+        if failed:
+            Asset.browse(failed.ids).write({'ocr_state': 'failed'})
 
-        scale = min(max(partner.watermark_scale or 0.3, 0.05), 1.0)
-        opacity = min(max(partner.watermark_opacity or 60, 0), 100) / 100.0
-        target_width = max(int(base_image.width * scale), 1)
-        ratio = target_width / float(partner_img.width)
-        target_height = max(int(partner_img.height * ratio), 1)
-        partner_img = partner_img.resize((target_width, target_height), Image.LANCZOS)
-
-        if partner_img.mode != 'RGBA':
-            partner_img = partner_img.convert('RGBA')
-        alpha = partner_img.split()[3].point(lambda p: int(p * opacity))
-        partner_img.putalpha(alpha)
-
-        position = (
-            max(int((base_image.width - partner_img.width) / 2), 0),
-            max(int((base_image.height - partner_img.height) / 2), 0)
-        )
-        watermark_layer.alpha_composite(partner_img, dest=position)
-        return True
+    @api.model
+    def cron_process_pending_bib_ocr(self, batch_size=OCR_BATCH_SIZE):
+        started = time.monotonic()
+        while time.monotonic() - started < OCR_TIME_BUDGET:
+            # Reparto equitativo: se toma la n-ésima foto pendiente de cada
+            # fotógrafo antes que la siguiente de cualquiera de ellos.
+            self.env.cr.execute(
+                """
+                SELECT id
+                FROM (
+                    SELECT id, row_number() OVER (PARTITION BY photographer_id ORDER BY id) AS turn
+                    FROM tienda_foto_asset
+                    WHERE ocr_state = 'pending'
+                ) pending
+                ORDER BY turn, id
+                LIMIT %s
+                """,
+                (batch_size,)
+            )
+            candidate_ids = tuple(row[0] for row in self.env.cr.fetchall())
+            if not candidate_ids:
+                return
+            if not bib_ocr.tesseract_available():
+                _logger.warning('Hay fotos pendientes de OCR pero no se encontró tesseract en el PATH.')
+                return
+            self.env.cr.execute(
+                """
+                SELECT id
+                FROM tienda_foto_asset
+                WHERE id IN %s AND ocr_state = 'pending'
+                FOR UPDATE SKIP LOCKED
+                """,
+                (candidate_ids,)
+            )
+            asset_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not asset_ids:
+                return
+            self.sudo().browse(asset_ids)._run_bib_ocr()
+            if cron_can_commit():
+                self.env.cr.commit()
+        self.env.ref('fotoapp.ir_cron_fotoapp_bib_ocr')._trigger()
 
-    def _get_photographer(self, vals):
-        if vals.get('photographer_id'):
-            return self.env['res.partner'].browse(vals['photographer_id'])
-        event_id = vals.get('evento_id')
-        if not event_id:
-            return None
-        event = self.env['tienda.foto.evento'].browse(event_id)
-        return event.photographer_id
-    
     def write(self, vals):
         previous_states = {}
         if 'lifecycle_state' in vals and not self.env.context.get('skip_lifecycle_side_effects'):
             previous_states = {asset.id: asset.lifecycle_state for asset in self}
-        if 'imagen_original' in vals:
-            vals = self._generate_watermark(vals)
-            size_bytes = self._compute_file_size(vals['imagen_original'])
-            if size_bytes:
-                vals['file_size_bytes'] = size_bytes
-            checksum = self._compute_checksum(vals['imagen_original'])
-            if checksum:
-                vals['checksum'] = checksum
+        original_changed = 'imagen_original' in vals
+        original_raw = None
+        if original_changed:
+            vals['watermark_state'] = 'pending'
+            if self._bib_ocr_enabled():
+                vals['ocr_state'] = 'pending'
+            if vals['imagen_original']:
+                # Como en ``create``: se decodifica una sola vez y se guarda el binario.
+                ingested = self._ingest_original(vals.pop('imagen_original'))
+                vals.update(self._ingested_values(ingested))
+                original_raw = ingested.raw
         if vals.get('portal_token') is False:
             vals['portal_token'] = self._generate_portal_token()
+        Subscription = self.env['sale.subscription'].sudo()
+        usage_before = None
+        if USAGE_ASSET_FIELDS & set(vals):
+            usage_before = Subscription._fotoapp_usage_deltas(self, sign=-1)
         res = super().write(vals)
+        if original_raw is not None:
+            self._replace_original_attachment(original_raw)
+        if usage_before is not None:
+            Subscription._fotoapp_add_usage(usage_before, Subscription._fotoapp_usage_deltas(self))
         if previous_states:
             for asset in self:
                 old_state = previous_states.get(asset.id)
@@ -274,20 +708,25 @@ class TiendaFotoAsset(models.Model):
                     asset._on_archived()
         if any(key in vals for key in ['precio', 'name']):
             self._sync_sale_products()
+        if original_changed:
+            self._queue_watermark_generation()
+            self._queue_bib_ocr()
+            self.sudo().mapped('sale_order_line_ids.order_id')._fotoapp_invalidate_download_bundles()
+        return res
+
+    def unlink(self):
+        Subscription = self.env['sale.subscription'].sudo()
+        usage = Subscription._fotoapp_usage_deltas(self, sign=-1)
+        self.env['fotoapp.filestore.orphan']._fotoapp_track_assets(self)
+        res = super().unlink()
+        Subscription._fotoapp_add_usage(usage)
         return res
 
     def regenerate_watermark(self):
-        for asset in self:
-            if not asset.imagen_original:
-                continue
-            vals = {
-                'imagen_original': asset.imagen_original,
-                'photographer_id': asset.photographer_id.id,
-                'evento_id': asset.evento_id.id,
-            }
-            self._generate_watermark(vals)
-            if vals.get('imagen_watermark'):
-                asset.imagen_watermark = vals['imagen_watermark']
+        if not self:
+            return
+        self.with_context(skip_lifecycle_side_effects=True).write({'watermark_state': 'pending'})
+        self._queue_watermark_generation()
 
     def ensure_download_token(self):
         for asset in self:
@@ -451,44 +890,136 @@ class TiendaFotoAsset(models.Model):
         return base_date + timedelta(days=delete_days)
 
     @api.depends('publicada_por_ultima_vez', 'archived_at', 'lifecycle_state', 'last_sale_date')
-    def _compute_lifecycle_deadlines(self):
+    def _compute_lifecycle_due_dates(self):
+        archive_days, delete_days = self._get_lifecycle_config()
+        for asset in self:
+            asset.archive_due_at = (
+                asset._get_archive_deadline(archive_days) if asset.lifecycle_state == 'published' else False
+            )
+            asset.delete_due_at = (
+                asset._get_delete_deadline(delete_days) if asset.lifecycle_state == 'archived' else False
+            )
+
+    @api.model
+    def _recompute_lifecycle_due_dates(self):
+        """Recalcula en un solo UPDATE los vencimientos tras cambiar la configuración."""
         archive_days, delete_days = self._get_lifecycle_config()
+        self.flush_model()
+        self.env.cr.execute(
+            """
+            UPDATE tienda_foto_asset
+            SET archive_due_at = CASE
+                    WHEN lifecycle_state = 'published' AND %(archive)s > 0
+                    THEN GREATEST(COALESCE(publicada_por_ultima_vez, create_date), last_sale_date)
+                         + make_interval(days => %(archive)s)
+                END,
+                delete_due_at = CASE
+                    WHEN lifecycle_state = 'archived' AND %(delete)s > 0
+                    THEN COALESCE(archived_at, write_date, create_date) + make_interval(days => %(delete)s)
+                END
+            WHERE lifecycle_state IN ('published', 'archived')
+               OR archive_due_at IS NOT NULL
+               OR delete_due_at IS NOT NULL
+            """,
+            {'archive': archive_days, 'delete': delete_days}
+        )
+        _logger.info('Vencimientos del ciclo de vida recalculados para %s fotos', self.env.cr.rowcount)
+        self.invalidate_model(['archive_due_at', 'delete_due_at', 'days_until_archive', 'days_until_delete'])
+
+    @api.depends('archive_due_at', 'delete_due_at')
+    def _compute_lifecycle_deadlines(self):
         now = fields.Datetime.now()
         for asset in self:
-            days_to_archive = False
-            days_to_delete = False
-            if asset.lifecycle_state == 'published':
-                deadline = asset._get_archive_deadline(archive_days)
-                if deadline:
-                    days_to_archive = max((deadline - now).days, 0)
-            if asset.lifecycle_state == 'archived':
-                deadline = asset._get_delete_deadline(delete_days)
-                if deadline:
-                    days_to_delete = max((deadline - now).days, 0)
-            asset.days_until_archive = days_to_archive
-            asset.days_until_delete = days_to_delete
+            asset.days_until_archive = max((asset.archive_due_at - now).days, 0) if asset.archive_due_at else False
+            asset.days_until_delete = max((asset.delete_due_at - now).days, 0) if asset.delete_due_at else False
+
+    @api.model
+    def _lifecycle_due_ids(self, phase, now, after_id, limit):
+        """Una página de ids vencidos para la fase ``archive`` o ``delete``.
+
+        Consulta por rango sobre ``archive_due_at``/``delete_due_at``, que
+        están indexadas y sólo tienen valor en el estado correspondiente.
+        """
+        self.flush_model(['lifecycle_state', 'archive_due_at', 'delete_due_at'])
+        if phase == 'archive':
+            state, column = 'published', 'archive_due_at'
+        else:
+            state, column = 'archived', 'delete_due_at'
+        self.env.cr.execute(
+            f"""
+            SELECT id
+            FROM tienda_foto_asset
+            WHERE {column} <= %s
+              AND lifecycle_state = %s
+              AND id > %s
+            ORDER BY id
+            LIMIT %s
+            """,
+            (now, state, after_id, limit)
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _lifecycle_cursor(self):
+        icp = self.env['ir.config_parameter'].sudo()
+        phase, dummy, after_id = (icp.get_param(LIFECYCLE_CURSOR_PARAM) or '').partition(':')
+        if phase not in ('archive', 'delete'):
+            return 'archive', 0
+        try:
+            return phase, int(after_id)
+        except ValueError:
+            return phase, 0
 
     @api.model
-    def cron_manage_photo_lifecycle(self):
+    def cron_manage_photo_lifecycle(self, batch_size=LIFECYCLE_BATCH_SIZE):
+        """Archiva las fotos inactivas y elimina las archivadas vencidas.
+
+        Cada fase recorre los ids vencidos por páginas (cursor por ``id``),
+        procesa cada lote con el ORM y confirma entre lotes para no mantener
+        bloqueos durante toda la corrida. Si se agota el tiempo, el cursor se
+        guarda y el cron se vuelve a disparar para continuar desde ahí.
+        """
         archive_days, delete_days = self._get_lifecycle_config()
         now = fields.Datetime.now()
+        started = time.monotonic()
+        stats = {'scanned': 0, 'archived': 0, 'deleted': 0}
+        start_phase, after_id = self._lifecycle_cursor()
+        phases = [('archive', archive_days), ('delete', delete_days)]
+        if start_phase == 'delete':
+            phases = phases[1:]
+        for phase, days in phases:
+            while days:
+                if time.monotonic() - started > LIFECYCLE_TIME_BUDGET:
+                    self.env['ir.config_parameter'].sudo().set_param(LIFECYCLE_CURSOR_PARAM, f'{phase}:{after_id}')
+                    self._log_lifecycle_stats(stats, started, finished=False)
+                    self.env.ref('fotoapp.ir_cron_fotoapp_asset_lifecycle')._trigger()
+                    return stats
+                batch_ids = self._lifecycle_due_ids(phase, now, after_id, batch_size)
+                if not batch_ids:
+                    break
+                stats['scanned'] += len(batch_ids)
+                after_id = batch_ids[-1]
+                batch = self.browse(batch_ids)
+                if phase == 'archive':
+                    batch.action_archive()
+                    stats['archived'] += len(batch)
+                else:
+                    batch.unlink()
+                    stats['deleted'] += len(batch)
+                if cron_can_commit():
+                    self.env.cr.commit()
+            after_id = 0
+        if self._lifecycle_cursor() != ('archive', 0):
+            self.env['ir.config_parameter'].sudo().set_param(LIFECYCLE_CURSOR_PARAM, False)
+        self._log_lifecycle_stats(stats, started)
+        return stats
 
-        published_assets = self.search([('lifecycle_state', '=', 'published')])
-        to_archive = self.browse()
-        for asset in published_assets:
-            deadline = asset._get_archive_deadline(archive_days)
-            if deadline and deadline <= now:
-                to_archive |= asset
-        if to_archive:
-            to_archive.action_archive()
-
-        archived_assets = self.search([('lifecycle_state', '=', 'archived')])
-        to_delete = self.browse()
-        for asset in archived_assets:
-            deadline = asset._get_delete_deadline(delete_days)
-            if deadline and deadline <= now:
-                to_delete |= asset
-        if to_delete:
-            to_delete.unlink()
+    @api.model
+    def _log_lifecycle_stats(self, stats, started, finished=True):
+        _logger.info(
+            'Ciclo de vida de fotos%s: %s revisadas, %s archivadas, %s eliminadas en %.1fs',
+            '' if finished else ' (continúa en la próxima ejecución)',
+            stats['scanned'], stats['archived'], stats['deleted'], time.monotonic() - started,
+        )
     
 
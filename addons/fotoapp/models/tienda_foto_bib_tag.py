@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+import logging
+import re
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+BIB_CLEAN_RE = re.compile(r'[^0-9A-Z]')
+BIB_MAX_LENGTH = 12
+BIB_SEARCH_LIMIT = 200
+
+
+def normalize_bib(value):
+    """Deja sólo dígitos y letras en mayúscula: ``" #0123 "`` -> ``"0123"``."""
+    return BIB_CLEAN_RE.sub('', str(value or '').upper())[:BIB_MAX_LENGTH]
+
+
+class TiendaFotoBibTag(models.Model):
+    _name = 'tienda.foto.bib.tag'
+    _description = 'Dorsal detectado en una foto'
+    _order = 'evento_id, bib, asset_id'
+
+    asset_id = fields.Many2one('tienda.foto.asset', string='Foto', required=True, ondelete='cascade', index=True)
+    evento_id = fields.Many2one(related='asset_id.evento_id', store=True, string='Evento')
+    bib = fields.Char(string='Dorsal', required=True, index='trigram')
+    source = fields.Selection([
+        ('manual', 'Manual'),
+        ('import', 'Importado'),
+        ('ocr', 'OCR'),
+    ], string='Origen', default='manual', required=True)
+    confidence = fields.Float(string='Confianza')
+
+    _sql_constraints = [
+        ('tienda_foto_bib_tag_unique', 'unique(asset_id, bib)', 'La foto ya tiene ese dorsal.'),
+    ]
+
+    def init(self):
+        # La búsqueda pública filtra siempre por evento y dorsal exacto.
+        tools.create_index(
+            self.env.cr,
+            'tienda_foto_bib_tag_evento_bib_idx',
+            self._table,
+            ['evento_id', 'bib'],
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            vals['bib'] = normalize_bib(vals.get('bib'))
+            if not vals['bib']:
+                raise ValidationError(_('El dorsal no puede estar vacío.'))
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if 'bib' in vals:
+            vals['bib'] = normalize_bib(vals['bib'])
+        return super().write(vals)
+
+    @api.model
+    def _fotoapp_search_assets(self, event, bib, limit=BIB_SEARCH_LIMIT):
+        """Fotos públicas del evento con ese dorsal.
+
+        Primero se busca el dorsal exacto (índice btree por evento); si no hay
+        resultados se busca como subcadena, resuelto por el índice trigram.
+        """
+        bib = normalize_bib(bib)
+        if not bib:
+            return self.env['tienda.foto.asset']
+        # Los álbumes visibles van en el dominio para que el límite cuente sólo fotos públicas.
+        base_domain = [
+            ('evento_id', '=', event.id),
+            ('asset_id.website_published', '=', True),
+            ('asset_id.lifecycle_state', '!=', 'archived'),
+            ('asset_id.album_ids', 'any', [('state', '=', 'published'), ('is_private', '=', False)]),
+        ]
+        tags = self.sudo().search(base_domain + [('bib', '=', bib)], limit=limit)
+        if not tags and len(bib) >= 3:
+            tags = self.sudo().search(base_domain + [('bib', 'ilike', bib)], limit=limit)
+        return tags.asset_id.sorted('id', reverse=True)
+
+    @api.model
+    def _fotoapp_parse_import(self, content, filename=''):
+        """Convierte un CSV (``foto,dorsal``) o JSON en filas ``(foto, dorsal)``.
+
+        El JSON puede ser una lista de ``{"foto": ..., "dorsal": ...}`` o de
+        ``{"foto": ..., "dorsales": [...]}``. ``foto`` es el identificador de la
+        foto o el nombre del archivo.
+        """
+        if isinstance(content, bytes):
+            content = content.decode('utf-8-sig')
+        rows = []
+        if filename.lower().endswith('.json') or content.lstrip().startswith('['):
+            try:
+                entries = json.loads(content)
+            except ValueError as exc:
+                raise ValidationError(_('El archivo JSON no es válido.')) from exc
+            for entry in entries if isinstance(entries, list) else []:
+                if not isinstance(entry, dict):
+                    continue
+                bibs = entry.get('dorsales') or [entry.get('dorsal')]
+                if not isinstance(bibs, list):
+                    # ``"dorsales": "123"`` es un solo dorsal, no uno por carácter.
+                    bibs = [bibs]
+                rows.extend((str(entry.get('foto') or ''), bib) for bib in bibs)
+            return rows
+        reader = csv.reader(io.StringIO(content))
+        for row in reader:
+            if len(row) < 2:
+                continue
+            rows.append((row[0], row[1]))
+        if rows and normalize_bib(rows[0][1]) in ('DORSAL', 'BIB'):
+            rows = rows[1:]
+        return rows
+
+    @api.model
+    def _fotoapp_import_rows(self, event, rows, source='import'):
+        """Crea en bloque los dorsales de ``rows`` para las fotos del evento.
+
+        Resuelve todas las fotos con una búsqueda y omite los pares ya cargados.
+        Devuelve ``(creados, filas_sin_foto)``.
+        """
+        wanted = [((photo or '').strip(), normalize_bib(bib)) for photo, bib in rows]
+        wanted = [(photo, bib) for photo, bib in wanted if photo and bib]
+        if not wanted:
+            return 0, 0
+        keys = list({photo for photo, dummy in wanted})
+        assets = self.env['tienda.foto.asset'].sudo().search([
+            ('evento_id', '=', event.id),
+            '|', ('numero_dorsal', 'in', keys), ('name', 'in', keys),
+        ])
+        by_key = {}
+        for asset in assets:
+            by_key.setdefault(asset.name, asset.id)
+            by_key[asset.numero_dorsal] = asset.id
+        existing = {
+            (tag.asset_id.id, tag.bib)
+            for tag in self.sudo().search([('asset_id', 'in', assets.ids)])
+        }
+        vals_list = []
+        missing = 0
+        for photo, bib in wanted:
+            asset_id = by_key.get(photo)
+            if not asset_id:
+                missing += 1
+                continue
+            if (asset_id, bib) in existing:
+                continue
+            existing.add((asset_id, bib))
+            vals_list.append({'asset_id': asset_id, 'bib': bib, 'source': source})
+        self.sudo().create(vals_list)
+        _logger.info('Evento %s: %s dorsales importados, %s filas sin foto', event.id, len(vals_list), missing)
+        return len(vals_list), missing
@@ -1,7 +1,30 @@
+import logging
+
 from odoo import api, fields, models
 
+from .gallery_cache import bump_gallery_version
 from .utils import slugify_text
 
+_logger = logging.getLogger(__name__)
+
+# Campos que cambian lo que muestra la galería pública.
+GALLERY_CATEGORY_FIELDS = {
+    'name', 'slug', 'website_description', 'image_cover', 'sequence', 'estado',
+    'website_published', 'display_on_homepage', 'portal_sequence',
+}
+
+EVENT_METRICS_SQL = """
+    SELECT categoria.id,
+           count(evento.id) AS event_count,
+           count(evento.id) FILTER (
+               WHERE evento.website_published AND evento.estado = 'publicado'
+           ) AS website_event_count
+    FROM tienda_foto_categoria categoria
+    LEFT JOIN tienda_foto_evento evento ON evento.categoria_id = categoria.id
+    WHERE categoria.id IN %s
+    GROUP BY categoria.id
+"""
+
 
 class TiendaFotoCategoria(models.Model):
     _name = 'tienda.foto.categoria'
@@ -35,16 +58,9 @@ class TiendaFotoCategoria(models.Model):
         inverse_name='categoria_id',
         string='Eventos'
     )
-    event_count = fields.Integer(
-        string='Total de eventos',
-        compute='_compute_event_metrics',
-        store=True,
-    )
-    website_event_count = fields.Integer(
-        string='Eventos publicados en web',
-        compute='_compute_event_metrics',
-        store=True,
-    )
+    # Mantenidos por _fotoapp_refresh_event_metrics desde el modelo de eventos.
+    event_count = fields.Integer(string='Total de eventos', readonly=True, copy=False)
+    website_event_count = fields.Integer(string='Eventos publicados en web', readonly=True, copy=False)
 
     _sql_constraints = [
         ('slug_unique', 'unique(slug)', 'El slug debe ser único.'),
@@ -53,14 +69,77 @@ class TiendaFotoCategoria(models.Model):
     def action_mark_system(self):
         self.write({'is_system_category': True})
 
-    @api.depends('evento_ids', 'evento_ids.estado', 'evento_ids.website_published')
-    def _compute_event_metrics(self):
-        for record in self:
-            events = record.evento_ids
-            record.event_count = len(events)
-            record.website_event_count = len(
-                events.filtered(lambda event: event.website_published and event.estado == 'publicado')
+    def _fotoapp_event_metrics(self):
+        """Devuelve {categoría: (total, publicados)} calculado en la base."""
+        if not self.ids:
+            return {}
+        self.env['tienda.foto.evento'].flush_model(['categoria_id', 'estado', 'website_published'])
+        self.env.cr.execute(EVENT_METRICS_SQL, (tuple(self.ids),))
+        return {row[0]: (row[1], row[2]) for row in self.env.cr.fetchall()}
+
+    def _fotoapp_refresh_event_metrics(self):
+        """Recalcula los contadores de eventos sólo de estas categorías.
+
+        Un agregado SQL por categoría afectada (resuelto con el índice de
+        ``categoria_id``) en lugar de cargar todos sus eventos en el ORM.
+        """
+        categories = self.exists()
+        if not categories:
+            return
+        self.env['tienda.foto.evento'].flush_model(['categoria_id', 'estado', 'website_published'])
+        self.env.cr.execute(
+            """
+            UPDATE tienda_foto_categoria target
+            SET event_count = metrics.event_count,
+                website_event_count = metrics.website_event_count
+            FROM (%s) metrics
+            WHERE target.id = metrics.id
+              AND (target.event_count IS DISTINCT FROM metrics.event_count
+                   OR target.website_event_count IS DISTINCT FROM metrics.website_event_count)
+            """ % EVENT_METRICS_SQL,
+            (tuple(categories.ids),)
+        )
+        categories.invalidate_recordset(['event_count', 'website_event_count'])
+
+    @api.model
+    def _fotoapp_check_event_metrics(self, fix=False):
+        """Compara los contadores guardados con los eventos reales.
+
+        Devuelve la lista de ``(categoría, guardado, real)`` que no coinciden y,
+        con ``fix=True``, los corrige.
+        """
+        categories = self.with_context(active_test=False).search([])
+        metrics = categories._fotoapp_event_metrics()
+        mismatches = []
+        for category in categories:
+            stored = (category.event_count, category.website_event_count)
+            actual = metrics.get(category.id, (0, 0))
+            if stored != actual:
+                mismatches.append((category, stored, actual))
+        for category, stored, actual in mismatches:
+            _logger.warning(
+                'Categoría %s: contadores de eventos %s, deberían ser %s', category.id, stored, actual
             )
+        if fix and mismatches:
+            self.browse([category.id for category, dummy, dummy in mismatches])._fotoapp_refresh_event_metrics()
+        return mismatches
+
+    @api.model
+    def action_check_event_metrics(self):
+        mismatches = self._fotoapp_check_event_metrics(fix=True)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Contadores de eventos',
+                'message': (
+                    f'Se corrigieron {len(mismatches)} categorías.' if mismatches
+                    else 'Los contadores están al día.'
+                ),
+                'type': 'warning' if mismatches else 'success',
+                'sticky': False,
+            },
+        }
 
     def _prepare_slug(self, value):
         slug_base = value or self.name or ''
@@ -82,14 +161,25 @@ class TiendaFotoCategoria(models.Model):
             else:
                 to_create.append(vals)
         if to_create:
-            records |= super().create(to_create)
+            created = super().create(to_create)
+            records |= created
+            if any(created.mapped('website_published')):
+                bump_gallery_version(self.env.cr)
         return records
 
     def write(self, vals):
         if vals.get('slug'):
             vals['slug'] = self._prepare_slug(vals['slug'])
+        # Sólo cambia la galería si la categoría era o queda publicada.
+        if GALLERY_CATEGORY_FIELDS & set(vals) and (vals.get('website_published') or any(self.mapped('website_published'))):
+            bump_gallery_version(self.env.cr)
         return super().write(vals)
 
+    def unlink(self):
+        if any(self.mapped('website_published')):
+            bump_gallery_version(self.env.cr)
+        return super().unlink()
+
     def action_publicar(self):
         self.write({'estado': 'publicado', 'website_published': True})
 
@@ -1,9 +1,22 @@
 import secrets
+from datetime import datetime, timedelta
 
 from odoo import api, fields, models
 
+from . import phash
+from .gallery_cache import bump_gallery_version
 from .utils import slugify_text
 
+BURST_HAMMING_THRESHOLD = 10
+BURST_WINDOW_SECONDS = 10
+# Campos del evento que alimentan los contadores de su categoría.
+CATEGORY_METRIC_FIELDS = {'categoria_id', 'estado', 'website_published'}
+# Campos que cambian lo que muestra la galería pública.
+GALLERY_EVENT_FIELDS = {
+    'name', 'fecha', 'ciudad', 'estado_provincia', 'categoria_id', 'photographer_id', 'descripcion',
+    'image_cover', 'website_slug', 'website_published', 'estado', 'is_featured',
+}
+
 
 class TiendaFotoEvento(models.Model):
     _name = 'tienda.foto.evento'
@@ -21,6 +34,7 @@ class TiendaFotoEvento(models.Model):
         comodel_name='tienda.foto.categoria',
         string='Categoría',
         required=True,
+        index=True,
         domain="[('display_on_homepage', '=', True), ('estado', '=', 'publicado'), ('website_published', '=', True)]"
     )
     photographer_id = fields.Many2one(
@@ -46,6 +60,10 @@ class TiendaFotoEvento(models.Model):
     precio_base = fields.Monetary(string='Precio base sugerido', currency_field='currency_id')
     currency_id = fields.Many2one('res.currency', default=lambda self: self.env.company.currency_id.id)
     carpeta_externa = fields.Char(string='Carpeta/Álbum Externo')
+    carpeta_sync = fields.Boolean(
+        string='Sincronizar carpeta en vivo',
+        help='Importa cada pocos minutos las fotos nuevas de la carpeta externa, con el precio base.',
+    )
     website_slug = fields.Char(string='Slug para web', required=True)
     portal_token = fields.Char(string='Token portal', copy=False)
     portal_url = fields.Char(string='URL pública', compute='_compute_portal_url')
@@ -139,16 +157,30 @@ class TiendaFotoEvento(models.Model):
         events = super().create(vals_list)
         events._ensure_upload_tokens()
         events._ensure_portal_tokens()
+        events.categoria_id._fotoapp_refresh_event_metrics()
+        Subscription = self.env['sale.subscription'].sudo()
+        Subscription._fotoapp_add_usage(Subscription._fotoapp_usage_deltas(events))
+        if any(events.mapped('website_published')):
+            bump_gallery_version(self.env.cr)
         return events
 
     def write(self, vals): # el write se usa para actualizar registros existentes, por ejemplo, cambiar el nombre o estado de un evento.
         if vals.get('website_slug'):
             vals['website_slug'] = slugify_text(vals['website_slug'], fallback='evento')
+        # Sólo cambia la galería si el evento era o queda publicado.
+        gallery_changed = bool(GALLERY_EVENT_FIELDS & set(vals)) and any(self.mapped('website_published'))
+        categories = self.env['tienda.foto.categoria']
+        if CATEGORY_METRIC_FIELDS & set(vals):
+            categories = self.categoria_id
         res = super().write(vals)
+        if CATEGORY_METRIC_FIELDS & set(vals):
+            (categories | self.categoria_id)._fotoapp_refresh_event_metrics()
         if {'website_slug', 'name'} & set(vals.keys()):
             self._ensure_upload_tokens()
         if 'portal_token' in vals and not vals['portal_token']:
             self._ensure_portal_tokens()
+        if gallery_changed or vals.get('website_published'):
+            bump_gallery_version(self.env.cr)
         return res
 
     def _ensure_upload_tokens(self): # Asegura que cada evento tenga un token de subida único
@@ -196,7 +228,97 @@ class TiendaFotoEvento(models.Model):
             if next_stage:
                 event.lifecycle_state = next_stage
 
+    def _fotoapp_cluster_bursts(self, around=None):
+        """Agrupa las fotos casi idénticas (ráfagas) de cada evento.
+
+        La primera foto de cada grupo queda como líder con ``burst_size`` y el
+        resto apunta a ella en ``burst_leader_id``. Sólo se escriben los
+        registros cuyo grupo cambió.
+
+        Con ``around`` (las fotos recién procesadas) sólo se reagrupa la
+        ventana de tiempo alrededor de ellas, junto con los líderes y
+        seguidores de esas fotos. Si alguna no tiene fecha de captura se
+        reagrupa el evento completo.
+        """
+        Asset = self.env['tienda.foto.asset'].sudo()
+        icp = self.env['ir.config_parameter'].sudo()
+        radius = Asset._safe_int_param(icp, 'fotoapp.burst_hamming_threshold', BURST_HAMMING_THRESHOLD)
+        window = Asset._safe_int_param(icp, 'fotoapp.burst_window_seconds', BURST_WINDOW_SECONDS)
+        for event in self:
+            domain = [
+                ('evento_id', '=', event.id),
+                ('perceptual_hash', '!=', False),
+                ('lifecycle_state', '!=', 'archived'),
+            ]
+            recent = around.filtered(lambda asset: asset.evento_id == event) if around is not None else Asset
+            if around is not None and not recent:
+                continue
+            stamps = recent.mapped('taken_at')
+            if recent and window and all(stamps):
+                span = timedelta(seconds=window)
+                nearby = Asset.search(domain + [
+                    ('taken_at', '>=', min(stamps) - span),
+                    ('taken_at', '<=', max(stamps) + span),
+                ])
+                nearby |= nearby.burst_leader_id | Asset.search(domain + [('burst_leader_id', 'in', nearby.ids)])
+                assets = nearby.filtered(
+                    lambda asset: asset.perceptual_hash and asset.lifecycle_state != 'archived'
+                ).sorted(lambda asset: (asset.taken_at or datetime.max, asset.id))
+            else:
+                assets = Asset.search(domain, order='taken_at, id')
+            leaders = phash.cluster(
+                ((asset.id, asset.perceptual_hash, asset.taken_at) for asset in assets),
+                radius,
+                max_seconds=window or None,
+            )
+            sizes = {}
+            for leader_id in leaders.values():
+                sizes[leader_id] = sizes.get(leader_id, 0) + 1
+            changes = {}
+            for asset in assets:
+                leader_id = leaders[asset.id]
+                target = (
+                    False if leader_id == asset.id else leader_id,
+                    sizes[leader_id] if leader_id == asset.id else 1,
+                )
+                if (asset.burst_leader_id.id, asset.burst_size) != target:
+                    changes.setdefault(target, []).append(asset.id)
+            for (leader_id, size), asset_ids in changes.items():
+                Asset.browse(asset_ids).write({'burst_leader_id': leader_id, 'burst_size': size})
+
+    def _fotoapp_duplicate_groups(self):
+        """Fotos del evento con el mismo contenido, agrupadas por checksum.
+
+        Cada grupo viene ordenado por id: la primera es la foto original.
+        """
+        self.ensure_one()
+        Asset = self.env['tienda.foto.asset'].sudo()
+        groups = Asset._read_group(
+            [('evento_id', '=', self.id), ('checksum', '!=', False)],
+            ['checksum'],
+            ['id:array_agg'],
+            having=[('__count', '>', 1)],
+        )
+        return [Asset.browse(sorted(asset_ids)) for dummy, asset_ids in groups]
+
+    def action_archive_duplicates(self):
+        """Archiva las copias repetidas y conserva la foto más antigua de cada grupo."""
+        archived = self.env['tienda.foto.asset']
+        for event in self:
+            for group in event._fotoapp_duplicate_groups():
+                archived |= group[1:].filtered(lambda asset: asset.lifecycle_state != 'archived')
+        archived.action_archive()
+        return len(archived)
+
     def unlink(self):
+        # Las importaciones y subidas se borrarían en cascada desde SQL sin
+        # pasar por su unlink(), dejando sus ZIP y temporales en el filestore.
+        self.env['fotoapp.import.job'].sudo().search([('event_id', 'in', self.ids)]).unlink()
+        self.env['fotoapp.upload.session'].sudo().search([
+            '|',
+            ('import_event_id', 'in', self.ids),
+            ('album_id.event_id', 'in', self.ids),
+        ]).unlink()
         Asset = self.env['tienda.foto.asset'].sudo()
         assets = Asset.search([('evento_id', 'in', self.ids)])
         if assets:
@@ -204,4 +326,12 @@ class TiendaFotoEvento(models.Model):
         albums = self.mapped('album_ids').sudo()
         if albums:
             albums.with_context(skip_album_asset_cleanup=True).unlink()
-        return super().unlink()
\ No newline at end of file
+        if any(self.mapped('website_published')):
+            bump_gallery_version(self.env.cr)
+        categories = self.categoria_id
+        Subscription = self.env['sale.subscription'].sudo()
+        usage = Subscription._fotoapp_usage_deltas(self, sign=-1)
+        res = super().unlink()
+        categories._fotoapp_refresh_event_metrics()
+        Subscription._fotoapp_add_usage(usage)
+        return res
\ No newline at end of file
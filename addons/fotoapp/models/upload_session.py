@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import mimetypes
+import os
+import secrets
+from datetime import timedelta
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+
+from . import bulk_import, ingest
+from .tienda_foto_asset import DEDUPE_MODES
+from .zip_stream import CHUNK_SIZE
+
+_logger = logging.getLogger(__name__)
+
+UPLOAD_SESSION_TTL_HOURS = 24
+UPLOAD_MAX_MB_DEFAULT = 100
+IMPORT_MAX_MB_DEFAULT = 50 * 1024
+
+
+class FotoappUploadSession(models.Model):
+    """Subida por partes (estilo tus) que escribe directo en el filestore."""
+    _name = 'fotoapp.upload.session'
+    _description = 'Subida de foto por partes'
+    _order = 'id desc'
+
+    token = fields.Char(string='Token', required=True, copy=False, index=True,
+                        default=lambda self: secrets.token_urlsafe(24))
+    photographer_id = fields.Many2one('res.partner', string='Fotógrafo', required=True, index=True, ondelete='cascade')
+    album_id = fields.Many2one('tienda.foto.album', string='Álbum', ondelete='cascade')
+    import_event_id = fields.Many2one('tienda.foto.evento', string='Evento a importar', ondelete='cascade')
+    import_job_id = fields.Many2one('fotoapp.import.job', string='Importación', ondelete='set null')
+    file_name = fields.Char(string='Archivo')
+    precio = fields.Float(string='Precio')
+    # Float: un ZIP de un evento completo supera el rango de un entero de 32 bits.
+    total_size = fields.Float(string='Tamaño total')
+    received_bytes = fields.Float(string='Bytes recibidos', default=0)
+    tmp_path = fields.Char(string='Archivo temporal', copy=False, readonly=True, groups='base.group_system')
+    state = fields.Selection([
+        ('open', 'En curso'),
+        ('done', 'Completada'),
+        ('cancelled', 'Cancelada'),
+    ], string='Estado', default='open', required=True, index=True)
+    dedupe_mode = fields.Selection(DEDUPE_MODES, string='Si la foto ya existe', default='skip', required=True)
+    asset_id = fields.Many2one('tienda.foto.asset', string='Foto', ondelete='set null')
+    reservation_id = fields.Many2one('fotoapp.quota.reservation', string='Reserva de cuota', ondelete='set null')
+    upload_status = fields.Selection([
+        ('created', 'Creada'),
+        ('skipped', 'Duplicada omitida'),
+        ('linked', 'Duplicada vinculada'),
+        ('replaced', 'Duplicada reemplazada'),
+    ], string='Resultado', copy=False)
+    expires_at = fields.Datetime(
+        string='Vence el',
+        default=lambda self: fields.Datetime.now() + timedelta(hours=UPLOAD_SESSION_TTL_HOURS),
+    )
+
+    _sql_constraints = [
+        ('fotoapp_upload_session_token_unique', 'unique(token)', 'El token de subida debe ser único.'),
+        ('fotoapp_upload_session_target', 'CHECK(album_id IS NOT NULL OR import_event_id IS NOT NULL)',
+         'La subida debe tener un álbum o un evento a importar.'),
+    ]
+
+    @api.model
+    def _get_upload_max_bytes(self):
+        icp = self.env['ir.config_parameter'].sudo()
+        max_mb = self.env['tienda.foto.asset']._safe_int_param(icp, 'fotoapp.upload_max_mb', UPLOAD_MAX_MB_DEFAULT)
+        return max(max_mb, 1) * 1024 * 1024
+
+    @api.model
+    def _fotoapp_open(self, album, file_name, total_size, precio, dedupe_mode='skip', reservation=None):
+        """Reserva un temporal en el filestore para recibir ``total_size`` bytes.
+
+        Con ``reservation`` el cupo ya se verificó en la consulta previa y sólo
+        se controla que el archivo esté cubierto por la reserva.
+        """
+        if total_size <= 0:
+            raise ValidationError(_('El archivo está vacío.'))
+        if total_size > self._get_upload_max_bytes():
+            raise ValidationError(_('El archivo supera el tamaño máximo permitido.'))
+        partner = album.photographer_id
+        subscription = album.event_id.plan_subscription_id or partner.active_plan_subscription_id
+        if reservation:
+            if not reservation._fotoapp_covers(album):
+                raise ValidationError(_('La reserva de cuota corresponde a otro plan que el de este álbum.'))
+            photos_left, bytes_left = self._fotoapp_reservation_left(reservation)
+            if photos_left < 1 or total_size > bytes_left:
+                raise ValidationError(_('El archivo no está cubierto por la reserva de cuota de esta subida.'))
+        elif subscription:
+            photos_left, bytes_left = subscription._fotoapp_available_quota()
+            if photos_left is not None and photos_left < 1:
+                raise ValidationError(_('Alcanzaste el límite de fotos de tu plan (%s).') % subscription.plan_id.photo_limit)
+            if bytes_left is not None and total_size > bytes_left:
+                limit_mb = subscription.plan_id.storage_limit_mb or int((subscription.plan_id.storage_limit_gb or 0.0) * 1024)
+                raise ValidationError(_('Alcanzaste el límite de almacenamiento de tu plan (%s MB).') % limit_mb)
+        extension = os.path.splitext(file_name or '')[1][:10]
+        return self.sudo().create({
+            'photographer_id': partner.id,
+            'album_id': album.id,
+            'file_name': file_name,
+            'precio': precio,
+            'total_size': total_size,
+            'dedupe_mode': dedupe_mode,
+            'reservation_id': reservation.id if reservation else False,
+            'tmp_path': self.env['ir.attachment']._fotoapp_tmp_path(suffix=f'{extension}.part'),
+        })
+
+    @api.model
+    def _fotoapp_reservation_left(self, reservation):
+        """Lo que ``reservation`` todavía cubre sin contar las subidas ya abiertas contra ella.
+
+        La reserva recién se consume al terminar cada subida: sin descontar las
+        abiertas, varias sesiones en paralelo superarían lo reservado.
+        """
+        # Serializa la apertura de sesiones sobre la misma reserva; el bloqueo dura sólo este pedido.
+        self.env.cr.execute('SELECT id FROM fotoapp_quota_reservation WHERE id = %s FOR UPDATE', (reservation.id,))
+        reservation.invalidate_recordset(['consumed_photos', 'consumed_bytes'])
+        photos_left, bytes_left = reservation._fotoapp_remaining()
+        self.flush_model(['reservation_id', 'state', 'total_size'])
+        self.env.cr.execute(
+            """
+            SELECT count(*), COALESCE(SUM(total_size), 0)
+            FROM fotoapp_upload_session
+            WHERE reservation_id = %s AND state = 'open'
+            """,
+            (reservation.id,)
+        )
+        open_count, open_bytes = self.env.cr.fetchone()
+        return photos_left - open_count, bytes_left - float(open_bytes)
+
+    @api.model
+    def _fotoapp_open_import(self, event, file_name, total_size, precio, dedupe_mode='skip'):
+        """Como ``_fotoapp_open`` para el ZIP de una importación masiva del evento.
+
+        El cupo del plan se controla foto por foto al importar.
+        """
+        if total_size <= 0:
+            raise ValidationError(_('El archivo está vacío.'))
+        icp = self.env['ir.config_parameter'].sudo()
+        max_mb = self.env['tienda.foto.asset']._safe_int_param(icp, 'fotoapp.import_max_mb', IMPORT_MAX_MB_DEFAULT)
+        if total_size > max(max_mb, 1) * 1024 * 1024:
+            raise ValidationError(_('El archivo supera el tamaño máximo permitido para importar.'))
+        return self.sudo().create({
+            'photographer_id': event.photographer_id.id,
+            'import_event_id': event.id,
+            'file_name': file_name,
+            'precio': precio,
+            'total_size': total_size,
+            'dedupe_mode': dedupe_mode,
+            'tmp_path': self.env['ir.attachment']._fotoapp_tmp_path(suffix='.zip.part'),
+        })
+
+    def _lock_for_upload(self):
+        # Dos pedidos sobre la misma sesión no pueden escribir a la vez en el temporal.
+        self.ensure_one()
+        self.env.cr.execute('SELECT id FROM fotoapp_upload_session WHERE id = %s FOR UPDATE', (self.id,))
+        self.invalidate_recordset(['received_bytes', 'state', 'asset_id', 'import_job_id'])
+
+    def _fotoapp_append(self, offset, stream):
+        """Escribe ``stream`` a partir de ``offset`` y devuelve el nuevo offset.
+
+        El offset debe coincidir con los bytes ya recibidos, así un cliente que
+        se cortó consulta el offset y reanuda desde ahí.
+        """
+        self._lock_for_upload()
+        if self.state != 'open':
+            raise UserError(_('La subida ya no está abierta.'))
+        if offset != self.received_bytes:
+            raise UserError(_('El offset no coincide con los bytes recibidos.'))
+        received = offset
+        with open(self.tmp_path, 'r+b') as handle:
+            handle.seek(offset)
+            handle.truncate()
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                received += len(chunk)
+                if received > self.total_size:
+                    raise ValidationError(_('Se recibieron más bytes que los declarados.'))
+                handle.write(chunk)
+        self.received_bytes = received
+        if received == self.total_size:
+            self._fotoapp_finalize()
+        return received
+
+    def _read_uploaded_metadata(self):
+        # Sólo se lee la cabecera: el decodificado completo lo hace la marca de agua.
+        width, height, taken_at = ingest.read_image_metadata(self.tmp_path)
+        self.env['tienda.foto.asset']._check_image_dimensions(width, height)
+        return {'image_width': width, 'image_height': height, 'taken_at': taken_at or False}
+
+    def _fotoapp_finalize(self):
+        """Mueve el temporal al filestore y crea la foto que lo referencia."""
+        self.ensure_one()
+        if self.import_event_id:
+            return self._fotoapp_finalize_import()
+        metadata = self._read_uploaded_metadata()
+        sha256 = hashlib.sha256()
+        mimetype = mimetypes.guess_type(self.file_name or '')[0] or 'image/jpeg'
+        attachment = self.env['ir.attachment']._fotoapp_create_from_path(self.tmp_path, {
+            'name': 'imagen_original',
+            'res_model': 'tienda.foto.asset',
+            'res_field': 'imagen_original',
+            'mimetype': mimetype,
+        }, digests=(sha256,))
+        Asset = self.env['tienda.foto.asset'].sudo()
+        asset_vals = {
+            'evento_id': self.album_id.event_id.id,
+            'precio': self.precio,
+            'name': self.file_name,
+            'album_ids': [(4, self.album_id.id)],
+            'file_size_bytes': attachment.file_size,
+            'checksum': sha256.hexdigest(),
+            **metadata,
+        }
+        asset = Asset._fotoapp_find_duplicate(self.photographer_id.id, asset_vals['checksum'])
+        if asset:
+            # El archivo del filestore queda sin referencias y lo limpia el GC de adjuntos.
+            attachment.unlink()
+            status = asset._fotoapp_apply_dedupe(self.dedupe_mode, self.album_id, asset_vals)
+        else:
+            asset = Asset.create(dict(asset_vals, fotoapp_original_attachment_id=attachment.id))
+            status = 'created'
+        if self.reservation_id:
+            # También un duplicado libera su parte: ya no va a ocupar el cupo.
+            self.reservation_id._fotoapp_consume(1, self.total_size)
+        self.write({'state': 'done', 'asset_id': asset.id, 'upload_status': status, 'tmp_path': False})
+        return asset
+
+    def _fotoapp_finalize_import(self):
+        # El ZIP queda en el temporal y lo procesa el cron de importaciones.
+        job = self.env['fotoapp.import.job']._fotoapp_create_zip_job(
+            self.import_event_id, self.tmp_path, self.file_name, self.precio, self.dedupe_mode,
+        )
+        self.write({'state': 'done', 'import_job_id': job.id, 'tmp_path': False})
+        return job
+
+    def _remove_tmp_file(self):
+        tmp_dir = self.env['ir.attachment']._fotoapp_tmp_dir()
+        for session in self:
+            if not session.tmp_path:
+                continue
+            # Sólo se borran temporales propios, nunca una ruta arbitraria.
+            if not bulk_import.is_within(session.tmp_path, tmp_dir):
+                _logger.warning('Temporal fuera de %s, no se borra: %s', tmp_dir, session.tmp_path)
+                continue
+            if os.path.isfile(session.tmp_path):
+                try:
+                    os.unlink(session.tmp_path)
+                except OSError as exc:
+                    _logger.warning('No se pudo borrar el temporal %s: %s', session.tmp_path, exc)
+
+    def action_cancel(self):
+        self._remove_tmp_file()
+        self.write({'state': 'cancelled', 'tmp_path': False})
+
+    def unlink(self):
+        self._remove_tmp_file()
+        return super().unlink()
+
+    @api.model
+    def cron_cleanup_upload_sessions(self):
+        expired = self.sudo().search([
+            '|',
+            ('state', '!=', 'open'),
+            ('expires_at', '<', fields.Datetime.now()),
+        ])
+        if expired:
+            _logger.info('Eliminando %s sesiones de subida vencidas o cerradas', len(expired))
+            expired.unlink()
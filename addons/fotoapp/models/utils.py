@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import re
+import threading
 import unicodedata
 
 
@@ -25,3 +26,12 @@ def slugify_text(value: str | None, fallback: str = 'item') -> str:
     ascii_text = normalized.encode('ascii', 'ignore').decode('ascii')
     slug = _slug_regex.sub('-', ascii_text.lower()).strip('-')
     return slug or fallback.lower()
+
+
+def cron_can_commit() -> bool:
+    """Return whether a batch job may commit between chunks.
+
+    Commits are forbidden while running the test suite, where every test runs
+    inside a single transaction.
+    """
+    return not getattr(threading.current_thread(), 'testing', False)
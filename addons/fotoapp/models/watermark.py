@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Render de marcas de agua.
+
+No usa el ORM, así puede correr en procesos aparte. El origen son los bytes de
+la foto o su ruta en el filestore.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Iterable, Iterator
+
+from PIL import Image, ImageDraw, ImageFont
+
+from . import phash
+
+_logger = logging.getLogger(__name__)
+
+JPEG_QUALITY = 85
+PREVIEW_SIZE = 1280
+THUMB_SIZE = 320
+OVERLAY_CACHE_SIZE = 32
+OVERLAY_WIDTH_BUCKET = 64
+
+_overlay_cache = OrderedDict()
+_overlay_cache_lock = threading.Lock()
+
+
+def _open_image(source):
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(BytesIO(source))
+    return Image.open(source)
+
+
+def invalidate_overlay_cache(partner_ids=None):
+    """Descarta las marcas guardadas de ``partner_ids`` (todas si está vacío)."""
+    with _overlay_cache_lock:
+        if not partner_ids:
+            _overlay_cache.clear()
+            return
+        partner_ids = set(partner_ids)
+        for key in [key for key in _overlay_cache if key[0] in partner_ids]:
+            del _overlay_cache[key]
+
+
+def _build_overlay(source, opacity, target_width):
+    partner_img = _open_image(source).convert('RGBA')
+    ratio = target_width / float(partner_img.width)
+    target_height = max(int(partner_img.height * ratio), 1)
+    partner_img = partner_img.resize((target_width, target_height), Image.LANCZOS)
+    table = [int(value * opacity) for value in range(256)]
+    partner_img.putalpha(partner_img.getchannel('A').point(table))
+    return partner_img
+
+
+def _overlay_key(overlay, base_width):
+    """Devuelve ``(clave, opacidad, ancho)`` de la marca sobre una imagen de ``base_width``."""
+    scale = min(max(overlay.get('scale') or 0.3, 0.05), 1.0)
+    opacity = min(max(overlay.get('opacity') or 60, 0), 100) / 100.0
+    bucket_width = max(round(base_width / OVERLAY_WIDTH_BUCKET), 1) * OVERLAY_WIDTH_BUCKET
+    target_width = max(min(int(bucket_width * scale), base_width), 1)
+    key = (overlay.get('partner_id'), overlay.get('checksum'), opacity, scale, bucket_width)
+    return key, opacity, target_width
+
+
+def prepare_overlay(overlay, base_width):
+    """Marca RGBA redimensionada para una imagen de ``base_width`` píxeles.
+
+    Se guarda en un LRU por proceso según fotógrafo, checksum, opacidad,
+    escala y ancho aproximado: un lote del mismo fotógrafo la prepara una vez.
+    """
+    key, opacity, target_width = _overlay_key(overlay, base_width)
+    cacheable = bool(key[0] and key[1])
+    if cacheable:
+        with _overlay_cache_lock:
+            cached = _overlay_cache.get(key)
+            if cached is not None:
+                _overlay_cache.move_to_end(key)
+                return cached
+    prepared = _build_overlay(overlay['image'], opacity, target_width)
+    if cacheable:
+        with _overlay_cache_lock:
+            _overlay_cache[key] = prepared
+            while len(_overlay_cache) > OVERLAY_CACHE_SIZE:
+                _overlay_cache.popitem(last=False)
+    return prepared
+
+
+def warm_overlays(tasks: Iterable[tuple]) -> int:
+    """Prepara en este proceso las marcas que van a usar ``tasks``.
+
+    De cada foto sólo se lee la cabecera para saber el ancho. Los procesos
+    creados después heredan la caché. Devuelve cuántas marcas se prepararon.
+    """
+    keys = set()
+    for dummy, source, overlay, dummy in tasks:
+        if not overlay or not overlay.get('image') or not overlay.get('partner_id') or not overlay.get('checksum'):
+            continue
+        try:
+            with _open_image(source) as image:
+                width = image.width
+            key = _overlay_key(overlay, width)[0]
+            if key not in keys:
+                prepare_overlay(overlay, width)
+                keys.add(key)
+        except Exception as exc:  # pylint: disable=broad-except
+            # El error se informa al renderizar la foto en el worker.
+            _logger.debug('No se pudo preparar la marca de agua: %s', exc)
+        if len(keys) >= OVERLAY_CACHE_SIZE:
+            break
+    return len(keys)
+
+
+def _apply_overlay(base_image, watermark_layer, overlay):
+    try:
+        partner_img = prepare_overlay(overlay, base_image.width)
+    except Exception as exc:
+        _logger.warning('Marca de agua inválida: %s', exc)
+        return False
+
+    position = (
+        max(int((base_image.width - partner_img.width) / 2), 0),
+        max(int((base_image.height - partner_img.height) / 2), 0)
+    )
+    watermark_layer.alpha_composite(partner_img, dest=position)
+    return True
+
+
+def _watermarked_image(image, overlay):
+    image = image.convert('RGBA')
+    watermark = Image.new('RGBA', image.size)
+    overlay_added = bool(overlay and overlay.get('image')) and _apply_overlay(image, watermark, overlay)
+    if not overlay_added:
+        draw = ImageDraw.Draw(watermark)
+        try:
+            font = ImageFont.truetype('arial.ttf', 48)
+        except OSError:
+            font = ImageFont.load_default()
+        draw.text((30, 30), 'FotoApp', fill=(255, 255, 255, 128), font=font)
+
+    return Image.alpha_composite(image, watermark).convert('RGB')
+
+
+def _encode(image, image_format='JPEG', quality=JPEG_QUALITY):
+    buf = BytesIO()
+    image.save(buf, format=image_format, quality=quality)
+    return buf.getvalue()
+
+
+def _resized(image, size):
+    resized = image.copy()
+    resized.thumbnail((size, size), Image.LANCZOS)
+    return resized
+
+
+def render_watermark(source, overlay=None, quality=JPEG_QUALITY) -> bytes:
+    """JPEG de ``source`` con la marca de agua.
+
+    ``overlay`` es ``{'image', 'opacity', 'scale'}`` con la marca del
+    fotógrafo; sin ella se usa una marca de texto.
+    """
+    return _encode(_watermarked_image(_open_image(source), overlay), quality=quality)
+
+
+def render_derivatives(source, overlay=None, webp=False) -> dict:
+    """Decodifica ``source`` una vez y devuelve todos los tamaños públicos.
+
+    Claves: ``watermark`` (tamaño completo), ``preview`` (~1280px), ``thumb``
+    (~320px) y, con ``webp``, ``preview_webp``; todos con marca de agua.
+    ``dhash`` se calcula sobre el original, antes de la marca, para que la
+    marca no haga parecidas a todas las fotos.
+    """
+    original = _open_image(source)
+    perceptual_hash = phash.dhash(original)
+    combined = _watermarked_image(original, overlay)
+    preview = _resized(combined, PREVIEW_SIZE)
+    thumb = _resized(preview, THUMB_SIZE)
+    result = {
+        'watermark': _encode(combined),
+        'preview': _encode(preview),
+        'thumb': _encode(thumb, quality=80),
+        'dhash': perceptual_hash,
+    }
+    if webp:
+        result['preview_webp'] = _encode(preview, image_format='WEBP', quality=80)
+    return result
+
+
+def _render_task(task):
+    key, source, overlay, webp = task
+    try:
+        return key, render_derivatives(source, overlay, webp=webp), None
+    except Exception as exc:  # pylint: disable=broad-except
+        return key, None, str(exc)
+
+
+def render_many(tasks: Iterable[tuple], workers: int = 1) -> Iterator[tuple]:
+    """Renderiza las tareas ``(clave, origen, marca, webp)``.
+
+    Devuelve ``(clave, derivados, error)`` con el dict de
+    :func:`render_derivatives`. Con más de un worker corre en procesos aparte,
+    que sólo reciben rutas y marcas y nunca usan la base. Las marcas se
+    preparan antes del fork para que cada proceso las herede.
+    """
+    tasks = list(tasks)
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _render_task(task)
+        return
+    warm_overlays(tasks)
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as pool:
+        yield from pool.map(_render_task, tasks)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""ZIP armado por partes para entregar las fotos compradas.
+
+La memoria de una descarga no depende de la cantidad ni del tamaño de las fotos.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import os
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator
+
+_logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipSink(io.RawIOBase):
+    """Archivo sin seek que guarda lo escrito hasta que se lo vacía."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if not data:
+            return 0
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def _open_source(source):
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return open(source, 'rb')
+
+
+def unique_arcname(name: str, used: set) -> str:
+    """Devuelve ``name`` o una variante con sufijo que no esté en ``used``."""
+    candidate = name
+    base, ext = os.path.splitext(name)
+    counter = 1
+    while candidate in used:
+        candidate = f"{base}_{counter}{ext}"
+        counter += 1
+    used.add(candidate)
+    return candidate
+
+
+def iter_zip_stream(entries: Iterable[tuple], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Genera por bloques un ZIP con las entradas ``(nombre, origen)``.
+
+    ``origen`` es una ruta o los bytes de la foto. Se guardan sin comprimir:
+    las fotos ya vienen comprimidas.
+    """
+    sink = _ZipSink()
+    date_time = datetime.now().timetuple()[:6]
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, source in entries:
+            try:
+                handle = _open_source(source)
+            except OSError as exc:
+                _logger.warning('No se pudo leer %s para el ZIP: %s', arcname, exc)
+                continue
+            info = zipfile.ZipInfo(arcname, date_time=date_time)
+            info.compress_type = zipfile.ZIP_STORED
+            with handle, archive.open(info, mode='w', force_zip64=True) as dest:
+                while True:
+                    chunk = handle.read(chunk_size)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
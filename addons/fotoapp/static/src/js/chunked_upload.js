@@ -0,0 +1,171 @@
+/** @odoo-module **/
+(() => {
+  const formSelector = 'form[data-fotoapp-upload-url]';
+  const importSelector = 'form[data-fotoapp-import-url]';
+  const chunkSize = 5 * 1024 * 1024;
+  const maxRetries = 3;
+
+  const readJSON = async (response) => {
+    try {
+      return await response.json();
+    } catch (err) {
+      return {};
+    }
+  };
+
+  // Consulta previa: qué archivos entran en el plan, con su cupo reservado.
+  const preflight = async (files, form, csrfToken) => {
+    const response = await fetch(`${form.dataset.fotoappUploadUrl}/preflight`, {
+      method: 'POST',
+      credentials: 'same-origin',
+      headers: { 'X-CSRF-Token': csrfToken, 'Content-Type': 'application/json' },
+      body: JSON.stringify({ sizes: files.map((file) => file.size) }),
+    });
+    const payload = await readJSON(response);
+    if (!response.ok) {
+      throw new Error(payload.error || response.statusText);
+    }
+    return payload;
+  };
+
+  const uploadFile = async (file, form, openUrl, csrfToken, reservation, onProgress) => {
+    const body = new FormData();
+    body.append('file_name', file.name);
+    if (reservation) { body.append('reservation', reservation); }
+    body.append('price', form.querySelector('[name="price"]').value);
+    const dedupe = form.querySelector('[name="dedupe_mode"]');
+    if (dedupe) { body.append('dedupe_mode', dedupe.value); }
+    const opened = await fetch(openUrl, {
+      method: 'POST',
+      credentials: 'same-origin',
+      headers: { 'X-CSRF-Token': csrfToken, 'Upload-Length': String(file.size) },
+      body,
+    });
+    const session = await readJSON(opened);
+    if (!opened.ok) {
+      throw new Error(session.error || opened.statusText);
+    }
+    let offset = session.offset || 0;
+    let retries = 0;
+    while (offset < file.size) {
+      try {
+        const response = await fetch(session.location, {
+          method: 'PATCH',
+          credentials: 'same-origin',
+          headers: {
+            'X-CSRF-Token': csrfToken,
+            'Upload-Offset': String(offset),
+            'Content-Type': 'application/offset+octet-stream',
+          },
+          body: file.slice(offset, offset + chunkSize),
+        });
+        const payload = await readJSON(response);
+        if (response.status === 422) {
+          throw Object.assign(new Error(payload.error || response.statusText), { fatal: true });
+        }
+        if (!response.ok && response.status !== 409) {
+          throw new Error(payload.error || response.statusText);
+        }
+        // En 409 el servidor informa el offset real y se reanuda desde ahí.
+        offset = payload.offset;
+        retries = 0;
+        onProgress(offset);
+      } catch (err) {
+        retries += 1;
+        if (err.fatal || retries > maxRetries) {
+          throw err;
+        }
+        const status = await fetch(session.location, { method: 'GET', credentials: 'same-origin' });
+        offset = (await readJSON(status)).offset || 0;
+      }
+    }
+    return fetch(session.location, { method: 'GET', credentials: 'same-origin' }).then(readJSON);
+  };
+
+  document.addEventListener('submit', async (ev) => {
+    const form = ev.target.closest(formSelector);
+    if (!form || !window.fetch || !window.FormData) { return; }
+    const input = form.querySelector('input[type="file"]');
+    const files = input ? Array.from(input.files || []) : [];
+    if (!files.length) { return; }
+    ev.preventDefault();
+    const csrfToken = form.querySelector('[name="csrf_token"]').value;
+    const status = form.querySelector('.fotoapp-upload-status');
+    const button = form.querySelector('button[type="submit"]');
+    const errors = [];
+    if (button) { button.disabled = true; }
+    let quota;
+    try {
+      quota = await preflight(files, form, csrfToken);
+    } catch (err) {
+      if (status) { status.textContent = err.message; }
+      if (button) { button.disabled = false; }
+      return;
+    }
+    for (const index of quota.rejected || []) {
+      errors.push(`${files[index].name}: supera el tamaño máximo o el límite de tu plan`);
+    }
+    const accepted = (quota.accepted || []).map((index) => files[index]);
+    const totalBytes = accepted.reduce((sum, file) => sum + file.size, 0) || 1;
+    let doneBytes = 0;
+    for (const file of accepted) {
+      try {
+        await uploadFile(file, form, form.dataset.fotoappUploadUrl, csrfToken, quota.reservation, (offset) => {
+          if (status) {
+            status.textContent = `${Math.round(((doneBytes + offset) / totalBytes) * 100)}%`;
+          }
+        });
+      } catch (err) {
+        errors.push(`${file.name}: ${err.message}`);
+      }
+      doneBytes += file.size;
+    }
+    if (errors.length && status) {
+      status.textContent = errors.join(' · ');
+      if (button) { button.disabled = false; }
+      return;
+    }
+    window.location.reload();
+  });
+
+  // Importación masiva: un único ZIP que el servidor procesa en segundo plano.
+  const pollImport = async (jobId, status) => {
+    const response = await fetch(`/mi/fotoapp/importaciones/${jobId}`, { credentials: 'same-origin' });
+    const job = await readJSON(response);
+    if (!response.ok) { return; }
+    if (status) {
+      status.textContent = `Importando: ${job.processed}/${job.total} fotos (${job.created} nuevas)`;
+    }
+    if (job.state === 'done' || job.state === 'failed') {
+      window.location.reload();
+      return;
+    }
+    window.setTimeout(() => pollImport(jobId, status), 5000);
+  };
+
+  document.addEventListener('submit', async (ev) => {
+    const form = ev.target.closest(importSelector);
+    if (!form || !window.fetch || !window.FormData) { return; }
+    const input = form.querySelector('input[type="file"]');
+    const file = input && input.files && input.files[0];
+    if (!file) { return; }
+    ev.preventDefault();
+    const csrfToken = form.querySelector('[name="csrf_token"]').value;
+    const status = form.querySelector('.fotoapp-upload-status');
+    const button = form.querySelector('button[type="submit"]');
+    if (button) { button.disabled = true; }
+    try {
+      const session = await uploadFile(file, form, form.dataset.fotoappImportUrl, csrfToken, null, (offset) => {
+        if (status) {
+          status.textContent = `Subiendo ZIP: ${Math.round((offset / (file.size || 1)) * 100)}%`;
+        }
+      });
+      if (session.import_job_id) {
+        pollImport(session.import_job_id, status);
+      }
+    } catch (err) {
+      if (status) { status.textContent = err.message; }
+      if (button) { button.disabled = false; }
+    }
+  });
+})();
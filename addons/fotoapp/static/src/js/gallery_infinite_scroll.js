@@ -0,0 +1,48 @@
+/** @odoo-module **/
+(() => {
+  let loading = false;
+
+  const loadNext = async (more, grid, observer) => {
+    const url = more.getAttribute('data-next-url');
+    if (loading || !url) { return; }
+    loading = true;
+    try {
+      const resp = await fetch(url, { credentials: 'same-origin', headers: { Accept: 'application/json' } });
+      if (!resp.ok) { throw new Error(resp.statusText); }
+      const payload = await resp.json();
+      grid.insertAdjacentHTML('beforeend', payload.html || '');
+      if (payload.next_url) {
+        more.setAttribute('data-next-url', payload.next_url);
+        // Si el centinela sigue visible se vuelve a observar para pedir otra página.
+        observer.unobserve(more);
+        observer.observe(more);
+      } else {
+        observer.disconnect();
+        more.remove();
+      }
+    } catch (err) {
+      // Si falla la carga incremental queda el enlace "Ver más fotos" como respaldo.
+      observer.disconnect();
+    } finally {
+      loading = false;
+    }
+  };
+
+  const init = () => {
+    const more = document.querySelector('.fotoapp-gallery-more[data-next-url]');
+    const grid = document.querySelector('.fotoapp-gallery-grid');
+    if (!more || !grid || !window.IntersectionObserver || !window.fetch) { return; }
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        loadNext(more, grid, observer);
+      }
+    }, { rootMargin: '800px 0px' });
+    observer.observe(more);
+  };
+
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', init);
+  } else {
+    init();
+  }
+})();
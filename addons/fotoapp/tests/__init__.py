@@ -1 +1,8 @@
 from . import test_photo_lifecycle
+from . import test_watermark_queue
+from . import test_upload_session
+from . import test_benchmarks
+from . import test_bib_tags
+from . import test_gallery_cache
+from . import test_subscription_usage
+from . import test_category_metrics
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import base64
+import io
+import secrets
+
+from PIL import Image
+
+from odoo import fields
+from odoo.tests import TransactionCase
+
+SAMPLE_IMAGE = base64.b64encode(
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\x0bIDATx\x9cc```\x00\x00\x00\x05\x00\x01\r\n-\xb4\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+
+
+def sample_png():
+    """PNG de 8x8 con contenido aleatorio: cada llamada tiene otro checksum."""
+    buf = io.BytesIO()
+    Image.frombytes('RGB', (8, 8), secrets.token_bytes(192)).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class FotoappCommon(TransactionCase):
+    """Fotógrafo, categoría publicada y evento compartidos por los tests del módulo."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.photographer = cls.env['res.partner'].create({
+            'name': 'Test Photographer',
+            'is_photographer': True,
+        })
+        cls._setup_photographer()
+        cls.category = cls.env['tienda.foto.categoria'].create({
+            'name': 'Test Category',
+            'estado': 'publicado',
+            'website_published': True,
+        })
+        cls.event = cls.env['tienda.foto.evento'].create({
+            'name': 'Test Event',
+            'fecha': fields.Datetime.now(),
+            'categoria_id': cls.category.id,
+            'photographer_id': cls.photographer.id,
+        })
+
+    @classmethod
+    def _setup_photographer(cls):
+        """Se llama antes de crear el evento, por ejemplo para darle un plan al fotógrafo."""
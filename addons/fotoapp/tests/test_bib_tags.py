@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from ..models import bib_ocr
+from .common import SAMPLE_IMAGE, FotoappCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBibTags(FotoappCommon):
+    def setUp(self):
+        super().setUp()
+        self.album = self.env['tienda.foto.album'].create({
+            'name': 'Bib Album',
+            'event_id': self.event.id,
+            'state': 'published',
+            'is_private': False,
+        })
+        self.asset = self.env['tienda.foto.asset'].create({
+            'evento_id': self.event.id,
+            'precio': 10.0,
+            'imagen_original': SAMPLE_IMAGE,
+            'name': 'largada.jpg',
+            'album_ids': [(4, self.album.id)],
+        })
+
+    def test_import_csv_and_search_by_bib(self):
+        BibTag = self.env['tienda.foto.bib.tag']
+        rows = BibTag._fotoapp_parse_import(b"foto,dorsal\nlargada.jpg, #0123\nsin-foto.jpg,55\n")
+        created, missing = BibTag._fotoapp_import_rows(self.event, rows)
+        self.assertEqual((created, missing), (1, 1))
+
+        self.assertEqual(BibTag._fotoapp_search_assets(self.event, '0123'), self.asset)
+        self.assertEqual(BibTag._fotoapp_search_assets(self.event, '012'), self.asset)
+        self.assertFalse(BibTag._fotoapp_search_assets(self.event, '999'))
+
+        rows = BibTag._fotoapp_parse_import('[{"foto": "%s", "dorsales": ["0123", "77"]}]' % self.asset.numero_dorsal)
+        self.assertEqual(BibTag._fotoapp_import_rows(self.event, rows), (1, 0))
+        rows = BibTag._fotoapp_parse_import('[{"foto": "largada.jpg", "dorsales": "123"}]')
+        self.assertEqual(rows, [('largada.jpg', '123')])
+
+    def test_search_skips_photos_of_hidden_albums(self):
+        BibTag = self.env['tienda.foto.bib.tag']
+        draft = self.env['tienda.foto.album'].create({'name': 'Borrador', 'event_id': self.event.id})
+        hidden = self.env['tienda.foto.asset'].create({
+            'evento_id': self.event.id,
+            'precio': 10.0,
+            'imagen_original': SAMPLE_IMAGE,
+            'album_ids': [(4, draft.id)],
+        })
+        BibTag.create([
+            {'asset_id': hidden.id, 'bib': '5555'},
+            {'asset_id': self.asset.id, 'bib': '55551'},
+        ])
+        # El dorsal exacto sólo está en un álbum borrador: se busca como subcadena.
+        self.assertEqual(BibTag._fotoapp_search_assets(self.event, '5555', limit=1), self.asset)
+
+    def test_ocr_cron_tags_pending_photos(self):
+        icp = self.env['ir.config_parameter'].sudo()
+        icp.set_param('fotoapp.ocr_enabled', 'True')
+        icp.set_param('fotoapp.ocr_workers', '1')
+        self.env['tienda.foto.bib.tag'].create({'asset_id': self.asset.id, 'bib': '42', 'source': 'manual'})
+        self.asset.write({'imagen_original': SAMPLE_IMAGE})
+        self.assertEqual(self.asset.ocr_state, 'pending')
+
+        with patch.object(bib_ocr, 'tesseract_available', return_value=True), \
+                patch.object(bib_ocr, 'read_bibs', return_value=[('42', 91.0), ('1234', 88.5)]):
+            self.env['tienda.foto.asset'].cron_process_pending_bib_ocr()
+
+        self.assertEqual(self.asset.ocr_state, 'done')
+        tags = {tag.bib: tag.source for tag in self.asset.bib_tag_ids}
+        self.assertEqual(tags, {'42': 'manual', '1234': 'ocr'})
+
+    def test_ocr_fair_order_interleaves_photographers(self):
+        tasks = [(1, 'a1', None), (1, 'a2', None), (1, 'a3', None), (2, 'b1', None)]
+        self.assertEqual([task[1] for task in bib_ocr.fair_order(tasks)], ['a1', 'b1', 'a2', 'a3'])
+        tsv = 'level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n' \
+            '5\t1\t1\t1\t1\t1\t0\t0\t10\t10\t93.1\t0123\n' \
+            '5\t1\t1\t1\t1\t2\t0\t0\t10\t10\t30.0\t77\n' \
+            '5\t1\t1\t1\t1\t3\t0\t0\t10\t10\t95.0\tABC\n'
+        self.assertEqual(bib_ocr._parse_tsv(tsv, 60), [('0123', 93.1)])
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import FotoappCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCategoryMetrics(FotoappCommon):
+    def test_category_event_counters_follow_event_changes(self):
+        category = self.env['tienda.foto.categoria'].create({'name': 'Counter Category'})
+        other = self.env['tienda.foto.categoria'].create({'name': 'Counter Other'})
+        event = self.env['tienda.foto.evento'].create({
+            'name': 'Counter Event',
+            'fecha': fields.Datetime.now(),
+            'categoria_id': category.id,
+            'photographer_id': self.photographer.id,
+        })
+        self.assertEqual((category.event_count, category.website_event_count), (1, 0))
+
+        event.action_publicar()
+        self.assertEqual((category.event_count, category.website_event_count), (1, 1))
+
+        event.write({'categoria_id': other.id})
+        self.assertEqual((category.event_count, category.website_event_count), (0, 0))
+        self.assertEqual((other.event_count, other.website_event_count), (1, 1))
+
+        self.env.cr.execute("UPDATE tienda_foto_categoria SET event_count = 7 WHERE id = %s", (other.id,))
+        other.invalidate_recordset(['event_count'])
+        mismatches = self.env['tienda.foto.categoria']._fotoapp_check_event_metrics(fix=True)
+        self.assertEqual([(item[0], item[2]) for item in mismatches], [(other, (1, 1))])
+        self.assertEqual(other.event_count, 1)
+
+        event.unlink()
+        self.assertEqual((other.event_count, other.website_event_count), (0, 0))
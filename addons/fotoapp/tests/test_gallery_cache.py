@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from odoo import fields
+from odoo.tests import tagged
+
+from ..models import gallery_cache
+from .common import FotoappCommon
+
+
+@tagged('post_install', '-at_install')
+class TestGalleryCache(FotoappCommon):
+    def test_version_bumps_on_public_changes(self):
+        cr = self.env.cr
+        category, event = self.category, self.event
+        album = self.env['tienda.foto.album'].create({'name': 'Cache Album', 'event_id': event.id})
+
+        version, dummy = gallery_cache.read_gallery_version(cr)
+        # Un evento sin publicar no aparece en la galería.
+        event.write({'name': 'Cache Event 1'})
+        self.assertEqual(gallery_cache.read_gallery_version(cr)[0], version)
+
+        event.action_publicar()
+        event.write({'name': 'Cache Event 2'})
+        after_event, modified_at = gallery_cache.read_gallery_version(cr)
+        self.assertEqual(int(after_event), int(version) + 2)
+        self.assertTrue(modified_at)
+
+        category.write({'name': 'Cache Category 2'})
+        album.action_publish()
+        self.assertEqual(int(gallery_cache.read_gallery_version(cr)[0]), int(version) + 4)
+
+        album.write({'notes': 'No cambia la galería'})
+        event.write({'last_customer_activity': fields.Datetime.now(), 'lifecycle_state': 'completed'})
+        draft = self.env['tienda.foto.categoria'].create({'name': 'Cache Draft'})
+        draft.write({'name': 'Cache Draft 2'})
+        self.assertEqual(int(gallery_cache.read_gallery_version(cr)[0]), int(version) + 4)
+
+    def test_page_cache_evicts_least_recently_used(self):
+        cache = gallery_cache.PageCache(size=2)
+        cache.set('a', b'A', 'ea')
+        cache.set('b', b'B', 'eb')
+        self.assertEqual(cache.get('a'), (b'A', 'ea'))
+        cache.set('c', b'C', 'ec')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), (b'C', 'ec'))
@@ -1,38 +1,22 @@
 # -*- coding: utf-8 -*-
 import base64
+import os
 
 from dateutil.relativedelta import relativedelta
 
 from odoo import fields
-from odoo.tests import TransactionCase, tagged
+from odoo.tests import tagged
 
-SAMPLE_IMAGE = base64.b64encode(
-    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\x0bIDATx\x9cc```\x00\x00\x00\x05\x00\x01\r\n-\xb4\x00\x00\x00\x00IEND\xaeB`\x82"
-)
+from .common import SAMPLE_IMAGE, FotoappCommon, sample_png
 
 
 @tagged('post_install', '-at_install')
-class TestPhotoLifecycle(TransactionCase):
+class TestPhotoLifecycle(FotoappCommon):
     def setUp(self):
         super().setUp()
         icp = self.env['ir.config_parameter'].sudo()
         icp.set_param('fotoapp.asset_archive_days', 30)
         icp.set_param('fotoapp.asset_delete_days', 15)
-        self.photographer = self.env['res.partner'].create({
-            'name': 'Test Photographer',
-            'is_photographer': True,
-        })
-        self.category = self.env['tienda.foto.categoria'].create({
-            'name': 'Test Category',
-            'estado': 'publicado',
-            'website_published': True,
-        })
-        self.event = self.env['tienda.foto.evento'].create({
-            'name': 'Test Event',
-            'fecha': fields.Datetime.now(),
-            'categoria_id': self.category.id,
-            'photographer_id': self.photographer.id,
-        })
 
     def _create_photo(self):
         return self.env['tienda.foto.asset'].create({
@@ -62,3 +46,53 @@ class TestPhotoLifecycle(TransactionCase):
         self.env['tienda.foto.asset'].cron_manage_photo_lifecycle()
 
         self.assertFalse(asset.exists())
+
+    def test_lifecycle_runs_in_batches(self):
+        recent = self._create_photo()
+        stale = self._create_photo() | self._create_photo()
+        stale.write({'publicada_por_ultima_vez': fields.Datetime.now() - relativedelta(days=31)})
+        expired = self._create_photo()
+        expired.action_archive()
+        expired.write({'archived_at': fields.Datetime.now() - relativedelta(days=16)})
+
+        stats = self.env['tienda.foto.asset'].cron_manage_photo_lifecycle(batch_size=1)
+
+        self.assertEqual((stats['scanned'], stats['archived'], stats['deleted']), (3, 2, 1))
+        self.assertEqual(set(stale.mapped('lifecycle_state')), {'archived'})
+        self.assertEqual(recent.lifecycle_state, 'published')
+        self.assertFalse(expired.exists())
+
+    def test_due_dates_follow_config_changes(self):
+        asset = self._create_photo()
+        published_at = fields.Datetime.now() - relativedelta(days=10)
+        asset.write({'publicada_por_ultima_vez': published_at})
+        self.assertEqual(asset.archive_due_at, published_at + relativedelta(days=30))
+        self.assertFalse(asset.delete_due_at)
+
+        self.env['ir.config_parameter'].sudo().set_param('fotoapp.asset_archive_days', 5)
+        self.env['tienda.foto.asset']._recompute_lifecycle_due_dates()
+        self.assertEqual(asset.archive_due_at, published_at + relativedelta(days=5))
+        self.assertEqual(asset.days_until_archive, 0)
+
+        asset.action_archive()
+        self.assertFalse(asset.archive_due_at)
+        self.assertEqual(asset.delete_due_at, asset.archived_at + relativedelta(days=15))
+
+    def test_reclaim_filestore_after_delete(self):
+        # Contenido único: el filestore deduplica y otra prueba podría compartir el archivo.
+        raw = sample_png()
+        asset = self.env['tienda.foto.asset'].create({
+            'evento_id': self.event.id,
+            'precio': 10.0,
+            'imagen_original': base64.b64encode(raw),
+        })
+        original = self.env['ir.attachment']._fotoapp_field_attachments(asset, 'imagen_original')[asset.id]
+        path = original._full_path(original.store_fname)
+        self.assertTrue(os.path.exists(path))
+
+        asset.unlink()
+        reclaimed = self.env['fotoapp.filestore.orphan'].cron_reclaim_filestore()
+
+        self.assertFalse(os.path.exists(path))
+        self.assertGreaterEqual(reclaimed.get(self.photographer.id, 0), len(raw))
+        self.assertFalse(self.env['fotoapp.filestore.orphan'].search_count([]))
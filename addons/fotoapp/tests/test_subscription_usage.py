@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import base64
+import io
+
+from odoo import fields
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+
+from .common import SAMPLE_IMAGE, FotoappCommon
+
+
+@tagged('post_install', '-at_install')
+class TestSubscriptionUsage(FotoappCommon):
+    @classmethod
+    def _setup_photographer(cls):
+        # El evento toma la suscripción activa del fotógrafo al crearse.
+        cls.subscription = cls.env['sale.subscription'].fotoapp_create_subscription(
+            cls.photographer, cls.env.ref('fotoapp.fotoapp_plan_basic')
+        )
+
+    def _usage(self):
+        return (
+            self.subscription.usage_photo_count,
+            self.subscription.usage_album_count,
+            self.subscription.usage_event_count,
+            self.subscription.usage_storage_bytes,
+        )
+
+    def test_usage_follows_uploads_and_deletes(self):
+        self.assertEqual(self.event.plan_subscription_id, self.subscription)
+        album = self.env['tienda.foto.album'].create({'name': 'Usage Album', 'event_id': self.event.id})
+        assets = self.env['tienda.foto.asset'].create([
+            {'evento_id': self.event.id, 'precio': 10.0, 'imagen_original': SAMPLE_IMAGE, 'name': name}
+            for name in ('uno.png', 'dos.png')
+        ])
+        size = sum(assets.mapped('file_size_bytes'))
+        self.assertTrue(size)
+        self.assertEqual(self._usage(), (2, 1, 1, float(size)))
+
+        assets[0].unlink()
+        self.assertEqual(self._usage(), (1, 1, 1, float(assets[1].file_size_bytes)))
+
+        album.unlink()
+        self.assertEqual(self._usage(), (0, 0, 1, 0.0))
+
+    def test_reconciliation_fixes_drift(self):
+        self.env['tienda.foto.asset'].create({
+            'evento_id': self.event.id,
+            'precio': 10.0,
+            'imagen_original': SAMPLE_IMAGE,
+        })
+        expected = self._usage()
+        self.env.cr.execute(
+            "UPDATE sale_subscription SET usage_photo_count = 40, usage_storage_bytes = 1 WHERE id = %s",
+            (self.subscription.id,)
+        )
+        self.subscription.invalidate_recordset()
+        self.assertGreaterEqual(self.env['sale.subscription'].cron_reconcile_usage_metrics(), 1)
+        self.assertEqual(self._usage(), expected)
+
+    def test_preflight_reserves_quota_before_uploading(self):
+        self.subscription.plan_id.write({'photo_limit': 3, 'storage_limit_mb': 1})
+        album = self.env['tienda.foto.album'].create({'name': 'Quota Album', 'event_id': self.event.id})
+        Reservation = self.env['fotoapp.quota.reservation']
+        kb = 1024
+        result = Reservation._fotoapp_preflight(album, [400 * kb, 700 * kb, 300 * kb, 100 * kb, 50])
+        self.assertEqual(result['accepted'], [0, 2, 3])
+        self.assertEqual(result['rejected'], [1, 4])
+        self.assertEqual(result['photos_left'], 0)
+        # Otra tanda ya no encuentra lugar mientras la reserva esté vigente.
+        self.assertEqual(Reservation._fotoapp_preflight(album, [100])['accepted'], [])
+
+        reservation = Reservation._fotoapp_get(result['reservation'], self.photographer)
+        raw = base64.b64decode(SAMPLE_IMAGE)
+        Session = self.env['fotoapp.upload.session']
+        session = Session._fotoapp_open(album, 'foto.png', len(raw), 10.0, reservation=reservation)
+        session._fotoapp_append(0, io.BytesIO(raw))
+        self.assertEqual(session.upload_status, 'created')
+        self.assertEqual(reservation.consumed_photos, 1)
+        self.assertEqual(self.subscription.usage_photo_count, 1)
+        self.assertEqual(self.subscription._fotoapp_available_quota()[0], 0)
+        # Las subidas abiertas cuentan contra la reserva aunque todavía no terminaron.
+        parallel = Session._fotoapp_open(album, 'b.png', len(raw), 10.0, reservation=reservation)
+        parallel |= Session._fotoapp_open(album, 'c.png', len(raw), 10.0, reservation=reservation)
+        with self.assertRaises(ValidationError):
+            Session._fotoapp_open(album, 'd.png', len(raw), 10.0, reservation=reservation)
+        parallel.action_cancel()
+        with self.assertRaises(ValidationError):
+            Session._fotoapp_open(album, 'grande.png', 900 * kb, 10.0, reservation=reservation)
+        # La reserva no sirve para un evento que cobra otro plan.
+        other_plan = self.env['sale.subscription'].fotoapp_create_subscription(
+            self.photographer, self.env.ref('fotoapp.fotoapp_plan_basic')
+        )
+        other_event = self.env['tienda.foto.evento'].create({
+            'name': 'Other Plan Event',
+            'fecha': fields.Datetime.now(),
+            'categoria_id': self.category.id,
+            'photographer_id': self.photographer.id,
+            'plan_subscription_id': other_plan.id,
+        })
+        other_album = self.env['tienda.foto.album'].create({'name': 'Other Plan Album', 'event_id': other_event.id})
+        self.assertFalse(reservation._fotoapp_covers(other_album))
+        with self.assertRaises(ValidationError):
+            Session._fotoapp_open(other_album, 'otro.png', len(raw), 10.0, reservation=reservation)
+
+        reservation.expires_at = fields.Datetime.subtract(fields.Datetime.now(), days=1)
+        Reservation.cron_cleanup_quota_reservations()
+        self.assertFalse(reservation.exists())
+        self.assertEqual(self.subscription._fotoapp_available_quota()[0], 2)
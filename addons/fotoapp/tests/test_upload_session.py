@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from unittest.mock import patch
+
+from PIL import Image
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from ..models import import_job
+from .common import SAMPLE_IMAGE, FotoappCommon, sample_png
+
+
+@tagged('post_install', '-at_install')
+class TestUploadSession(FotoappCommon):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.album = cls.env['tienda.foto.album'].create({
+            'name': 'Upload Album',
+            'event_id': cls.event.id,
+        })
+
+    def test_chunked_upload_creates_asset_from_filestore(self):
+        raw = base64.b64decode(SAMPLE_IMAGE)
+        Session = self.env['fotoapp.upload.session']
+        session = Session._fotoapp_open(self.album, 'foto.png', len(raw), 12.0)
+        offset = session._fotoapp_append(0, io.BytesIO(raw[:20]))
+        self.assertEqual(offset, 20)
+        self.assertEqual(session.state, 'open')
+
+        session._fotoapp_append(offset, io.BytesIO(raw[20:]))
+        asset = session.asset_id
+        self.assertEqual(session.state, 'done')
+        self.assertEqual(asset.checksum, hashlib.sha256(raw).hexdigest())
+        self.assertEqual(asset.file_size_bytes, len(raw))
+        self.assertIn(self.album, asset.album_ids)
+        self.assertEqual(base64.b64decode(asset.imagen_original), raw)
+
+    def test_replacing_original_stores_decoded_bytes(self):
+        asset = self.env['tienda.foto.asset'].create({
+            'evento_id': self.event.id,
+            'precio': 10.0,
+            'imagen_original': SAMPLE_IMAGE,
+        })
+        buf = io.BytesIO()
+        Image.new('RGB', (12, 10), (10, 20, 30)).save(buf, format='PNG')
+        raw = buf.getvalue()
+        asset.write({'imagen_original': base64.b64encode(raw)})
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', 'tienda.foto.asset'),
+            ('res_field', '=', 'imagen_original'),
+            ('res_id', '=', asset.id),
+        ])
+        self.assertEqual(len(attachments), 1)
+        self.assertEqual(attachments.raw, raw)
+        self.assertEqual((asset.checksum, asset.image_width), (hashlib.sha256(raw).hexdigest(), 12))
+        self.assertEqual(asset.watermark_state, 'pending')
+
+    def test_duplicate_upload_is_linked_instead_of_stored_again(self):
+        Asset = self.env['tienda.foto.asset']
+        vals = {'evento_id': self.event.id, 'precio': 10.0, 'imagen_original': SAMPLE_IMAGE}
+        original, status = Asset._fotoapp_upload(vals)
+        self.assertEqual(status, 'created')
+
+        other_album = self.env['tienda.foto.album'].create({'name': 'Otro', 'event_id': self.event.id})
+        duplicate, status = Asset._fotoapp_upload(vals, album=other_album, dedupe_mode='link')
+        self.assertEqual(status, 'linked')
+        self.assertEqual(duplicate, original)
+        self.assertIn(other_album, original.album_ids)
+        self.assertEqual(Asset.search_count([('evento_id', '=', self.event.id)]), 1)
+
+        Asset.create(dict(vals))
+        groups = self.event._fotoapp_duplicate_groups()
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0][0], original)
+
+    def test_batch_upload_reserves_dorsal_range(self):
+        first, second = base64.b64encode(sample_png()), base64.b64encode(sample_png())
+        vals_list = [
+            {'evento_id': self.event.id, 'precio': 5.0, 'imagen_original': image, 'name': name}
+            for image, name in ((first, 'a.png'), (second, 'b.png'), (first, 'a-copia.png'), (b'no-es-imagen', 'x.png'))
+        ]
+        Asset = self.env['tienda.foto.asset']
+        results = Asset._fotoapp_upload_batch(vals_list, album=self.album, dedupe_mode='link')
+
+        self.assertEqual([status for dummy, status in results], ['created', 'created', 'linked', 'invalid'])
+        assets = results[0][0] | results[1][0]
+        self.assertEqual(results[2][0], results[0][0])
+        self.assertEqual(len(set(assets.mapped('batch_id'))), 1)
+        dorsales = sorted(int(number) for number in assets.mapped('numero_dorsal'))
+        self.assertEqual(dorsales[1] - dorsales[0], 1)
+        counter = self.env['fotoapp.photo.counter'].search([('photographer_id', '=', self.photographer.id)])
+        self.assertEqual(counter.last_value, dorsales[1])
+        self.assertEqual(self.album.asset_ids, assets)
+
+    def test_photo_counter_allocates_blocks_from_partner_seed(self):
+        partner = self.env['res.partner'].create({
+            'name': 'Counter Photographer',
+            'is_photographer': True,
+            'fotoapp_next_photo_identifier': 41,
+        })
+        Counter = self.env['fotoapp.photo.counter']
+        self.assertEqual(list(Counter._allocate(partner.id, 3)), [42, 43, 44])
+        self.assertEqual(list(Counter._allocate(partner.id)), [45])
+        self.assertEqual(partner.fotoapp_next_photo_identifier, 41)
+
+    def test_zip_import_maps_folders_to_albums_and_resumes(self):
+        first, second, third = sample_png(), sample_png(), sample_png()
+        path = self.env['ir.attachment']._fotoapp_tmp_path(suffix='.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('Largada/a.png', first)
+            archive.writestr('Largada/b.png', second)
+            archive.writestr('Llegada/a-copia.png', first)
+            archive.writestr('Llegada/roto.png', b'no-es-imagen')
+            archive.writestr('portada.png', third)
+            archive.writestr('__MACOSX/Largada/._a.png', b'')
+        job = self.env['fotoapp.import.job']._fotoapp_create_zip_job(self.event, path, 'evento.zip', 7.0)
+
+        with patch.object(import_job, 'IMPORT_BATCH_SIZE', 2):
+            # Con el tiempo agotado se corta después del primer lote y se retoma desde ahí.
+            self.assertFalse(job._fotoapp_run(deadline=1.0))
+            self.assertEqual((job.state, job.total_count, job.processed_count), ('running', 5, 2))
+            self.assertTrue(job._fotoapp_run())
+
+        self.assertEqual(job.state, 'done')
+        self.assertEqual((job.created_count, job.duplicate_count, job.skipped_count), (3, 1, 1))
+        self.assertFalse(os.path.exists(path))
+        albums = {album.name: album for album in self.env['tienda.foto.album'].search([('event_id', '=', self.event.id)])}
+        self.assertEqual(len(albums['Largada'].asset_ids), 2)
+        self.assertFalse(albums['Llegada'].asset_ids)
+        cover = albums[self.event.name].asset_ids
+        self.assertEqual(base64.b64decode(cover.imagen_original), third)
+        self.assertEqual(cover.batch_id, job.batch_id)
+        self.assertEqual(cover.precio, 7.0)
+
+    def test_folder_import_resumes_after_last_path(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+
+        def write(name):
+            with open(os.path.join(root, name), 'wb') as handle:
+                handle.write(sample_png())
+
+        for name in ('a.png', 'b.png', 'c.png'):
+            write(name)
+        self.env['ir.config_parameter'].sudo().set_param('fotoapp.import_root', root)
+        self.event.carpeta_externa = root
+        job = self.env['fotoapp.import.job']._fotoapp_create_folder_job(self.event, 5.0)
+        with patch.object(import_job, 'IMPORT_BATCH_SIZE', 1):
+            self.assertFalse(job._fotoapp_run(deadline=1.0))
+            self.assertEqual(job.last_path, 'a.png')
+            # Con la carpeta cambiada la posición ya no sirve, la última ruta sí.
+            os.unlink(os.path.join(root, 'a.png'))
+            write('b0.png')
+            self.assertTrue(job._fotoapp_run())
+
+        names = self.env['tienda.foto.asset'].search([('evento_id', '=', self.event.id)]).mapped('name')
+        self.assertEqual(sorted(names), ['a.png', 'b.png', 'b0.png', 'c.png'])
+        self.assertEqual((job.state, job.created_count), ('done', 4))
+
+    def test_import_survives_unexpected_errors(self):
+        path = self.env['ir.attachment']._fotoapp_tmp_path(suffix='.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('a.png', sample_png())
+            archive.writestr('b.png', sample_png())
+        Job = self.env['fotoapp.import.job']
+        Asset = type(self.env['tienda.foto.asset'])
+        job = Job._fotoapp_create_zip_job(self.event, path, 'evento.zip', 7.0)
+        with patch.object(import_job, 'IMPORT_BATCH_SIZE', 1), \
+                patch.object(Asset, '_fotoapp_upload_batch', side_effect=[UserError('roto'), [(self.env['tienda.foto.asset'], 'invalid')]]):
+            # El lote que falla se descarta y el siguiente se procesa.
+            self.assertTrue(job._fotoapp_run())
+        self.assertEqual((job.state, job.processed_count, job.skipped_count), ('done', 2, 2))
+
+        path = self.env['ir.attachment']._fotoapp_tmp_path(suffix='.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('c.png', sample_png())
+        job = Job._fotoapp_create_zip_job(self.event, path, 'evento.zip', 7.0)
+        with patch.object(type(Job), '_fotoapp_album', side_effect=KeyError('album')):
+            self.assertTrue(job._fotoapp_run())
+        self.assertEqual(job.state, 'failed')
+        self.assertIn('album', job.error_message)
+        self.assertFalse(os.path.exists(path))
+
+    def test_event_unlink_removes_pending_import_zip(self):
+        path = self.env['ir.attachment']._fotoapp_tmp_path(suffix='.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('a.png', base64.b64decode(SAMPLE_IMAGE))
+        self.env['fotoapp.import.job']._fotoapp_create_zip_job(self.event, path, 'evento.zip', 7.0)
+        self.event.unlink()
+        self.assertFalse(os.path.exists(path))
+
+    def test_hot_folder_imports_only_new_settled_files(self):
+        def write(relative, content, age=60):
+            path = os.path.join(folder, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as handle:
+                handle.write(content)
+            stamp = time.time() - age
+            os.utime(path, (stamp, stamp))
+            return path
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        folder = os.path.join(root, 'evento')
+        self.env['ir.config_parameter'].sudo().set_param('fotoapp.import_root', root)
+        self.event.write({'carpeta_externa': folder, 'carpeta_sync': True, 'precio_base': 9.0})
+        first = sample_png()
+        write('Largada/a.png', first)
+        write('Largada/b.png', sample_png())
+        # Recién escrita: puede estar copiándose todavía.
+        fresh = write('Largada/c.png', sample_png(), age=0)
+
+        Manifest = self.env['fotoapp.import.manifest']
+        Asset = self.env['tienda.foto.asset']
+        self.assertTrue(Manifest._fotoapp_sync_event(self.event))
+        self.assertEqual(Asset.search_count([('evento_id', '=', self.event.id)]), 2)
+        self.assertEqual(sorted(Manifest.search([('event_id', '=', self.event.id)]).mapped('path')), ['Largada/a.png', 'Largada/b.png'])
+
+        Manifest._fotoapp_sync_event(self.event)
+        self.assertEqual(Asset.search_count([('evento_id', '=', self.event.id)]), 2)
+
+        write('Llegada/a-copia.png', first)
+        stamp = time.time() - 60
+        os.utime(fresh, (stamp, stamp))
+        Manifest._fotoapp_sync_event(self.event)
+        assets = Asset.search([('evento_id', '=', self.event.id)])
+        self.assertEqual(len(assets), 3)
+        self.assertEqual(set(assets.mapped('precio')), {9.0})
+        copy = Manifest.search([('event_id', '=', self.event.id), ('path', '=', 'Llegada/a-copia.png')])
+        self.assertEqual(copy.state, 'duplicate')
+        self.assertEqual(copy.sha256, hashlib.sha256(first).hexdigest())
+
+    def test_hot_folder_replaces_modified_file(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        path = os.path.join(root, 'a.png')
+        self.env['ir.config_parameter'].sudo().set_param('fotoapp.import_root', root)
+        self.event.write({'carpeta_externa': root, 'carpeta_sync': True, 'precio_base': 9.0})
+        Manifest = self.env['fotoapp.import.manifest']
+        for age, content in ((120, sample_png()), (60, sample_png())):
+            with open(path, 'wb') as handle:
+                handle.write(content)
+            stamp = time.time() - age
+            os.utime(path, (stamp, stamp))
+            Manifest._fotoapp_sync_event(self.event)
+
+        row = Manifest.search([('event_id', '=', self.event.id), ('path', '=', 'a.png')])
+        assets = self.env['tienda.foto.asset'].search([('evento_id', '=', self.event.id)], order='id')
+        self.assertEqual(len(assets), 2)
+        self.assertEqual(row.asset_id, assets[1])
+        self.assertEqual(row.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(assets.mapped('lifecycle_state'), ['archived', 'published'])
+        self.assertFalse(assets[0].website_published)
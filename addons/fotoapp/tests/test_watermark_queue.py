@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import base64
+import io
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from odoo.tests import tagged
+
+from ..controllers.gallery import FotoappGalleryController
+from ..models import watermark
+from .common import SAMPLE_IMAGE, FotoappCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWatermarkQueue(FotoappCommon):
+    def setUp(self):
+        super().setUp()
+        self.env['ir.config_parameter'].sudo().set_param('fotoapp.watermark_workers', 1)
+
+    def test_watermark_rendered_by_cron(self):
+        asset = self.env['tienda.foto.asset'].create({
+            'evento_id': self.event.id,
+            'precio': 10.0,
+            'imagen_original': SAMPLE_IMAGE,
+        })
+        self.assertEqual(asset.watermark_state, 'pending')
+        self.assertFalse(asset.imagen_watermark)
+
+        self.env['tienda.foto.asset'].cron_process_pending_watermarks()
+        asset.invalidate_recordset()
+
+        self.assertEqual(asset.watermark_state, 'done')
+        self.assertTrue(asset.imagen_watermark)
+        self.assertTrue(asset.has_derivatives)
+        self.assertTrue(asset.imagen_thumb)
+        self.assertTrue(asset.imagen_preview)
+
+    def test_near_identical_photos_grouped_as_burst(self):
+        Asset = self.env['tienda.foto.asset']
+        hashes = ['0545234149c91087', '0424624048c81086', '002220128b014464']
+        assets = Asset.browse([
+            Asset.create({'evento_id': self.event.id, 'precio': 10.0, 'imagen_original': SAMPLE_IMAGE}).id
+            for dummy in hashes
+        ])
+        for asset, perceptual_hash in zip(assets, hashes):
+            asset.perceptual_hash = perceptual_hash
+
+        self.event._fotoapp_cluster_bursts()
+
+        first, burst, other = assets.sorted('id')
+        self.assertEqual(first.burst_size, 2)
+        self.assertEqual(burst.burst_leader_id, first)
+        self.assertFalse(other.burst_leader_id)
+        self.assertEqual(other.burst_size, 1)
+
+    def test_bursts_collapse_only_within_the_same_album(self):
+        Asset = self.env['tienda.foto.asset']
+        Album = self.env['tienda.foto.album']
+        start = Album.create({'name': 'Largada', 'event_id': self.event.id, 'collapse_bursts': True})
+        finish = Album.create({'name': 'Llegada', 'event_id': self.event.id, 'collapse_bursts': True})
+        shot_at = datetime(2026, 5, 1, 9, 0, 0)
+        leader, follower, late = assets = Asset.browse([
+            Asset.create({'evento_id': self.event.id, 'precio': 10.0, 'imagen_original': SAMPLE_IMAGE}).id
+            for dummy in range(3)
+        ])
+        for asset, seconds, album in zip(assets, (0, 2, 3600), (start, finish, start)):
+            asset.write({
+                'perceptual_hash': '0545234149c91087',
+                'taken_at': shot_at + timedelta(seconds=seconds),
+                'album_ids': [(4, album.id)],
+            })
+
+        self.event._fotoapp_cluster_bursts(around=follower)
+
+        self.assertEqual(follower.burst_leader_id, leader)
+        self.assertEqual(leader.burst_size, 2)
+        # Fuera de la ventana de tiempo: no se reagrupa ni se une a la ráfaga.
+        self.assertFalse(late.burst_leader_id)
+        self.assertEqual(late.burst_size, 1)
+        controller = FotoappGalleryController()
+        self.assertIn(follower, Asset.search(controller._album_photo_domain(finish)))
+        follower.album_ids = [(4, start.id)]
+        self.assertNotIn(follower, Asset.search(controller._album_photo_domain(start)))
+
+    def test_overlays_prepared_before_forking_workers(self):
+        raw = base64.b64decode(SAMPLE_IMAGE)
+        overlay = {'partner_id': self.photographer.id, 'checksum': 'abc', 'image': raw, 'opacity': 50, 'scale': 0.3}
+        watermark.invalidate_overlay_cache()
+        self.addCleanup(watermark.invalidate_overlay_cache)
+        # Misma marca y mismo ancho: un solo overlay para todas las fotos del lote.
+        self.assertEqual(watermark.warm_overlays([(index, raw, overlay, False) for index in range(3)]), 1)
+        self.assertEqual(len(watermark._overlay_cache), 1)
+        cached = next(iter(watermark._overlay_cache.values()))
+        self.assertIs(watermark.prepare_overlay(overlay, Image.open(io.BytesIO(raw)).width), cached)